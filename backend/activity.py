@@ -0,0 +1,73 @@
+import os
+import time
+import asyncio
+from collections import OrderedDict
+from db import grievances_col, member_requests_col
+import schema
+
+# Per-phone engagement summary for "My Activity": one aggregation per collection, both run
+# concurrently, with a short-lived per-phone cache that submissions and status changes clear.
+
+ACTIVITY_CACHE_TTL = float(os.getenv("ACTIVITY_CACHE_TTL", "60"))
+ACTIVITY_CACHE_SIZE = int(os.getenv("ACTIVITY_CACHE_SIZE", "10000"))
+
+_cache = OrderedDict()  # phone -> (summary, cached_at)
+_stats = {"hits": 0, "misses": 0, "invalidations": 0}
+
+async def _grievances(phone):
+    rows = await grievances_col.aggregate([
+        {"$match": schema.match("grievances", "voter_phone", phone)},
+        {"$group": {"_id": "$status", "n": {"$sum": 1}}}
+    ]).to_list(length=None)
+    by_status = {r["_id"]: r["n"] for r in rows}
+    return {
+        "raised": sum(by_status.values()),
+        "open": by_status.get("Open", 0),
+        "in_progress": by_status.get("In Progress", 0),
+        "resolved": by_status.get("Resolved", 0)
+    }
+
+async def _member_requests(phone):
+    rows = await member_requests_col.aggregate([
+        {"$match": schema.match("member_requests", "voter_phone", phone)},
+        {"$facet": {
+            "suggestions": [
+                {"$match": schema.suggestion_filter()},
+                {"$count": "n"}
+            ],
+            "volunteer": [
+                {"$match": {"type": "Volunteer"}},
+                {"$limit": 1},
+                {"$project": {"_id": 0, "role": {"$ifNull": ["$role", "N/A"]}}}
+            ]
+        }}
+    ]).to_list(length=1)
+    facets = rows[0] if rows else {}
+    suggestions = facets.get("suggestions") or [{"n": 0}]
+    volunteer = facets.get("volunteer") or []
+    return {
+        "suggestions": suggestions[0]["n"],
+        "volunteer_role": volunteer[0]["role"] if volunteer else None
+    }
+
+async def summary(phone):
+    hit = _cache.get(phone)
+    if hit and time.time() - hit[1] < ACTIVITY_CACHE_TTL:
+        _cache.move_to_end(phone)
+        _stats["hits"] += 1
+        return hit[0]
+    _stats["misses"] += 1
+    grievances, requests = await asyncio.gather(_grievances(phone), _member_requests(phone))
+    result = {**grievances, **requests}
+    _cache[phone] = (result, time.time())
+    _cache.move_to_end(phone)
+    while len(_cache) > ACTIVITY_CACHE_SIZE:
+        _cache.popitem(last=False)
+    return result
+
+def invalidate(phone):
+    if phone and _cache.pop(phone, None) is not None:
+        _stats["invalidations"] += 1
+
+def metrics():
+    return {**_stats, "size": len(_cache)}
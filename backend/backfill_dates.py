@@ -0,0 +1,52 @@
+import sys
+import time
+import asyncio
+import argparse
+from pymongo import UpdateOne
+from db import voters_collection
+import schema
+
+# One-off: converts voter createdAt values stored as "14 Mar 2026" strings by older bot
+# versions into UTC datetimes (exact to the second when the _id agrees with the day).
+# Usage: python backfill_dates.py [--batch 1000] [--dry-run]
+# Grievance and member-request dates are converted by migrate_schema.py. Safe to re-run and
+# to run while the bot is live: only documents still holding the same string are updated,
+# and each pass starts from the documents that are left.
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--batch", type=int, default=1000)
+parser.add_argument("--dry-run", action="store_true", help="report what would change, write nothing")
+
+async def main(args):
+    query = {"createdAt": {"$type": "string"}}
+    converted = unparsed = 0
+    last_id = None
+    started = time.perf_counter()
+    while True:
+        page = {**query, "_id": {"$gt": last_id}} if last_id else query
+        docs = await voters_collection.find(page, {"createdAt": 1}).sort("_id", 1).limit(args.batch).to_list(length=args.batch)
+        if not docs:
+            break
+        ops = []
+        for doc in docs:
+            created = schema.creation_time(doc["createdAt"], doc["_id"])
+            if created is None:
+                unparsed += 1
+                print(f"{doc['_id']}: cannot parse createdAt {doc['createdAt']!r}, left as it is")
+                continue
+            if args.dry_run and converted + len(ops) < 3:
+                print(f"{doc['_id']}: {doc['createdAt']!r} -> {created.isoformat()}")
+            ops.append(UpdateOne({"_id": doc["_id"], "createdAt": doc["createdAt"]}, {"$set": {"createdAt": created}}))
+        last_id = docs[-1]["_id"]
+        if ops and not args.dry_run:
+            result = await voters_collection.bulk_write(ops, ordered=False)
+            converted += result.modified_count
+        else:
+            converted += len(ops)
+        print(f"{converted} converted ({converted / max(time.perf_counter() - started, 1e-9):.0f}/s), up to {last_id}")
+    verb = "would be converted" if args.dry_run else "converted"
+    print(f"Done: {converted} voter dates {verb}, {unparsed} left unparsed, {time.perf_counter() - started:.1f} s")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,54 @@
+import sys
+import time
+import asyncio
+import argparse
+import datetime
+from db import ref_index_col, migrations_col
+from ref_index import COLLECTIONS, REF_FIELDS, BACKFILL_ID, entry
+
+# One-off: indexes the reference ids of records created before ref_index existed.
+# Usage: python backfill_ref_index.py [--batch 1000]
+# Safe to re-run and to run while the bot is live: entries are upserted with
+# $setOnInsert, so nothing already indexed is changed. Records are read oldest first,
+# grievances before member requests, so a legacy ref shared by several records keeps
+# resolving to the one the old $or lookups returned. When it completes it records so in the
+# migrations collection, and the app stops falling back to the legacy lookups on a miss.
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--batch", type=int, default=1000)
+
+async def backfill(name, batch_size):
+    scanned = added = 0
+    ops = []
+    fields = REF_FIELDS[name]
+
+    async def flush():
+        nonlocal added, ops
+        if ops:
+            result = await ref_index_col.bulk_write(ops, ordered=False)
+            added += result.upserted_count
+            ops = []
+
+    cursor = COLLECTIONS[name].find({"$or": [{f: {"$exists": True}} for f in fields]}, {f: 1 for f in fields}).sort("_id", 1)
+    async for doc in cursor:
+        scanned += 1
+        for ref in {doc.get(f) for f in fields}:
+            if isinstance(ref, str) and ref:
+                ops.append(entry(name, ref, doc["_id"]))
+        if len(ops) >= batch_size:
+            await flush()
+    await flush()
+    return scanned, added
+
+async def main(batch_size):
+    started = time.perf_counter()
+    for name in COLLECTIONS:
+        scanned, added = await backfill(name, batch_size)
+        print(f"{name}: {scanned} records scanned, {added} references indexed")
+    await migrations_col.update_one({"_id": BACKFILL_ID}, {"$set": {"done": True, "completed_at": datetime.datetime.now(datetime.timezone.utc)}}, upsert=True)
+    print(f"Done in {time.perf_counter() - started:.1f} s, {await ref_index_col.estimated_document_count()} references in the index")
+    return 0
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.batch)))
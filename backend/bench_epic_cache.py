@@ -0,0 +1,125 @@
+import sys
+import time
+import random
+import string
+import asyncio
+import argparse
+import datetime
+from bson import ObjectId
+
+# EPIC cache and Bloom filter against an in-memory voter roll.
+# Usage: python bench_epic_cache.py --voters 200000 --lookups 50000
+# Replays a verify_epic-like workload (repeat attempts, typos of real EPICs, random junk)
+# and reports how many lookups still reach the database, the hit ratio and the filter
+# size. Fails if a voter on the roll is ever reported missing, including voters added by
+# the bot after the build and voters inserted by another host before a refresh.
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--voters", type=int, default=200000)
+parser.add_argument("--lookups", type=int, default=50000)
+parser.add_argument("--typos", type=float, default=0.3, help="share of lookups that are typos or junk")
+parser.add_argument("--latency", type=float, default=0.0005, help="simulated find_one round-trip (s)")
+args = parser.parse_args()
+
+import epic_cache
+
+class Cursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def __aiter__(self):
+        return self._iter()
+
+    async def _iter(self):
+        for doc in self.docs:
+            yield {"voterId": doc["voterId"]}
+
+class FakeVoters:
+    def __init__(self):
+        self.docs = {}
+        self.queries = 0
+
+    def insert(self, epic, at=None):
+        oid = ObjectId.from_datetime(at) if at else ObjectId()
+        self.docs[epic] = {"_id": oid, "voterId": epic, "name": "Voter", "partNumber": "101"}
+
+    async def find_one(self, query, projection=None):
+        self.queries += 1
+        await asyncio.sleep(args.latency)
+        doc = self.docs.get(query["voterId"])
+        return {k: doc[k] for k in ("voterId", "name", "partNumber")} if doc else None
+
+    async def estimated_document_count(self):
+        return len(self.docs)
+
+    def find(self, query, projection=None, batch_size=None):
+        since = query.get("_id", {}).get("$gte")
+        return Cursor([d for d in list(self.docs.values()) if since is None or d["_id"] >= since])
+
+def random_epic():
+    return "".join(random.choices(string.ascii_uppercase, k=3)) + "".join(random.choices(string.digits, k=7))
+
+def typo(epic):
+    i = random.randrange(len(epic))
+    pool = string.digits if epic[i].isdigit() else string.ascii_uppercase
+    return epic[:i] + random.choice(pool.replace(epic[i], "")) + epic[i + 1:]
+
+async def main():
+    random.seed(7)
+    voters = FakeVoters()
+    epic_cache.voters_collection = voters
+    for _ in range(args.voters):
+        voters.insert(random_epic())
+    roll = list(voters.docs)
+
+    started = time.perf_counter()
+    await epic_cache.rebuild()
+    build = time.perf_counter() - started
+    failures = []
+
+    # Voters the bot registers after the build, and one another host inserted
+    for i in range(100):
+        epic = random_epic()
+        voters.insert(epic)
+        epic_cache.added(epic, voters.docs[epic])
+        roll.append(epic)
+    other_host = random_epic()
+    voters.insert(other_host, datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(seconds=30))
+    await epic_cache.refresh()
+    roll.append(other_host)
+
+    # Most voters retry a few times, so popular EPICs repeat
+    popular = random.sample(roll, min(len(roll), args.lookups // 4))
+    workload = []
+    for _ in range(args.lookups):
+        if random.random() < args.typos:
+            workload.append((typo(random.choice(popular)) if random.random() < 0.7 else random_epic(), None))
+        else:
+            workload.append((random.choice(popular), True))
+
+    voters.queries = 0
+    started = time.perf_counter()
+    for epic, expected in workload:
+        voter = await epic_cache.lookup(epic)
+        if expected and voter is None:
+            failures.append(f"{epic} is on the roll but was reported missing")
+        if expected is None and voter is not None and epic not in voters.docs:
+            failures.append(f"{epic} is not on the roll but was found")
+    elapsed = time.perf_counter() - started
+    for epic in roll[-101:]:
+        if await epic_cache.lookup(epic) is None:
+            failures.append(f"{epic} (added after the build) was reported missing")
+
+    m = epic_cache.metrics()
+    print(f"roll:       {args.voters} voters, filter {m['bloom']['bytes'] / 1024:.0f} KiB, {m['bloom']['hashes']} hashes, built in {build:.2f} s")
+    print(f"lookups:    {args.lookups} ({args.typos:.0%} typos/junk) in {elapsed:.2f} s")
+    print(f"database:   {voters.queries} queries ({voters.queries / args.lookups:.1%} of lookups, was 100%)")
+    print(f"cache:      hit ratio {m['hit_ratio']:.1%}, {m['hits']} hits, {m['negative_hits']} negative hits, "
+          f"{m['bloom_rejects']} rejected by the filter, {m['bloom_false_positives']} filter false positives")
+    for f in failures[:10]:
+        print("FAIL:", f)
+    print("OK" if not failures else f"FAILED ({len(failures)})")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,127 @@
+import os
+import sys
+import shutil
+import time
+import asyncio
+import argparse
+import tempfile
+
+# Media proxy benchmark against the local Graph API stub.
+# Usage: python bench_media_proxy.py --photos 20 --viewers 25 --latency 0.05
+# Every photo is requested by --viewers concurrent dashboard clients (like several tabs and
+# coordinators rendering the same thumbnails). Checks that each photo is downloaded from
+# upstream once, then measures warm-cache latency, 304 revalidation and Range responses.
+# Finally runs eager ingestion (in-memory store) over the same photos, checks thumbnails are
+# served from the store, and that originals survive WhatsApp media expiry and a cold cache,
+# and requests ?w=&fmt= variants (precomputed at ingestion for the dashboard grid sizes).
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--photos", type=int, default=20)
+parser.add_argument("--viewers", type=int, default=25, help="concurrent requests per photo")
+parser.add_argument("--latency", type=float, default=0.05, help="stub Graph API delay per call (s)")
+parser.add_argument("--port", type=int, default=8766)
+args = parser.parse_args()
+
+os.environ["WHATSAPP_GRAPH_API_BASE"] = f"http://127.0.0.1:{args.port}"
+os.environ["MEDIA_CACHE_DIR"] = tempfile.mkdtemp(prefix="media_cache_bench_")
+
+import httpx
+import media_proxy
+import media_ingest
+import media_variants
+from main import app
+from stub_graph import start_stub, stop_stub, stub_app
+from bench_stores import MemoryMediaStore
+
+async def fetch_all(client, ids):
+    started = time.perf_counter()
+    responses = await asyncio.gather(*(client.get(f"/api/dashboard/image/{pid}") for pid in ids))
+    return responses, time.perf_counter() - started
+
+async def main():
+    server, thread = start_stub(args.port, args.latency)
+    media_proxy.load()
+    failures = []
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://dashboard") as client:
+            ids = [f"media{p}" for p in range(args.photos) for _ in range(args.viewers)]
+            cold, cold_s = await fetch_all(client, ids)
+            warm, warm_s = await fetch_all(client, ids)
+
+            if any(r.status_code != 200 for r in cold + warm):
+                failures.append("non-200 response for a cached photo")
+            if stub_app.state.media_fetches != args.photos:
+                failures.append(f"expected {args.photos} upstream downloads, got {stub_app.state.media_fetches}")
+
+            first = warm[0]
+            revalidated = await client.get(f"/api/dashboard/image/{ids[0]}", headers={"If-None-Match": first.headers["etag"]})
+            if revalidated.status_code != 304:
+                failures.append(f"If-None-Match returned {revalidated.status_code}")
+            ranged = await client.get(f"/api/dashboard/image/{ids[0]}", headers={"Range": "bytes=100-199"})
+            if ranged.status_code != 206 or ranged.content != first.content[100:200]:
+                failures.append(f"Range returned {ranged.status_code} with {len(ranged.content)} bytes")
+            missing = await client.get("/api/dashboard/image/missing123")
+            if missing.status_code != 404:
+                failures.append(f"missing media returned {missing.status_code}")
+
+            # Eager ingestion of the same photos, as the bot does when they arrive
+            await media_ingest.start(MemoryMediaStore())
+            photos = sorted(set(ids))
+            started = time.perf_counter()
+            for pid in photos:
+                await media_ingest.submit(pid)
+            await media_ingest.drain()
+            ingest_s = time.perf_counter() - started
+            thumbs, thumbs_s = await fetch_all(client, [f"{pid}?size=thumb" for pid in ids])
+            if any(r.status_code != 200 or r.headers["content-type"] != "image/jpeg" for r in thumbs):
+                failures.append("thumbnail request failed")
+            thumb_bytes = sum(len(r.content) for r in thumbs) / len(thumbs)
+            full_bytes = sum(len(r.content) for r in warm) / len(warm)
+
+            rendered_before = media_variants.metrics()["rendered"]
+            grid, grid_s = await fetch_all(client, [f"{pid}?w=90&fmt=webp" for pid in ids])
+            if any(r.status_code != 200 or r.headers["content-type"] != "image/webp" for r in grid):
+                failures.append("webp variant request failed")
+            if media_variants.metrics()["rendered"] != rendered_before:
+                failures.append("w=90 was not served from the precomputed w100 variant")
+            grid_bytes = sum(len(r.content) for r in grid) / len(grid)
+            bad = await client.get(f"/api/dashboard/image/{ids[0]}?w=100&fmt=gif")
+            if bad.status_code != 400:
+                failures.append(f"unknown fmt returned {bad.status_code}")
+            # A size nobody precomputed is rendered once, off the event loop, then cached
+            large, large_s = await fetch_all(client, [f"{pid}?w=700" for pid in ids])
+            large_bytes = sum(len(r.content) for r in large) / len(large)
+
+            # Media URLs expire and the disk cache is lost: originals must come from the store
+            stub_app.state.media_expired = True
+            shutil.rmtree(media_proxy.MEDIA_CACHE_DIR)
+            media_proxy._records.clear()
+            media_proxy.load()
+            expired = await client.get(f"/api/dashboard/image/{photos[0]}")
+            if expired.status_code != 200 or expired.content != first.content:
+                failures.append(f"expired original returned {expired.status_code}")
+            await media_ingest.stop()
+
+        total = len(ids)
+        print(f"requests:     {total} ({args.photos} photos x {args.viewers} viewers)")
+        print(f"cold:         {cold_s:.2f} s, {stub_app.state.media_fetches} upstream downloads")
+        print(f"warm:         {warm_s:.2f} s ({total / warm_s:.0f} req/s)")
+        print(f"headers:      {first.headers['cache-control']} etag={first.headers['etag'][:16]}...")
+        print(f"ingest:       {len(photos)} photos in {ingest_s:.2f} s, {media_ingest.metrics()['stored']} stored")
+        print(f"thumbnails:   {thumbs_s:.2f} s, {thumb_bytes / 1024:.1f} KB avg vs {full_bytes / 1024:.1f} KB original")
+        print(f"grid (webp):  {grid_s:.2f} s, {grid_bytes / 1024:.1f} KB avg for ?w=90&fmt=webp (served as w100)")
+        print(f"on demand:    {large_s:.2f} s, {large_bytes / 1024:.1f} KB avg for ?w=700 (rendered as w1280 jpeg)")
+        print(f"proxy:        {media_proxy.metrics()}")
+    finally:
+        stop_stub(server, thread)
+
+    if failures:
+        for f in failures:
+            print("FAIL: " + f)
+        return 1
+    print("OK: one upstream fetch per photo, conditional and range requests served from cache")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
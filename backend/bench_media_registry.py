@@ -0,0 +1,99 @@
+import os
+import sys
+import time
+import asyncio
+import argparse
+
+# Banner media registry against the local Graph API stub.
+# Usage: python bench_media_registry.py --messages 500
+# Uploads every bot banner once (in-memory registry), sends --messages image and image-header
+# button messages and checks they all reference media ids, then checks ids close to expiry
+# are uploaded again, ids about to lapse fall back to links, and a restart (or a second
+# instance) reuses the stored ids instead of uploading.
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--messages", type=int, default=500)
+parser.add_argument("--latency", type=float, default=0.01, help="stub Graph API delay per call (s)")
+parser.add_argument("--port", type=int, default=8767)
+args = parser.parse_args()
+
+os.environ["WHATSAPP_GRAPH_API_BASE"] = f"http://127.0.0.1:{args.port}"
+
+import media_registry
+from whatsapp import send_image_message, send_button_message, close_client
+from bot_logic import IMG_URLS
+from static_assets import local_path
+from stub_graph import start_stub, stop_stub, stub_app
+from bench_stores import MemoryUploadStore
+
+async def send_all(names):
+    started = time.perf_counter()
+    sends = []
+    for i in range(args.messages):
+        url = IMG_URLS[names[i % len(names)]]
+        if i % 2:
+            sends.append(send_image_message("919800000000", url, "banner"))
+        else:
+            sends.append(send_button_message("919800000000", "body", [{"id": "b", "title": "OK"}], url))
+    await asyncio.gather(*sends)
+    return time.perf_counter() - started
+
+async def main():
+    server, thread = start_stub(args.port, args.latency)
+    failures = []
+    try:
+        names = sorted(IMG_URLS)
+        await media_registry.start(IMG_URLS, MemoryUploadStore())
+        deadline = time.time() + 30
+        while media_registry.metrics()["with_id"] < len(media_registry._banners) and time.time() < deadline:
+            await asyncio.sleep(0.05)
+        uploads = len(stub_app.state.uploads)
+        upload_bytes = media_registry.metrics()["upload_bytes"]
+        if uploads != len(media_registry._banners):
+            failures.append(f"expected {len(media_registry._banners)} uploads, got {uploads}")
+
+        send_s = await send_all(names)
+        refs = dict(stub_app.state.image_refs)
+        if refs["link"]:
+            failures.append(f"{refs['link']} messages still sent a link")
+
+        # Ids inside the refresh margin are uploaded again; ids about to lapse are not used
+        entries = media_registry._entries
+        store = media_registry._store
+        for entry in list(entries.values()) + list(store.entries.values()):
+            entry["expires_at"] = time.time() + media_registry.MEDIA_ID_REFRESH_MARGIN - 60
+        refreshed = await media_registry.refresh()
+        if refreshed != len(media_registry._banners) or len(stub_app.state.uploads) != 2 * uploads:
+            failures.append(f"refresh uploaded {refreshed} banners")
+        first = next(iter(entries.values()))
+        first["expires_at"] = time.time() + 60
+        stale_url = next(u for u, (_, sha) in media_registry._banners.items() if media_registry._entry_id(sha) == first["_id"])
+        if media_registry.resolve(stale_url) is not None:
+            failures.append("an id about to expire was still used")
+
+        # Restart or another instance: ids come back from the store, nothing is uploaded
+        await media_registry.stop()
+        entries.clear()
+        before = len(stub_app.state.uploads)
+        await media_registry.refresh()
+        if len(stub_app.state.uploads) != before:
+            failures.append("restart uploaded banners again")
+
+        banner_bytes = sum(os.path.getsize(local_path(IMG_URLS[names[i % len(names)]])) for i in range(args.messages))
+        print(f"banners:      {len(media_registry._banners)} uploaded once, {upload_bytes / 1024:.0f} KB")
+        print(f"messages:     {args.messages} in {send_s:.2f} s, image refs {refs}")
+        print(f"egress saved: {banner_bytes / 1024:.0f} KB of banner downloads Meta no longer makes from us")
+        print(f"registry:     {media_registry.metrics()}")
+    finally:
+        await close_client()
+        stop_stub(server, thread)
+
+    if failures:
+        for f in failures:
+            print("FAIL: " + f)
+        return 1
+    print("OK: every banner uploaded once and sent by media id")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
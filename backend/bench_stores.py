@@ -0,0 +1,132 @@
+import time
+from media_ingest import MEDIA_INGEST_RETRY_AFTER
+from ref_ids import SEQUENCE_START
+
+# In-memory stand-ins for the Mongo stores, used by the bench_* scripts so they run without
+# a database. Each class has the methods of the Mongo store it replaces and is handed to that
+# module's start(store=...) (ref_ids.use(...)). Nothing survives the process.
+
+class MemoryOutboxStore:
+    # outbox.MongoOutboxStore
+    def __init__(self):
+        self.docs = {}
+        self.ids = 0
+
+    async def add(self, doc):
+        self.ids += 1
+        doc["_id"] = self.ids
+        self.docs[doc["_id"]] = doc
+
+    async def done(self, doc):
+        self.docs.pop(doc["_id"], None)
+
+    async def renew(self, doc):
+        return doc["status"] == "pending"
+
+    async def heartbeat(self, ids):
+        pass
+
+    async def retry(self, doc, error):
+        doc["last_error"] = error
+        doc["updated_at"] = time.time()
+
+    async def fail(self, doc, error):
+        doc["status"] = "failed"
+        doc["last_error"] = error
+        doc["updated_at"] = time.time()
+
+    async def claim_expired(self, skip_ids):
+        return []
+
+    async def counts(self):
+        pending = sum(1 for d in self.docs.values() if d["status"] == "pending")
+        return {"pending": pending, "failed": len(self.docs) - pending}
+
+class MemoryInboxStore:
+    # inbox.MongoInboxStore
+    def __init__(self):
+        self.events = {}
+        self.processed = set()
+        self.ids = 0
+
+    async def save_event(self, payload, message_ids):
+        self.ids += 1
+        event = {"_id": self.ids, "payload": payload, "message_ids": message_ids, "status": "pending"}
+        self.events[event["_id"]] = event
+        return event
+
+    async def claim_message(self, message_id):
+        if message_id in self.processed:
+            return False
+        self.processed.add(message_id)
+        return True
+
+    async def complete_message(self, message_id):
+        pass
+
+    async def release_message(self, message_id, error):
+        self.processed.discard(message_id)
+
+    async def heartbeat(self, event_ids, message_ids):
+        pass
+
+    async def finish_event(self, event):
+        self.events.pop(event["_id"], None)
+
+    async def claim_expired_events(self, skip_ids):
+        return []
+
+class MemoryMediaStore:
+    # media_ingest.MongoMediaStore (records and GridFS files)
+    def __init__(self):
+        self.docs = {}
+        self.files = {}
+
+    async def claim(self, photo_id):
+        if photo_id in self.docs:
+            return False
+        now = time.time()
+        self.docs[photo_id] = {"_id": photo_id, "status": "pending", "attempts": 0, "updated_at": now,
+                               "retry_at": now + MEDIA_INGEST_RETRY_AFTER}
+        return True
+
+    async def get(self, photo_id):
+        return self.docs.get(photo_id)
+
+    async def put(self, photo_id, kind, data, content_type):
+        file_id = f"{photo_id}/{kind}"
+        self.files[file_id] = data
+        return file_id
+
+    async def read(self, file_id):
+        return self.files[file_id]
+
+    async def update(self, photo_id, fields):
+        self.docs[photo_id].update(fields, updated_at=time.time())
+
+    async def due(self, now, skip_ids):
+        return [d["_id"] for d in self.docs.values() if d["status"] == "pending" and d.get("retry_at", 0) <= now and d["_id"] not in skip_ids]
+
+class MemoryUploadStore:
+    # media_registry.MongoUploadStore
+    def __init__(self):
+        self.entries = {}
+
+    async def load(self, phone_number_id):
+        return [e for e in self.entries.values() if e["phone_number_id"] == phone_number_id]
+
+    async def claim(self, entry_id):
+        return True
+
+    async def save(self, entry):
+        self.entries[entry["_id"]] = dict(entry)
+
+class MemorySequences:
+    # ref_ids.MongoSequences
+    def __init__(self):
+        self.next = {}
+
+    async def reserve(self, prefix, count):
+        first = self.next.get(prefix, SEQUENCE_START)
+        self.next[prefix] = first + count
+        return first
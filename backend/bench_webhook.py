@@ -0,0 +1,94 @@
+import os
+import sys
+import time
+import asyncio
+import argparse
+import statistics
+
+# Webhook throughput benchmark against a local Graph API stub.
+# Usage: python bench_webhook.py --requests 500 --concurrency 50 --latency 0.05 [--blocking]
+# --blocking swaps in the old synchronous requests.post sender for comparison.
+# Inbox and outbox run on the in-memory stores from bench_stores.py, so no MongoDB is needed.
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--requests", type=int, default=500)
+parser.add_argument("--concurrency", type=int, default=50)
+parser.add_argument("--latency", type=float, default=0.05, help="stub Graph API delay per call (s)")
+parser.add_argument("--port", type=int, default=8765)
+parser.add_argument("--blocking", action="store_true")
+args = parser.parse_args()
+
+os.environ["WHATSAPP_GRAPH_API_BASE"] = f"http://127.0.0.1:{args.port}"
+os.environ.setdefault("WHATSAPP_PHONE_NUMBER_ID", "bench")
+
+import httpx
+import whatsapp
+import outbox
+import inbox
+from main import app
+from stub_graph import start_stub, stop_stub, stub_app
+from bench_stores import MemoryOutboxStore, MemoryInboxStore
+
+def webhook_payload(i):
+    # "hi" resets the conversation and only talks to the Graph API, so no MongoDB is needed
+    return {
+        "object": "whatsapp_business_account",
+        "entry": [{"changes": [{"value": {"messages": [{
+            "id": f"wamid.bench{i}",
+            "from": f"91900000{i:05d}",
+            "type": "text",
+            "text": {"body": "hi"}
+        }]}}]}]
+    }
+
+def install_blocking_sender():
+    import requests
+
+    async def blocking_send(payload):
+        return requests.post(whatsapp.API_URL, headers=whatsapp.HEADERS, json=payload)
+
+    whatsapp.send_payload = blocking_send
+
+def pct(values, p):
+    return values[max(0, int(len(values) * p) - 1)] * 1000
+
+async def run():
+    if args.blocking:
+        install_blocking_sender()
+    server, thread = start_stub(args.port, args.latency)
+    await outbox.start(MemoryOutboxStore())
+    await inbox.start(store=MemoryInboxStore())
+    latencies = []
+    pending = iter(range(args.requests))
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        async def worker():
+            for i in pending:
+                start = time.perf_counter()
+                res = await client.post("/webhook", json=webhook_payload(i))
+                res.raise_for_status()
+                latencies.append(time.perf_counter() - start)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        acked = time.perf_counter() - started
+        await inbox.drain()
+        await outbox.drain()
+        elapsed = time.perf_counter() - started
+
+    await inbox.stop()
+    await outbox.stop()
+    await whatsapp.close_client()
+    stop_stub(server, thread)
+
+    latencies.sort()
+    mode = "blocking requests.post" if args.blocking else "async pooled client"
+    print(f"mode:        {mode}")
+    print(f"requests:    {args.requests} @ concurrency {args.concurrency}, stub latency {args.latency * 1000:.0f} ms")
+    print(f"ack rate:    {args.requests / acked:.1f} webhooks/s ({acked:.2f} s to acknowledge all)")
+    print(f"ack p50/p95: {statistics.median(latencies) * 1000:.1f} / {pct(latencies, 0.95):.1f} ms")
+    print(f"end to end:  {args.requests / elapsed:.1f} webhooks/s ({elapsed:.2f} s until every reply was sent)")
+    print(f"graph calls: {stub_app.state.received}")
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(run()))
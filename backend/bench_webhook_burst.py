@@ -0,0 +1,130 @@
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import statistics
+
+# Load test: replay a burst of webhook payloads (including Meta-style redeliveries)
+# against the app with a local Graph API stub, and check every message id is handled once.
+#
+#   python bench_webhook_burst.py --messages 2000 --redeliver 0.3
+#   python bench_webhook_burst.py --file burst.ndjson             # replay a recorded burst
+#   python bench_webhook_burst.py --export burst.ndjson --limit 5000
+#       (records the latest payloads stored in the webhook_events collection; needs MongoDB)
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--file", help="NDJSON file with one webhook payload per line")
+parser.add_argument("--export", help="write recent webhook_events payloads to this NDJSON file and exit")
+parser.add_argument("--limit", type=int, default=5000)
+parser.add_argument("--messages", type=int, default=2000, help="synthetic burst size when no --file is given")
+parser.add_argument("--phones", type=int, default=500)
+parser.add_argument("--redeliver", type=float, default=0.3, help="fraction of payloads delivered a second time")
+parser.add_argument("--concurrency", type=int, default=100)
+parser.add_argument("--latency", type=float, default=0.02)
+parser.add_argument("--port", type=int, default=8767)
+args = parser.parse_args()
+
+os.environ["WHATSAPP_GRAPH_API_BASE"] = f"http://127.0.0.1:{args.port}"
+os.environ.setdefault("WHATSAPP_PHONE_NUMBER_ID", "bench")
+
+import httpx
+import whatsapp
+import outbox
+import inbox
+from main import app
+from bot_logic import handle_incoming_message
+from stub_graph import start_stub, stop_stub, stub_app
+from bench_stores import MemoryOutboxStore, MemoryInboxStore
+
+async def export_events():
+    from db import webhook_events_col
+    cursor = webhook_events_col.find({}, {"payload": 1}).sort("_id", -1).limit(args.limit)
+    docs = await cursor.to_list(length=args.limit)
+    with open(args.export, "w") as f:
+        for doc in reversed(docs):
+            f.write(json.dumps(doc["payload"]) + "\n")
+    print(f"Exported {len(docs)} payloads to {args.export}")
+
+def synthetic_burst():
+    payloads = []
+    for i in range(args.messages):
+        payloads.append({
+            "object": "whatsapp_business_account",
+            "entry": [{"changes": [{"value": {"messages": [{
+                "id": f"wamid.burst{i}",
+                "from": f"9180000{random.randrange(args.phones):05d}",
+                "type": "text",
+                "text": {"body": "hi"}
+            }]}}]}]
+        })
+    return payloads
+
+def with_redeliveries(payloads):
+    replay = list(payloads)
+    for p in random.sample(payloads, int(len(payloads) * args.redeliver)):
+        # Meta retries land shortly after the original, not at the end of the burst
+        replay.insert(min(len(replay), replay.index(p) + random.randint(1, 50)), p)
+    return replay
+
+async def run():
+    if args.export:
+        return await export_events()
+
+    if args.file:
+        with open(args.file) as f:
+            payloads = [json.loads(line) for line in f if line.strip()]
+    else:
+        payloads = with_redeliveries(synthetic_burst())
+    unique_ids = {m.get("id") for p in payloads for m in inbox.iter_messages(p)}
+
+    handled = {}
+
+    async def counting_handler(phone, text, lat=None, lon=None, image_id=None):
+        handled[phone] = handled.get(phone, 0) + 1
+        await handle_incoming_message(phone, text, lat, lon, image_id)
+
+    server, thread = start_stub(args.port, args.latency)
+    await outbox.start(MemoryOutboxStore())
+    await inbox.start(handler=counting_handler, store=MemoryInboxStore())
+    latencies = []
+    queue = iter(payloads)
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://burst") as client:
+        async def worker():
+            for payload in queue:
+                start = time.perf_counter()
+                res = await client.post("/webhook", json=payload)
+                res.raise_for_status()
+                latencies.append(time.perf_counter() - start)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        acked = time.perf_counter() - started
+        await inbox.drain()
+        await outbox.drain()
+        elapsed = time.perf_counter() - started
+
+    stats = inbox.metrics()
+    await inbox.stop()
+    await outbox.stop()
+    await whatsapp.close_client()
+    stop_stub(server, thread)
+
+    latencies.sort()
+    processed = sum(handled.values())
+    print(f"payloads:    {len(payloads)} ({len(unique_ids)} unique message ids)")
+    print(f"ack p50/p99: {statistics.median(latencies) * 1000:.2f} / {latencies[int(len(latencies) * 0.99) - 1] * 1000:.2f} ms")
+    print(f"ack rate:    {len(payloads) / acked:.0f} webhooks/s")
+    print(f"drained in:  {elapsed:.2f} s, {stub_app.state.received} Graph API calls")
+    print(f"processed:   {processed}, duplicates dropped: {stats['duplicates']}")
+    if processed != len(unique_ids):
+        print("FAIL: some messages were processed more than once or not at all")
+        return 1
+    print("OK: every message id was processed exactly once")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(run()))
@@ -0,0 +1,127 @@
+import os
+import asyncio
+import datetime
+from collections import namedtuple
+from pymongo import ReturnDocument, UpdateOne, DeleteOne, ReplaceOne
+from db import booth_pulse_col, booth_pulse_tallies_col
+
+# Booth Pulse votes. Each voter has one vote per booth, stored under _id "<booth>:<phone>".
+# A vote is a single pipeline upsert that applies the cool-down on the server: inside the
+# window the stored vote is left as it is, otherwise it is replaced, and the document from
+# before the write tells which of the two happened. Live results come from a per-booth tally
+# document kept current with $inc, so showing them costs one read however many people voted.
+# A background job rebuilds the tallies from the votes to correct any drift.
+
+BOOTH_PULSE_COOLDOWN = float(os.getenv("BOOTH_PULSE_COOLDOWN", "1800"))
+BOOTH_PULSE_RECONCILE_INTERVAL = float(os.getenv("BOOTH_PULSE_RECONCILE_INTERVAL", "600"))
+
+Vote = namedtuple("Vote", ["accepted", "retry_after", "counts", "total"])
+
+_task = None
+_stats = {"votes": 0, "changed": 0, "repeated": 0, "cooldowns": 0, "rebuilds": 0, "drift": 0, "converted": 0}
+
+def _key(phone, booth):
+    return f"{booth}:{phone}"
+
+def _utc(value):
+    return value if value is None or value.tzinfo else value.replace(tzinfo=datetime.timezone.utc)
+
+async def cast(phone, booth, choice):
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cooling = {"$gt": [{"$ifNull": ["$timestamp", datetime.datetime(1970, 1, 1)]},
+                       now - datetime.timedelta(seconds=BOOTH_PULSE_COOLDOWN)]}
+    before = await booth_pulse_col.find_one_and_update(
+        {"_id": _key(phone, booth)},
+        [{"$set": {
+            "phone": phone,
+            "booth": booth,
+            "vote": {"$cond": [cooling, "$vote", choice]},
+            "timestamp": {"$cond": [cooling, "$timestamp", now]}
+        }}],
+        upsert=True,
+        return_document=ReturnDocument.BEFORE
+    )
+    previous = before.get("vote") if before else None
+    if before and previous is not None:
+        waited = (now - _utc(before["timestamp"])).total_seconds()
+        if waited < BOOTH_PULSE_COOLDOWN:
+            _stats["cooldowns"] += 1
+            return Vote(False, BOOTH_PULSE_COOLDOWN - waited, None, None)
+
+    _stats["votes"] += 1
+    if previous == choice:
+        _stats["repeated"] += 1
+        tally = await booth_pulse_tallies_col.find_one({"_id": booth}) or {}
+    else:
+        inc = {f"counts.{choice}": 1}
+        if previous is None:
+            inc["total"] = 1
+        else:
+            inc[f"counts.{previous}"] = -1
+            _stats["changed"] += 1
+        tally = await booth_pulse_tallies_col.find_one_and_update({"_id": booth}, {"$inc": inc}, upsert=True,
+                                                                  return_document=ReturnDocument.AFTER)
+    return Vote(True, 0, tally.get("counts", {}), tally.get("total", 0))
+
+async def convert_legacy():
+    # Votes stored before this module had ObjectId ids (and could be duplicated by double
+    # taps); move each under its (booth, phone) key, keeping a newer keyed vote if there is one
+    legacy = await booth_pulse_col.find({"_id": {"$type": "objectId"}}).sort("timestamp", -1).to_list(length=None)
+    if not legacy:
+        return 0
+    ops = []
+    for doc in legacy:
+        key = _key(doc.get("phone"), doc.get("booth"))
+        fields = {"phone": doc.get("phone"), "booth": doc.get("booth"), "vote": doc.get("vote"), "timestamp": doc.get("timestamp")}
+        ops.append(UpdateOne({"_id": key}, {"$setOnInsert": fields}, upsert=True))
+        ops.append(DeleteOne({"_id": doc["_id"]}))
+    await booth_pulse_col.bulk_write(ops, ordered=True)
+    _stats["converted"] += len(legacy)
+    return len(legacy)
+
+async def rebuild():
+    # Recomputes every booth's tally from the votes themselves
+    rows = await booth_pulse_col.aggregate([
+        {"$group": {"_id": {"booth": "$booth", "vote": "$vote"}, "n": {"$sum": 1}}}
+    ]).to_list(length=None)
+    tallies = {}
+    for r in rows:
+        tally = tallies.setdefault(r["_id"]["booth"], {"_id": r["_id"]["booth"], "counts": {}, "total": 0})
+        tally["counts"][r["_id"]["vote"]] = r["n"]
+        tally["total"] += r["n"]
+    current = {t["_id"]: t for t in await booth_pulse_tallies_col.find().to_list(length=None)}
+    ops = []
+    for booth, tally in tallies.items():
+        old = current.get(booth)
+        if old is None or old.get("total") != tally["total"] or {k: v for k, v in old.get("counts", {}).items() if v} != tally["counts"]:
+            if old is not None:
+                _stats["drift"] += 1
+            ops.append(ReplaceOne({"_id": booth}, tally, upsert=True))
+    ops += [DeleteOne({"_id": booth}) for booth in current if booth not in tallies]
+    if ops:
+        await booth_pulse_tallies_col.bulk_write(ops, ordered=False)
+    _stats["rebuilds"] += 1
+    return tallies
+
+async def _reconcile_loop():
+    while True:
+        try:
+            await convert_legacy()
+            await rebuild()
+        except Exception as e:
+            print(f"Booth pulse reconcile failed: {e!r}")
+        await asyncio.sleep(BOOTH_PULSE_RECONCILE_INTERVAL)
+
+async def start():
+    global _task
+    _task = asyncio.create_task(_reconcile_loop())
+
+async def stop():
+    global _task
+    if _task:
+        _task.cancel()
+        await asyncio.gather(_task, return_exceptions=True)
+    _task = None
+
+def metrics():
+    return dict(_stats)
@@ -0,0 +1,252 @@
+import os
+import time
+import socket
+import asyncio
+import datetime
+from pymongo import UpdateOne, DeleteOne
+from pymongo.errors import DuplicateKeyError
+from db import booth_rollups_col, grievance_trends_col, grievances_col, migrations_col
+import schema
+import counters
+
+# Grievance counts per booth x category x status x day (the day the grievance was raised),
+# one document each in booth_rollups: {_id: "101|cat_2|Open|2026-03-14", booth, category,
+# status, day, n}. Kept current by counters.changed() on every insert, status change and
+# delete, and rebuilt from the grievances periodically to correct drift. The dashboard
+# analytics read only this collection, which holds one document per combination that
+# occurs instead of one per grievance.
+#
+# Every incremental update also bumps the document's version v. The rebuild snapshots the
+# versions before it scans the grievances and corrects only documents whose version is
+# unchanged when it writes, so updates that land during a rebuild are never overwritten.
+# One process at a time rebuilds, under a lease in the migrations collection.
+#
+# Volumes for the trends API are bucketed the same way by day, week (starting Monday) and
+# month in grievance_trends: {_id: "week|2026-03-09|101|cat_2", unit, start, booth,
+# category, n}. A trend over N buckets reads at most N x booths x categories documents,
+# however many grievances there are. All days are UTC.
+
+ROLLUP_REBUILD_INTERVAL = float(os.getenv("ROLLUP_REBUILD_INTERVAL", "3600"))
+REBUILD_BATCH = 1000
+PROJECTION = schema.projection("grievances", ["booth", "category", "status"])
+RESOLVED = ["Resolved"]  # everything else counts as open
+TREND_UNITS = ("day", "week", "month")
+REBUILD_LOCK = "booth_rollups:rebuild"
+OWNER = f"{socket.gethostname()}:{os.getpid()}"
+
+_task = None
+_stats = {"updates": 0, "failed": 0, "rebuilds": 0, "drift": 0, "skipped": 0}
+
+def key(doc):
+    r = schema.record("grievances", doc)
+    day = r.created_at.replace(hour=0, minute=0, second=0, microsecond=0) if r.created_at else None
+    return (str(r.booth or ""), r.category or "General", r.status or "Open", day)
+
+def _id(k):
+    booth, category, status, day = k
+    return f"{booth}|{category}|{status}|{day.strftime('%Y-%m-%d') if day else '-'}"
+
+def _fields(k):
+    booth, category, status, day = k
+    return {"booth": booth, "category": category, "status": status, "day": day}
+
+def _inc(k, delta):
+    return UpdateOne({"_id": _id(k)}, {"$inc": {"n": delta, "v": 1}, "$setOnInsert": _fields(k)}, upsert=True)
+
+def bucket(day, unit):
+    if unit == "week":
+        return day - datetime.timedelta(days=day.weekday())
+    if unit == "month":
+        return day.replace(day=1)
+    return day
+
+def next_bucket(start, unit):
+    if unit == "week":
+        return start + datetime.timedelta(days=7)
+    if unit == "month":
+        return (start + datetime.timedelta(days=32)).replace(day=1)
+    return start + datetime.timedelta(days=1)
+
+def trend_keys(k):
+    booth, category, _, day = k
+    return {(unit, bucket(day, unit), booth, category) for unit in TREND_UNITS} if day else set()
+
+def _trend_id(t):
+    unit, start, booth, category = t
+    return f"{unit}|{start.strftime('%Y-%m-%d')}|{booth}|{category}"
+
+def _trend_fields(t):
+    unit, start, booth, category = t
+    return {"unit": unit, "start": start, "booth": booth, "category": category}
+
+def _trend_inc(t, delta):
+    return UpdateOne({"_id": _trend_id(t)}, {"$inc": {"n": delta, "v": 1}, "$setOnInsert": _trend_fields(t)}, upsert=True)
+
+async def changed(col, before, after, deltas=None):
+    # counters.changed() listener
+    if col is not grievances_col:
+        return
+    old = key(before) if before is not None else None
+    new = key(after) if after is not None else None
+    if old == new:
+        return
+    ops = [_inc(k, d) for k, d in ((old, -1), (new, 1)) if k is not None]
+    # Status changes leave the trend buckets as they are
+    old_t, new_t = trend_keys(old) if old else set(), trend_keys(new) if new else set()
+    trend_ops = [_trend_inc(t, -1) for t in old_t - new_t] + [_trend_inc(t, 1) for t in new_t - old_t]
+    try:
+        writes = [booth_rollups_col.bulk_write(ops, ordered=False)]
+        if trend_ops:
+            writes.append(grievance_trends_col.bulk_write(trend_ops, ordered=False))
+        await asyncio.gather(*writes)
+        _stats["updates"] += 1
+    except Exception as e:
+        # The grievance itself is saved; the next rebuild fixes the rollup
+        _stats["failed"] += 1
+        print(f"Booth rollup update failed: {e!r}")
+
+async def _snapshot(col):
+    # _id -> (n, v) of every document, taken before the grievances are scanned
+    current = {}
+    async for doc in col.find({}, {"n": 1, "v": 1}):
+        current[doc["_id"]] = (doc.get("n", 0), doc.get("v"))
+    return current
+
+async def _sync(col, current, wanted):
+    # Makes col hold wanted ({_id: document}), writing only what differs and only where no
+    # incremental update has landed since the snapshot; those are checked on the next rebuild
+    ops = []
+    for i, doc in wanted.items():
+        stored = current.pop(i, None)
+        if stored is None:
+            ops.append(UpdateOne({"_id": i}, {"$setOnInsert": {**doc, "v": 0}}, upsert=True))
+        elif stored[0] != doc["n"]:
+            _stats["drift"] += 1
+            ops.append(UpdateOne({"_id": i, "v": stored[1]}, {"$set": {"n": doc["n"]}, "$inc": {"v": 1}}))
+    ops += [DeleteOne({"_id": i, "v": v}) for i, (n, v) in current.items()]  # combinations that no longer occur
+    for start in range(0, len(ops), REBUILD_BATCH):
+        result = await col.bulk_write(ops[start:start + REBUILD_BATCH], ordered=False)
+        _stats["skipped"] += len(ops[start:start + REBUILD_BATCH]) - result.matched_count - result.upserted_count - result.deleted_count
+
+async def rebuild():
+    rollups, trend_rollups = await asyncio.gather(_snapshot(booth_rollups_col), _snapshot(grievance_trends_col))
+    counts = {}
+    async for doc in grievances_col.find({}, PROJECTION).batch_size(REBUILD_BATCH):
+        k = key(doc)
+        counts[k] = counts.get(k, 0) + 1
+    trends = {}
+    for k, n in counts.items():
+        for t in trend_keys(k):
+            trends[t] = trends.get(t, 0) + n
+    await _sync(booth_rollups_col, rollups, {_id(k): {**_fields(k), "n": n} for k, n in counts.items()})
+    await _sync(grievance_trends_col, trend_rollups, {_trend_id(t): {**_trend_fields(t), "n": n} for t, n in trends.items()})
+    _stats["rebuilds"] += 1
+    return len(counts)
+
+async def _lead():
+    # True when this process holds the rebuild lease for the next interval
+    now = time.time()
+    try:
+        await migrations_col.find_one_and_update(
+            {"_id": REBUILD_LOCK, "$or": [{"until": {"$lt": now}}, {"owner": OWNER}]},
+            {"$set": {"owner": OWNER, "until": now + ROLLUP_REBUILD_INTERVAL * 0.9}}, upsert=True
+        )
+        return True
+    except DuplicateKeyError:
+        return False  # another process holds it
+
+def _match(since=None, booth=None):
+    match = {"n": {"$gt": 0}}
+    if since:
+        match["day"] = {"$gte": since}
+    if booth:
+        match["booth"] = booth
+    return match
+
+async def top_booths(limit=15, since=None):
+    rows = await booth_rollups_col.aggregate([
+        {"$match": {**_match(since), "booth": {"$ne": ""}}},
+        {"$group": {
+            "_id": "$booth",
+            "issues": {"$sum": "$n"},
+            "open": {"$sum": {"$cond": [{"$in": ["$status", RESOLVED]}, 0, "$n"]}},
+            "resolved": {"$sum": {"$cond": [{"$in": ["$status", RESOLVED]}, "$n", 0]}}
+        }},
+        {"$sort": {"issues": -1, "_id": 1}},
+        {"$limit": limit}
+    ]).to_list(length=limit)
+    return [{"booth": r["_id"], "issues": r["issues"], "open": r["open"], "resolved": r["resolved"]} for r in rows]
+
+async def category_mix(since=None, booth=None):
+    rows = await booth_rollups_col.aggregate([
+        {"$match": _match(since, booth)},
+        {"$group": {"_id": "$category", "count": {"$sum": "$n"}}},
+        {"$sort": {"count": -1, "_id": 1}}
+    ]).to_list(length=None)
+    return [{"category": r["_id"], "count": r["count"]} for r in rows]
+
+async def status_trend(since, booth=None):
+    # Per day raised: how many of that day's grievances are open and how many resolved now
+    rows = await booth_rollups_col.aggregate([
+        {"$match": _match(since, booth)},
+        {"$group": {
+            "_id": "$day",
+            "open": {"$sum": {"$cond": [{"$in": ["$status", RESOLVED]}, 0, "$n"]}},
+            "resolved": {"$sum": {"$cond": [{"$in": ["$status", RESOLVED]}, "$n", 0]}}
+        }},
+        {"$sort": {"_id": 1}}
+    ]).to_list(length=None)
+    return [{"date": r["_id"].strftime("%Y-%m-%d"), "open": r["open"], "resolved": r["resolved"]} for r in rows]
+
+async def trend(unit, periods, booth=None, categories=None, group_by=None):
+    # Grievances raised per bucket over the last `periods` buckets (the current one included),
+    # as one zero-filled series in total or one per booth / category
+    end = next_bucket(bucket(since_days(1), unit), unit)
+    start = end
+    for _ in range(periods):
+        start = bucket(start - datetime.timedelta(days=1), unit)
+    query = {"unit": unit, "start": {"$gte": start, "$lt": end}, "n": {"$gt": 0}}
+    if booth:
+        query["booth"] = booth
+    if categories:
+        query["category"] = {"$in": categories}
+    starts = []
+    s = start
+    while s < end:
+        starts.append(s)
+        s = next_bucket(s, unit)
+    index = {s: i for i, s in enumerate(starts)}
+    series = {}
+    async for doc in grievance_trends_col.find(query, {"_id": 0, "start": 1, "booth": 1, "category": 1, "n": 1}):
+        name = doc[group_by] if group_by else "all"
+        counts = series.setdefault(name, [0] * len(starts))
+        counts[index[doc["start"].replace(tzinfo=datetime.timezone.utc)]] += doc["n"]
+    return [s.strftime("%Y-%m-%d") for s in starts], series
+
+def since_days(days):
+    today = datetime.datetime.now(datetime.timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    return today - datetime.timedelta(days=days - 1) if days else None
+
+async def _rebuild_loop():
+    while True:
+        try:
+            if await _lead():
+                await rebuild()
+        except Exception as e:
+            print(f"Booth rollup rebuild failed: {e!r}")
+        await asyncio.sleep(ROLLUP_REBUILD_INTERVAL)
+
+async def start():
+    global _task
+    counters.subscribe(changed)
+    _task = asyncio.create_task(_rebuild_loop())
+
+async def stop():
+    global _task
+    if _task:
+        _task.cancel()
+        await asyncio.gather(_task, return_exceptions=True)
+    _task = None
+
+def metrics():
+    return dict(_stats)
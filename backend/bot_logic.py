@@ -1,40 +1,36 @@
 import time
-import asyncio
 import uuid
 import datetime
 import random
-from db import voters_collection, grievances_col, member_requests_col, booth_pulse_col
+from db import voters_collection, grievances_col, member_requests_col
 from whatsapp import send_text_message, send_image_message, send_button_message, send_list_message
-
-# Store sessions in memory { phone_number: { 'state': ..., 'last_active': ..., 'epic': ..., 'name': ..., 'booth': ... } }
-sessions = {}
+from session_store import create_session_store
+from flow_engine import FlowEngine, Intent, IntentTable, Capture, Message, with_text, with_photo
+import counters
+import activity
+import media_ingest
+import ref_ids
+import ref_index
+import schema
+import booth_pulse
+import epic_cache
+from static_assets import asset_urls
 
 SESSION_TIMEOUT = 1800 # 30 mins
 
+# Session store { phone_number: { 'state': ..., 'last_active': ..., 'epic': ..., 'name': ..., 'booth': ... } }
+sessions = create_session_store(SESSION_TIMEOUT)
+
 import os
 WHATSAPP_WEBHOOK_URL = os.getenv("WHATSAPP_WEBHOOK_URL", "http://127.0.0.1:3000/webhook")
 IMG_BASE = WHATSAPP_WEBHOOK_URL.replace("/webhook", "") + "/assets"
 
-IMG_URLS = {
-    "welcome_banner": f"{IMG_BASE}/welcome_banner.jpg?v=1",
-    "desc_banner": f"{IMG_BASE}/desc_banner.png?v=2",
-    "photo_banner": f"{IMG_BASE}/photo_banner.png?v=2",
-    "loc_banner": f"{IMG_BASE}/loc_banner.png?v=2",
-    "thank_you": f"{IMG_BASE}/thank_you.png?v={int(time.time())}",
-    "success": f"{IMG_BASE}/success.png?v=2",
-    "ward_connect": f"{IMG_BASE}/ward_connect.png?v=2",
-    "epic_not_found": f"{IMG_BASE}/epic_not_found.png?v=1",
-    "invite_1": f"{IMG_BASE}/invite_1.png?v=1",
-    "invite_2": f"{IMG_BASE}/invite_2.png?v=1",
-    "invite_3": f"{IMG_BASE}/invite_3.png?v=1",
-    "booth_results": f"{IMG_BASE}/booth_results.png?v=1",
-    "booth_cooldown": f"{IMG_BASE}/booth_cooldown.png?v=1",
-    "track_submission": f"{IMG_BASE}/track_submission.png?v=1",
-    "status_report": f"{IMG_BASE}/status_report.png?v=1",
-    "constituency_update": f"{IMG_BASE}/constituency_update.png?v=1",
-    "invalid_ref": f"{IMG_BASE}/invalid_ref.png?v=1",
-    "engagement_summary": f"{IMG_BASE}/engagement_summary.png?v=1"
-}
+IMG_URLS = asset_urls(IMG_BASE, [
+    "welcome_banner", "desc_banner", "photo_banner", "loc_banner", "thank_you", "success",
+    "ward_connect", "epic_not_found", "invite_1", "invite_2", "invite_3", "booth_results",
+    "booth_cooldown", "track_submission", "status_report", "constituency_update", "invalid_ref",
+    "engagement_summary"
+])
 
 CAT_MAP = {
     "cat_1": "Water & Drainage", "cat_2": "Roads & Infra", "cat_3": "Electricity",
@@ -55,103 +51,35 @@ PULSE_DATA = {
 
 async def handle_incoming_message(phone, incoming_text, lat=None, lon=None, image_id=None):
     current_time = time.time()
-    session = sessions.get(phone, None)
+    session = await sessions.get(phone)
     
     cancel_keywords = ["hi", "hello", "start", "menu", "reset", "vanakkam"]
     if incoming_text and incoming_text.lower() in cancel_keywords:
-        sessions[phone] = {"state": "ASK_HAS_EPIC", "last_active": current_time}
-        send_welcome(phone)
+        await sessions.put(phone, {"state": "ASK_HAS_EPIC", "last_active": current_time})
+        await send_welcome(phone)
         return
         
     if session and (current_time - session["last_active"] > SESSION_TIMEOUT):
         session = None
         
     if not session:
-        sessions[phone] = {"state": "ASK_HAS_EPIC", "last_active": current_time}
-        send_welcome(phone)
+        await sessions.put(phone, {"state": "ASK_HAS_EPIC", "last_active": current_time})
+        await send_welcome(phone)
         return
 
     state = session.get("state")
     session["last_active"] = current_time
-
-    if state == "ASK_HAS_EPIC":
-        await handle_ask_has_epic(phone, incoming_text, session)
-    elif state == "ASK_EPIC":
-        await verify_epic(phone, incoming_text, session)
-    elif state == "MAIN_MENU":
-        await handle_main_menu(phone, incoming_text, session)
-    elif state == "FLOW1_CAT":
-        handle_flow1_cat(phone, incoming_text, session)
-    elif state == "FLOW1_DESC":
-        handle_flow1_desc(phone, incoming_text, session)
-    elif state == "FLOW1_PHOTO":
-        handle_flow1_photo(phone, image_id, incoming_text, session)
-    elif state == "FLOW1_LOC":
-        await handle_loc_skip(phone, incoming_text, lat, lon, session, "FLOW1")
-
-    elif state == "FLOW2_SUGG":
-        handle_flow2_sugg(phone, incoming_text, session)
-    elif state == "FLOW2_LOC":
-        await handle_loc_skip(phone, incoming_text, lat, lon, session, "FLOW2")
-
-    elif state == "FLOW3_MODE":
-        handle_flow3_mode(phone, incoming_text, session)
-    elif state == "FLOW3_LOC":
-        await handle_loc_skip(phone, incoming_text, lat, lon, session, "FLOW3")
-
-    elif state == "FLOW4_LOC":
-        await handle_loc_skip(phone, incoming_text, lat, lon, session, "FLOW4")
-
-    elif state == "FLOW5_REF":
-        await handle_flow5_ref(phone, incoming_text, session)
-
-    elif state == "FLOW7_POLL":
-        await handle_flow7_poll(phone, incoming_text, session)
-
-    elif state == "FLOW8_CAT":
-        handle_flow8_cat(phone, incoming_text, session)
-    elif state == "FLOW8_PHOTO":
-        handle_flow8_photo(phone, image_id, incoming_text, session)
-    elif state == "FLOW8_LOC":
-        await handle_loc_skip(phone, incoming_text, lat, lon, session, "FLOW8")
-        
-    elif state == "POST_FLOW_EPIC":
-        await handle_post_flow_epic(phone, incoming_text, session)
-    elif state == "POST_FLOW_NAME":
-        await handle_post_flow_name(phone, incoming_text, session)
-        
-    elif state == "FLOW9_NETWORKS":
-        await handle_flow9_networks(phone, incoming_text, session)
-        
-    elif state == "LOOP_PROMPT":
-        if incoming_text and incoming_text.lower() == "btn_main_menu":
-            session["state"] = "MAIN_MENU"
-            await send_main_menu(phone, session)
-        elif incoming_text and ("ward" in incoming_text.lower() or "connect" in incoming_text.lower()):
-             # Trigger ward connect logic
-             await handle_main_menu(phone, "menu_10", session)
-        elif incoming_text and ("tvk" in incoming_text.lower() or "family" in incoming_text.lower() or "itwing" in incoming_text.lower() or "btn_tvk" in incoming_text.lower() or "invite" in incoming_text.lower() or "btn_invite" in incoming_text.lower()):
-             # Directly handle the network/invite selection
-             await handle_flow9_networks(phone, incoming_text, session)
-        else:
-             # If they type something else, just take them to main menu
-             session["state"] = "MAIN_MENU" 
-             await send_main_menu(phone, session)
-    elif state == "MAIN_MENU":
-        if incoming_text and incoming_text.lower() == "btn_activity_report":
-             await handle_main_menu(phone, "internal_summary", session)
-        elif incoming_text and incoming_text.lower() == "btn_track_ref":
-             await handle_main_menu(phone, "internal_track", session)
-        else:
-             await handle_main_menu(phone, incoming_text, session)
-    elif state == "DONE":
-        await send_loop_prompt(phone, session)
-    else:
-        # Fallback
-        sessions[phone] = {"state": "ASK_HAS_EPIC", "last_active": current_time}
-        send_welcome(phone)
-
-def send_welcome(phone):
+    try:
+        if not await engine.dispatch(state, Message(phone, incoming_text, lat, lon, image_id), session):
+            # Unknown state: start over
+            session.clear()
+            session.update({"state": "ASK_HAS_EPIC", "last_active": current_time})
+            await send_welcome(phone)
+    finally:
+        # Handlers mutate the session in place; persist whatever they left behind
+        await sessions.put(phone, session)
+
+async def send_welcome(phone):
     msg = """Vanakkam 🙏
 
 This is the official WhatsApp of Venkatraman, TVK Candidate – Kavundampalayam.
@@ -159,35 +87,35 @@ This is the official WhatsApp of Venkatraman, TVK Candidate – Kavundampalayam.
 We are building a structured, booth-level understanding of issues in this constituency so that future priorities are based on real voter input.
 
 *Do you already have a Voter ID (EPIC number)?*"""
-    send_button_message(phone, msg, [
+    await send_button_message(phone, msg, [
         {"id": "btn_have_epic", "title": "✅ Have Voter ID"},
         {"id": "btn_no_epic", "title": "❌ Don't Have"}
     ], IMG_URLS["welcome_banner"])
 
 async def handle_ask_has_epic(phone, text, session):
-    text_lower = text.lower() if text else ""
-    if "btn_have_epic" in text_lower or "have" in text_lower or "yes" in text_lower:
+    answer = HAS_EPIC_INTENTS.match(text)
+    if answer == "yes":
         session["state"] = "ASK_EPIC"
         msg = "Please enter your EPIC number (Voter ID number).\n\nExample: ABC123456"
-        send_image_message(phone, IMG_URLS["welcome_banner"], msg)
-    elif "btn_no_epic" in text_lower or "don" in text_lower or "no" in text_lower:
+        await send_image_message(phone, IMG_URLS["welcome_banner"], msg)
+    elif answer == "no":
         session["state"] = "MAIN_MENU"
         session["name"] = "Citizen"
         session["booth"] = "Not provided yet"
         session["epic"] = None
         await send_main_menu(phone, session)
     else:
-        send_text_message(phone, "Please select an option using the buttons.")
+        await send_text_message(phone, "Please select an option using the buttons.")
 
 async def verify_epic(phone, epic, session):
     epic = epic.upper().strip()
     
     if len(epic) < 5 or len(epic) > 20:
         msg = "We could not locate this EPIC number in our constituency records.\n\nPlease enter correct EPIC number."
-        send_image_message(phone, IMG_URLS["epic_not_found"], msg)
+        await send_image_message(phone, IMG_URLS["epic_not_found"], msg)
         return
 
-    voter = await voters_collection.find_one({"voterId": epic})
+    voter = await epic_cache.lookup(epic)
     if voter:
         name = voter.get("name", "Unknown Voter")
         booth = str(voter.get("partNumber", "Unknown"))
@@ -199,7 +127,7 @@ async def verify_epic(phone, epic, session):
         await send_main_menu(phone, session)
     else:
         msg = "No matching database stored data.\n\nPlease enter correct EPIC number."
-        send_image_message(phone, IMG_URLS["epic_not_found"], msg)
+        await send_image_message(phone, IMG_URLS["epic_not_found"], msg)
         return
 
 async def send_main_menu(phone, session):
@@ -264,21 +192,24 @@ We are documenting concerns so that future priorities are shaped by real people
             ]
         }
     ]
-    send_list_message(phone, text, "Select Option", sections)
+    await send_list_message(phone, text, "Select Option", sections)
 
 async def handle_main_menu(phone, text, session):
-    sel = text.lower() if text else ""
+    action = MAIN_MENU_ACTIONS.get(MAIN_MENU_INTENTS.match(text))
+    if action is None:
+        await send_text_message(phone, "Please select a valid option from the menu.")
+        return
+    await action(phone, session)
+
+async def menu_invite(phone, session):
+    await handle_flow9_networks(phone, "btn_invite", session)
+
+async def menu_ward_connect(phone, session):
+    booth = session.get('booth', 'Unknown')
+    name = "Suresh Murugan"
+    phone_num = "+919876543210"
     
-    if sel == "menu_11" or "btn_invite" in sel:
-        # Prioritize Invite click to avoid shadowing
-        await handle_flow9_networks(phone, "btn_invite", session)
-
-    elif "menu_10" in sel or "ward" in sel:
-        booth = session.get('booth', 'Unknown')
-        name = "Suresh Murugan"
-        phone_num = "+919876543210"
-        
-        msg = f"""📞 *Ward Connect — Booth {booth}*
+    msg = f"""📞 *Ward Connect — Booth {booth}*
 
 Our movement is growing! There are currently *47 active participants* in your booth.
 
@@ -292,74 +223,61 @@ Your designated Ward Coordinator is available for immediate support and coordina
 https://wa.me/{phone_num.replace('+', '')}
 
 _Click the link above to start a voice call or chat._"""
-        send_image_message(phone, IMG_URLS["ward_connect"], msg)
-        send_button_message(phone, "Would you like to explore other options?", [{"id": "btn_main_menu", "title": "🏠 Main Menu"}], None)
-        session["state"] = "LOOP_PROMPT"
-
-    elif sel == "menu_1" or ("report" in sel and "issue" in sel):
-        session["state"] = "FLOW1_CAT"
-        sections = [{"title": "Categories", "rows": [
-            {"id": "cat_1", "title": "Water & Drainage"},
-            {"id": "cat_2", "title": "Roads & Infra"},
-            {"id": "cat_3", "title": "Electricity"},
-            {"id": "cat_4", "title": "Public Transport"},
-            {"id": "cat_5", "title": "Education"},
-            {"id": "cat_6", "title": "Healthcare"},
-            {"id": "cat_7", "title": "Agriculture & Farmers"},
-            {"id": "cat_8", "title": "Women Safety"},
-            {"id": "cat_9", "title": "Sports & Youth"},
-            {"id": "cat_10", "title": "Others"},
-        ]}]
-        msg = f"Thank you, {session['name']}.\nPlease select the area where you are facing a concern:"
-        send_list_message(phone, msg, "Select Category", sections, "📝 Report an Issue")
-        
-    elif sel == "menu_2" or "idea" in sel or "improve" in sel:
-        session["state"] = "FLOW2_SUGG"
-        msg = "We believe strong constituencies are built not just by solving issues, but by listening to constructive ideas.\n\nPlease share your suggestion in up to 250 characters."
-        send_image_message(phone, IMG_URLS["desc_banner"], msg)
-    
-    elif sel == "menu_3" or "participate" in sel:
-        session["state"] = "FLOW3_MODE"
-        msg = f"🤝 Participate\n\nThat's encouraging to hear, {session['name']}.\nHow would you like to participate?"
-        sections = [{"title": "Roles", "rows": [
-            {"id": "vol_1", "title": "Volunteer @ Booth"},
-            {"id": "vol_2", "title": "Organise Meetings"},
-            {"id": "vol_3", "title": "Spread Information"},
-            {"id": "vol_4", "title": "Future Coordination"}
-        ]}]
-        send_list_message(phone, msg, "Select Mode", sections)
-        
-    elif sel == "menu_4" or "informed" in sel:
-        session["state"] = "FLOW4_LOC"
-        body = "Please share your location (Pin or Live Location) to receive updates specific to your area.\n\nYou may also type SKIP or use the button below."
-        send_button_message(phone, body, [{"id": "skip_loc", "title": "SKIP"}], IMG_URLS["loc_banner"])
-        
-    elif sel == "menu_5" or "track" in sel:
-        session["state"] = "FLOW5_REF"
-        send_image_message(phone, IMG_URLS["track_submission"], "🔍 *Track Your Submission*\n\nPlease enter your Reference ID to check the current status.\n_Example: GRV12345_")
-
-    elif sel == "menu_6" or "activity" in sel:
-        # Directly trigger activity summary logic
-        await handle_main_menu(phone, "internal_summary", session)
-
-
-    elif "internal_track" in sel:
-        session["state"] = "FLOW5_REF"
-        send_image_message(phone, IMG_URLS["track_submission"], "🔍 Track Your Submission\n\nPlease enter your Reference ID to check the current status.\nExample: GRV12345")
-
-    elif "internal_summary" in sel:
-        # Load real data from mongodb 2
-        issues_raised = await grievances_col.count_documents({"phoneNumber": phone}) or await grievances_col.count_documents({"voter_phone": phone})
-        issues_open = await grievances_col.count_documents({"$and": [{"status": "Open"}, {"$or": [{"phoneNumber": phone}, {"voter_phone": phone}]}]})
-        issues_prog = await grievances_col.count_documents({"$and": [{"status": "In Progress"}, {"$or": [{"phoneNumber": phone}, {"voter_phone": phone}]}]})
-        issues_res = await grievances_col.count_documents({"$and": [{"status": "Resolved"}, {"$or": [{"phoneNumber": phone}, {"voter_phone": phone}]}]})
-        sugg_count = await member_requests_col.count_documents({"$and": [{"$or": [{"type": "Suggestion"}, {"referenceId": {"$regex": "^MBR"}}]}, {"$or": [{"phoneNumber": phone}, {"voter_phone": phone}]}]})
-        vol_req = await member_requests_col.find_one({"$and": [{"type": "Volunteer"}, {"$or": [{"phoneNumber": phone}, {"voter_phone": phone}]}]})
-        vol_status = "Registered" if vol_req else "None"
-        vol_role_raw = vol_req.get("role", "N/A") if vol_req else "N/A"
-        vol_role = CAT_MAP.get(vol_role_raw, vol_role_raw)
-
-        send_image_message(phone, IMG_URLS["engagement_summary"], f"""📋 Your Engagement Summary\n\n👤 {session['name']} | Booth {session['booth']} | Kavundampalayam
+    await send_image_message(phone, IMG_URLS["ward_connect"], msg)
+    await send_button_message(phone, "Would you like to explore other options?", [{"id": "btn_main_menu", "title": "🏠 Main Menu"}], None)
+    session["state"] = "LOOP_PROMPT"
+
+async def menu_report_issue(phone, session):
+    session["state"] = "FLOW1_CAT"
+    sections = [{"title": "Categories", "rows": [
+        {"id": "cat_1", "title": "Water & Drainage"},
+        {"id": "cat_2", "title": "Roads & Infra"},
+        {"id": "cat_3", "title": "Electricity"},
+        {"id": "cat_4", "title": "Public Transport"},
+        {"id": "cat_5", "title": "Education"},
+        {"id": "cat_6", "title": "Healthcare"},
+        {"id": "cat_7", "title": "Agriculture & Farmers"},
+        {"id": "cat_8", "title": "Women Safety"},
+        {"id": "cat_9", "title": "Sports & Youth"},
+        {"id": "cat_10", "title": "Others"},
+    ]}]
+    msg = f"Thank you, {session['name']}.\nPlease select the area where you are facing a concern:"
+    await send_list_message(phone, msg, "Select Category", sections, "📝 Report an Issue")
+
+async def menu_ideas(phone, session):
+    session["state"] = "FLOW2_SUGG"
+    msg = "We believe strong constituencies are built not just by solving issues, but by listening to constructive ideas.\n\nPlease share your suggestion in up to 250 characters."
+    await send_image_message(phone, IMG_URLS["desc_banner"], msg)
+
+async def menu_participate(phone, session):
+    session["state"] = "FLOW3_MODE"
+    msg = f"🤝 Participate\n\nThat's encouraging to hear, {session['name']}.\nHow would you like to participate?"
+    sections = [{"title": "Roles", "rows": [
+        {"id": "vol_1", "title": "Volunteer @ Booth"},
+        {"id": "vol_2", "title": "Organise Meetings"},
+        {"id": "vol_3", "title": "Spread Information"},
+        {"id": "vol_4", "title": "Future Coordination"}
+    ]}]
+    await send_list_message(phone, msg, "Select Mode", sections)
+
+async def menu_stay_informed(phone, session):
+    session["state"] = "FLOW4_LOC"
+    body = "Please share your location (Pin or Live Location) to receive updates specific to your area.\n\nYou may also type SKIP or use the button below."
+    await send_button_message(phone, body, [{"id": "skip_loc", "title": "SKIP"}], IMG_URLS["loc_banner"])
+
+async def menu_track(phone, session):
+    session["state"] = "FLOW5_REF"
+    await send_image_message(phone, IMG_URLS["track_submission"], f"🔍 *Track Your Submission*\n\nPlease enter your Reference ID to check the current status.\n_Example: {ref_ids.EXAMPLE}_")
+
+async def menu_activity_summary(phone, session):
+    s = await activity.summary(phone)
+    issues_raised, issues_open, issues_prog, issues_res = s["raised"], s["open"], s["in_progress"], s["resolved"]
+    sugg_count = s["suggestions"]
+    vol_status = "Registered" if s["volunteer_role"] is not None else "None"
+    vol_role_raw = s["volunteer_role"] or "N/A"
+    vol_role = CAT_MAP.get(vol_role_raw, vol_role_raw)
+
+    await send_image_message(phone, IMG_URLS["engagement_summary"], f"""📋 Your Engagement Summary\n\n👤 {session['name']} | Booth {session['booth']} | Kavundampalayam
 ───────────────
 🔴 Issues Raised: {issues_raised}
 ├ Open: {issues_open}
@@ -373,161 +291,125 @@ _Click the link above to start a voice call or chat._"""
 
  Booth Pulse: Voted
 ───────────────""")
-        await send_loop_prompt(phone, session)
-
-        
-    elif sel == "menu_7" or "pulse" in sel:
-        session["state"] = "FLOW7_POLL"
-        msg = "📊 Booth Pulse — Quick Poll\n\nHelp us understand the biggest concern in your area right now.\nWhat is the #1 issue affecting your daily life?"
-        sections = [{"title": "Options", "rows": [
-            {"id": "poll_1", "description": "💧 Water & Drainage", "title": "Water & Drainage"},
-            {"id": "poll_2", "description": "🛣️ Roads & Infrastructure", "title": "Roads & Infra"},
-            {"id": "poll_3", "description": "⚡ Electricity & Power Cuts", "title": "Electricity"},
-            {"id": "poll_4", "description": "🏫 Education & Schools", "title": "Education"}
-        ]}]
-        send_list_message(phone, msg, "Vote Now", sections)
-        
-    elif sel == "menu_8" or "photo" in sel:
-        session["state"] = "FLOW8_CAT"
-        msg = "📸 Submit Photo Evidence\n\nYou can send a photo of any local issue — broken road, garbage dump, water leakage, damaged public property, etc.\n\nFirst, select the category:"
-        sections = [{"title": "Categories", "rows": [
-            {"id": "pcat_1", "title": "Water & Drainage"},
-            {"id": "pcat_2", "title": "Roads & Infra"},
-            {"id": "pcat_3", "title": "Electricity"},
-            {"id": "pcat_4", "title": "Garbage & Sanitation"},
-            {"id": "pcat_5", "title": "Public Property Damage"},
-            {"id": "pcat_6", "title": "Others"}
-        ]}]
-        send_list_message(phone, msg, "Select Category", sections)
-
-    elif sel == "menu_9" or "network" in sel:
-        session["state"] = "FLOW9_NETWORKS"
-        msg = "🌐 *TVK Movement & Networks*\n\nExplore our digital initiatives or invite others to join the cause:"
-        send_button_message(phone, msg, [
-            {"id": "btn_tvk_family", "title": "🌐 TVK Family"},
-            {"id": "btn_tvk_itwing", "title": "💻 TVK IT Wing"},
-            {"id": "btn_invite", "title": "👥 Invite Voter"}
-        ], IMG_URLS["welcome_banner"])
-        
-    else:
-        send_text_message(phone, "Please select a valid option from the menu.")
+    await send_loop_prompt(phone, session)
 
+async def menu_booth_pulse(phone, session):
+    session["state"] = "FLOW7_POLL"
+    msg = "📊 Booth Pulse — Quick Poll\n\nHelp us understand the biggest concern in your area right now.\nWhat is the #1 issue affecting your daily life?"
+    sections = [{"title": "Options", "rows": [
+        {"id": "poll_1", "description": "💧 Water & Drainage", "title": "Water & Drainage"},
+        {"id": "poll_2", "description": "🛣️ Roads & Infrastructure", "title": "Roads & Infra"},
+        {"id": "poll_3", "description": "⚡ Electricity & Power Cuts", "title": "Electricity"},
+        {"id": "poll_4", "description": "🏫 Education & Schools", "title": "Education"}
+    ]}]
+    await send_list_message(phone, msg, "Vote Now", sections)
+
+async def menu_photo_evidence(phone, session):
+    session["state"] = "FLOW8_CAT"
+    msg = "📸 Submit Photo Evidence\n\nYou can send a photo of any local issue — broken road, garbage dump, water leakage, damaged public property, etc.\n\nFirst, select the category:"
+    sections = [{"title": "Categories", "rows": [
+        {"id": "pcat_1", "title": "Water & Drainage"},
+        {"id": "pcat_2", "title": "Roads & Infra"},
+        {"id": "pcat_3", "title": "Electricity"},
+        {"id": "pcat_4", "title": "Garbage & Sanitation"},
+        {"id": "pcat_5", "title": "Public Property Damage"},
+        {"id": "pcat_6", "title": "Others"}
+    ]}]
+    await send_list_message(phone, msg, "Select Category", sections)
+
+async def menu_networks(phone, session):
+    session["state"] = "FLOW9_NETWORKS"
+    msg = "🌐 *TVK Movement & Networks*\n\nExplore our digital initiatives or invite others to join the cause:"
+    await send_button_message(phone, msg, [
+        {"id": "btn_tvk_family", "title": "🌐 TVK Family"},
+        {"id": "btn_tvk_itwing", "title": "💻 TVK IT Wing"},
+        {"id": "btn_invite", "title": "👥 Invite Voter"}
+    ], IMG_URLS["welcome_banner"])
 
-def handle_flow1_cat(phone, text, session):
-    session["cat"] = text
-    session["state"] = "FLOW1_DESC"
+async def prompt_flow1_desc(phone, session):
     body = "Please describe the situation briefly (up to 250 characters).\n\nSpecific details help us understand recurring patterns in your booth."
-    send_button_message(phone, body, [{"id": "skip_desc", "title": "SKIP"}], IMG_URLS["desc_banner"])
+    await send_button_message(phone, body, [{"id": "skip_desc", "title": "SKIP"}], IMG_URLS["desc_banner"])
 
-def handle_flow1_desc(phone, text, session):
-    session["desc"] = "" if (text and text.lower() == "skip_desc") else text
-    session["state"] = "FLOW1_PHOTO"
+async def prompt_flow1_photo(phone, session):
     body = "Thank you for the information. Now, please share a photo of the issue if possible.\n\nVisual evidence helps our team assess the situation faster."
-    send_button_message(phone, body, [{"id": "skip_photo", "title": "SKIP"}], IMG_URLS["photo_banner"])
+    await send_button_message(phone, body, [{"id": "skip_photo", "title": "SKIP"}], IMG_URLS["photo_banner"])
 
-def handle_flow1_photo(phone, image_id, text, session):
+async def handle_flow1_photo(phone, image_id, text, session):
     is_skip = (text and "skip" in text.lower())
     
     if image_id:
         session["photo_id"] = image_id
-        send_text_message(phone, "Thank you! This image is very helpful for our analysis.")
+        await media_ingest.submit(image_id)
+        await send_text_message(phone, "Thank you! This image is very helpful for our analysis.")
     elif not is_skip and text:
         # If they sent text instead of an image and it's not a skip
-        send_text_message(phone, "Thank you for the update!")
+        await send_text_message(phone, "Thank you for the update!")
 
     session["state"] = "FLOW1_LOC"
     body = "To help us identify the exact spot and resolve it faster, please share the location of the issue (Pin or Live Location)."
-    send_button_message(phone, body, [{"id": "skip_loc", "title": "SKIP"}], IMG_URLS["loc_banner"])
+    await send_button_message(phone, body, [{"id": "skip_loc", "title": "SKIP"}], IMG_URLS["loc_banner"])
 
-def handle_flow2_sugg(phone, text, session):
-    session["sugg"] = text
-    session["state"] = "FLOW2_LOC"
+async def prompt_flow2_loc(phone, session):
     body = "Please share the location related to your suggestion (Pin or Live Location) so we can understand the context better.\n\nYou may also type SKIP or use the button below."
-    send_button_message(phone, body, [{"id": "skip_loc", "title": "SKIP"}], IMG_URLS["loc_banner"])
+    await send_button_message(phone, body, [{"id": "skip_loc", "title": "SKIP"}], IMG_URLS["loc_banner"])
 
-def handle_flow3_mode(phone, text, session):
-    session["vol_role"] = text
-    session["state"] = "FLOW3_LOC"
+async def prompt_flow3_loc(phone, session):
     body = "Please share your location (Pin or Live Location) so our local organiser can reach you easily.\n\nYou may also type SKIP or use the button below."
-    send_button_message(phone, body, [{"id": "skip_loc", "title": "SKIP"}], IMG_URLS["loc_banner"])
+    await send_button_message(phone, body, [{"id": "skip_loc", "title": "SKIP"}], IMG_URLS["loc_banner"])
 
 async def handle_flow5_ref(phone, text, session):
-    ref = text.upper() if text else ""
-    if not any(ref.startswith(prefix) for prefix in ["GRV", "SUG", "VOL", "PHT"]):
-        send_image_message(phone, IMG_URLS["invalid_ref"], "Please enter a valid Reference ID starting with GRV, SUG, VOL, or PHT.\nExample: GRV12345")
+    ref = ref_ids.normalize(text)
+    if not any(ref.startswith(prefix) for prefix in ref_ids.PREFIXES):
+        await send_image_message(phone, IMG_URLS["invalid_ref"], f"Please enter a valid Reference ID starting with GRV, SUG, VOL, or PHT.\nExample: {ref_ids.EXAMPLE}")
+        return
+    if not ref_ids.is_valid(ref):
+        # Check digit mismatch: almost always a typo, no need to search for it
+        await send_image_message(phone, IMG_URLS["invalid_ref"], f"{ref} is not a valid Reference ID. Please check it for typos and try again.\nExample: {ref_ids.EXAMPLE}")
         return
     
-    record = await grievances_col.find_one({"$or": [{"ref_id": ref}, {"ticketId": ref}]})
-    if not record:
-        record = await member_requests_col.find_one({"$or": [{"ref_id": ref}, {"referenceId": ref}]})
-        
-    if record:
-        cat_raw = record.get("category") or record.get("suggestion") or "General"
+    col, doc = await ref_index.find(ref)
+
+    if doc:
+        record = schema.record(schema.name_of(col), doc)
+        cat_raw = record.category or record.suggestion or "General"
         cat = CAT_MAP.get(cat_raw, cat_raw)
-        desc = record.get("description") or record.get("message") or ""
-        booth = str(record.get("booth") or record.get("partNumber") or session.get('booth', 'Unknown'))
-        date = record.get("timestamp") or (record.get("createdAt").strftime("%d %b %Y") if record.get("createdAt") else "N/A")
+        desc = record.description or ""
+        booth = record.booth or session.get('booth', 'Unknown')
+        date = schema.format_date(record.created_at, "N/A")
 
-        send_image_message(phone, IMG_URLS["status_report"], f"""📋 Status Report\n
+        await send_image_message(phone, IMG_URLS["status_report"], f"""📋 Status Report\n
 ───────────────
 🔖 Reference: {ref}
-📁 Type: {record.get('type', 'Grievance')}
+📁 Type: {record.type or 'Grievance'}
 🏷️ Category: {cat}
 📝 Issue: {desc[:50] + '...' if len(desc) > 50 else desc}
 🏛️ Booth: {booth}
 📅 Submitted: {date}
 ───────────────\n
-⏳ Status: {record.get('status', 'Open')}\n
+⏳ Status: {record.status or 'Open'}\n
 Your submission is on file. Our team will follow up as needed.""")
     else:
-        send_text_message(phone, f"We could not find any record matching {ref}.\n\nPlease double-check your Reference ID and try again.")
+        await send_text_message(phone, f"We could not find any record matching {ref}.\n\nPlease double-check your Reference ID and try again.")
     await send_loop_prompt(phone, session)
 
 async def handle_flow7_poll(phone, text, session):
-    sel = text.lower() if text else ""
-    vote_val = ""
-    if "poll_1" in sel or "water" in sel: vote_val = "poll_1"
-    elif "poll_2" in sel or "road" in sel: vote_val = "poll_2"
-    elif "poll_3" in sel or "electr" in sel: vote_val = "poll_3"
-    elif "poll_4" in sel or "educat" in sel: vote_val = "poll_4"
-    
+    vote_val = POLL_INTENTS.match(text)
     if not vote_val:
-        send_text_message(phone, "Please select an option from the list above to vote.")
+        await send_text_message(phone, "Please select an option from the list above to vote.")
         return
 
     booth = session.get("booth", "Unknown")
-    
-    # Check if already voted (30-min cooldown)
-    existing = await booth_pulse_col.find_one({"phone": phone, "booth": booth})
-    if existing:
-        vote_time = existing.get("timestamp")
-        # Ensure it's a datetime object
-        if isinstance(vote_time, datetime.datetime):
-            time_diff = (datetime.datetime.now() - vote_time).total_seconds()
-            if time_diff < 1800:
-                mins_left = int((1800 - time_diff) / 60)
-                send_image_message(phone, IMG_URLS["booth_cooldown"], f"📊 *Booth Pulse - Cool-down*\n\nYour voice has been recorded recently. To keep the live results balanced, you can update your pulse again in *{mins_left} minutes*.\n\n_Stay tuned for live updates!_")
-                await send_loop_prompt(phone, session)
-                return
-        # If older than 30 mins, delete old vote to allow new one
-        await booth_pulse_col.delete_one({"_id": existing["_id"]})
-
-    # Save vote
-    await booth_pulse_col.insert_one({
-        "phone": phone,
-        "booth": booth,
-        "vote": vote_val,
-        "timestamp": datetime.datetime.now()
-    })
-
-    # Calculate Live Results for this Booth
-    results = await booth_pulse_col.aggregate([
-        {"$match": {"booth": booth}},
-        {"$group": {"_id": "$vote", "count": {"$sum": 1}}}
-    ]).to_list(None)
-    
-    counts = {r["_id"]: r["count"] for r in results}
-    total = sum(counts.values()) or 1
+
+    # One atomic upsert: records the vote unless the previous one is inside the 30-min cool-down
+    vote = await booth_pulse.cast(phone, booth, vote_val)
+    if not vote.accepted:
+        mins_left = int(vote.retry_after / 60)
+        await send_image_message(phone, IMG_URLS["booth_cooldown"], f"📊 *Booth Pulse - Cool-down*\n\nYour voice has been recorded recently. To keep the live results balanced, you can update your pulse again in *{mins_left} minutes*.\n\n_Stay tuned for live updates!_")
+        await send_loop_prompt(phone, session)
+        return
+
+    counts = vote.counts
+    total = vote.total or 1
     
     poll_map = {
         "poll_1": "💧 Water & Drainage",
@@ -547,21 +429,20 @@ async def handle_flow7_poll(phone, text, session):
         
     result_str += f"\n🗳️ *Total Votes: {total} from Booth {booth}*\n\nThis data directly shapes our constituency priorities."
     
-    send_image_message(phone, IMG_URLS["booth_results"], result_str)
+    await send_image_message(phone, IMG_URLS["booth_results"], result_str)
 
     await send_loop_prompt(phone, session)
 
-def handle_flow8_cat(phone, text, session):
-    session["photo_cat"] = text
-    session["state"] = "FLOW8_PHOTO"
-    send_button_message(phone, "Now please send a photo of the issue.\nYou can add a caption describing the problem along with the photo.", [{"id": "skip_photo", "title": "SKIP Photo"}], IMG_URLS["photo_banner"])
+async def prompt_flow8_photo(phone, session):
+    await send_button_message(phone, "Now please send a photo of the issue.\nYou can add a caption describing the problem along with the photo.", [{"id": "skip_photo", "title": "SKIP Photo"}], IMG_URLS["photo_banner"])
 
-def handle_flow8_photo(phone, image_id, text, session):
+async def handle_flow8_photo(phone, image_id, text, session):
     session["state"] = "FLOW8_LOC"
     session["photo_desc"] = "" if (text and text.lower() == "skip_photo") else text
     if image_id:
         session["photo_id"] = image_id
-    send_button_message(phone, "Photo received. Now please share the location of this issue (Pin or Live Location).", [{"id": "skip_loc", "title": "SKIP"}], IMG_URLS["loc_banner"])
+        await media_ingest.submit(image_id)
+    await send_button_message(phone, "Photo received. Now please share the location of this issue (Pin or Live Location).", [{"id": "skip_loc", "title": "SKIP"}], IMG_URLS["loc_banner"])
 
 async def handle_post_flow_epic(phone, text, session):
     skipped_epic = (text and text.upper() in ["SKIP", "⏭️ SKIP", "SKIP_POST_EPIC"])
@@ -572,7 +453,7 @@ async def handle_post_flow_epic(phone, text, session):
         session["temp_epic"] = epic
         session["state"] = "POST_FLOW_NAME"
         msg = "Please enter your full Name as per your Voter ID."
-        send_button_message(phone, msg, [{"id": "skip_post_name", "title": "⏭️ Skip"}], IMG_URLS["desc_banner"])
+        await send_button_message(phone, msg, [{"id": "skip_post_name", "title": "⏭️ Skip"}], IMG_URLS["desc_banner"])
         return
     
     # If they skipped the EPIC step entirely
@@ -594,7 +475,8 @@ async def handle_post_flow_name(phone, text, session):
     if not skipped_name and text:
         name = text.strip()
         
-    voter = await voters_collection.find_one({"voterId": epic})
+    # A miss here registers the EPIC, so it is checked against the database
+    voter = await epic_cache.lookup(epic, confirm=True)
     if voter:
         name_to_use = name if not skipped_name else voter.get("name", "Unknown Voter")
         session["name"] = name_to_use
@@ -603,20 +485,26 @@ async def handle_post_flow_name(phone, text, session):
         # Optionally update name in DB if they provided a new one
         if not skipped_name and name_to_use != "Unknown (Guest)":
             await voters_collection.update_one({"voterId": epic}, {"$set": {"name": name_to_use}})
+            epic_cache.invalidate(epic)
     else:
         session["epic_unverified"] = epic
         session["name"] = name if not skipped_name else "Unknown (Guest)"
-        today = datetime.datetime.now().strftime("%d %b %Y")
-        await voters_collection.insert_one({
+        voter_doc = {
             "voterId": epic,
             "name": session["name"],
             "partNumber": "Pending",
             "phone": phone,
             "status": "Unverified",
             "source": "WhatsApp Bot",
-            "createdAt": today
-        })
-        send_text_message(phone, "We recorded your input. Continuing to log your request...")
+            "createdAt": datetime.datetime.now(datetime.timezone.utc)
+        }
+        # voterId is unique: an EPIC another chat registered meanwhile is left as it is
+        result = await voters_collection.update_one({"voterId": epic}, {"$setOnInsert": voter_doc}, upsert=True)
+        if result.upserted_id is not None:
+            voter_doc["_id"] = result.upserted_id
+            await counters.changed(voters_collection, None, voter_doc)
+            epic_cache.added(epic, voter_doc)
+        await send_text_message(phone, "We recorded your input. Continuing to log your request...")
     
     # Mark that we bypassed the post-flow check
     session["post_flow_skipped"] = True
@@ -640,18 +528,20 @@ async def handle_loc_skip(phone, text, lat, lon, session, flow):
         session["temp_flow"] = flow
         session["state"] = "POST_FLOW_EPIC"
         msg = "Thank you for providing the details!\n\nTo officially link this request to your profile, please enter your Voter ID (EPIC number) below.\n\nIf you still don't have it, you can skip this step and we will generate the ticket anyway."
-        send_button_message(phone, msg, [{"id": "skip_post_epic", "title": "⏭️ Skip"}], IMG_URLS["desc_banner"])
+        await send_button_message(phone, msg, [{"id": "skip_post_epic", "title": "⏭️ Skip"}], IMG_URLS["desc_banner"])
         return
 
-    today = datetime.datetime.now().strftime("%d %b %Y")
+    created_at = datetime.datetime.now(datetime.timezone.utc)
+    today = created_at.strftime("%d %b %Y")
 
     epic_to_save = session.get('epic') or session.get('epic_unverified')
 
     if flow == "FLOW1":
-        ref_id = f"GRV{random.randint(10000, 99999)}"
+        ref_id, ref_seq = await ref_ids.allocate("GRV")
         # Save to DB
         doc = {
             "ref_id": ref_id,
+            "ref_seq": ref_seq,
             "voter_phone": phone,
             "voter_name": session.get('name', 'Anonymous'),
             "booth": session.get('booth', 'Unknown'),
@@ -659,7 +549,8 @@ async def handle_loc_skip(phone, text, lat, lon, session, flow):
             "category": session.get('cat', 'Others'),
             "description": session.get('desc', ''),
             "status": "Open",
-            "timestamp": today,
+            "createdAt": created_at,
+            "schema_version": schema.SCHEMA_VERSION,
             "type": "Grievance"
         }
         if not skipped:
@@ -667,26 +558,30 @@ async def handle_loc_skip(phone, text, lat, lon, session, flow):
         if session.get("photo_id"):
             doc["photo_id"] = session["photo_id"]
         await grievances_col.insert_one(doc)
+        await ref_index.add("grievances", ref_id, doc["_id"])
+        await counters.changed(grievances_col, None, doc)
 
         msg = f"✅ Issue Successfully Logged\n🔖 Reference ID: {ref_id}\n\nOur field team will visit this spot soon to verify and solve the issue.\n\nStatus: Open -> Ward Follow-up"
-        send_image_message(phone, IMG_URLS["success"], msg)
+        await send_image_message(phone, IMG_URLS["success"], msg)
         
         if not skipped:
             final_thanks = f"Thank you, *{session.get('name', 'Anonymous')}*. Your location has been recorded.\n\n🔖 Reference ID: {ref_id}\n\nOur field team will visit this spot soon to verify and solve the issue.\n\n*Our team will connect with you soon at your booth.*"
-            send_image_message(phone, IMG_URLS["thank_you"], final_thanks)
+            await send_image_message(phone, IMG_URLS["thank_you"], final_thanks)
         
     elif flow == "FLOW2":
-        ref_id = f"SUG{random.randint(10000, 99999)}"
+        ref_id, ref_seq = await ref_ids.allocate("SUG")
         # Save to member DB
         doc = {
             "ref_id": ref_id,
+            "ref_seq": ref_seq,
             "voter_phone": phone,
             "voter_name": session.get('name', 'Anonymous'),
             "booth": session.get('booth', 'Unknown'),
             "epic": epic_to_save,
             "suggestion": session.get('sugg', ''),
             "status": "Pending",
-            "timestamp": today,
+            "createdAt": created_at,
+            "schema_version": schema.SCHEMA_VERSION,
             "type": "Suggestion"
         }
         if not skipped:
@@ -694,25 +589,29 @@ async def handle_loc_skip(phone, text, lat, lon, session, flow):
         if session.get("photo_id"):
             doc["photo_id"] = session["photo_id"]
         await member_requests_col.insert_one(doc)
+        await ref_index.add("member_requests", ref_id, doc["_id"])
+        await counters.changed(member_requests_col, None, doc)
 
         if not skipped:
             msg = f"Thank you, *{session.get('name', 'Anonymous')}*. Your location has been recorded.\n\n🔖 Reference ID: {ref_id}\n\nOur team will review your suggestion for Kavundampalayam.\n\n*Our team will connect with you soon at your booth.*"
-            send_image_message(phone, IMG_URLS["thank_you"], msg)
+            await send_image_message(phone, IMG_URLS["thank_you"], msg)
         else:
             msg = f"✅ Suggestion Officially Logged\n🔖 Reference ID: {ref_id}\n\nAll ideas are reviewed collectively to guide long-term planning for Kavundampalayam.\n\n*TVK Kavundampalayam Team*"
-            send_image_message(phone, IMG_URLS["success"], msg)
+            await send_image_message(phone, IMG_URLS["success"], msg)
             
     elif flow == "FLOW3":
-        ref_id = f"VOL{random.randint(10000, 99999)}"
+        ref_id, ref_seq = await ref_ids.allocate("VOL")
         doc = {
             "ref_id": ref_id,
+            "ref_seq": ref_seq,
             "voter_phone": phone,
             "voter_name": session.get('name', 'Anonymous'),
             "booth": session.get('booth', 'Unknown'),
             "epic": epic_to_save,
             "role": session.get('vol_role', 'General'),
             "status": "Registered",
-            "timestamp": today,
+            "createdAt": created_at,
+            "schema_version": schema.SCHEMA_VERSION,
             "type": "Volunteer"
         }
         if not skipped:
@@ -720,26 +619,29 @@ async def handle_loc_skip(phone, text, lat, lon, session, flow):
         if session.get("photo_id"):
             doc["photo_id"] = session["photo_id"]
         await member_requests_col.insert_one(doc)
+        await ref_index.add("member_requests", ref_id, doc["_id"])
+        await counters.changed(member_requests_col, None, doc)
 
         if not skipped:
             msg = f"Thank you, *{session.get('name', 'Anonymous')}*. Your location has been recorded.\n\n🔖 Reference ID: {ref_id}\n\nOur organiser from Booth {session.get('booth', 'Unknown')} will contact you with next steps.\n\n*Our team will connect with you soon at your booth.*"
-            send_image_message(phone, IMG_URLS["thank_you"], msg)
+            await send_image_message(phone, IMG_URLS["thank_you"], msg)
         else:
             msg = f"✅ Volunteer Registration Complete\n🔖 Reference ID: {ref_id}\n\nThank you for stepping forward, {session.get('name', 'Anonymous')}. Our team will reach out to you soon.\n\n*TVK Kavundampalayam Team*"
-            send_image_message(phone, IMG_URLS["success"], msg)
+            await send_image_message(phone, IMG_URLS["success"], msg)
             
     elif flow == "FLOW4":
         if not skipped:
             msg = f"Thank you, *{session.get('name', 'Anonymous')}*. Your location has been recorded.\n\nYou will receive updates relevant to Booth {session.get('booth', 'Unknown')} and Kavundampalayam.\n\n*Our team will connect with you soon at your booth.*"
-            send_image_message(phone, IMG_URLS["thank_you"], msg)
+            await send_image_message(phone, IMG_URLS["thank_you"], msg)
         else:
             msg = f"✅ Updates Subscribed\n\nYou will receive updates relevant to Booth {session.get('booth', 'Unknown')} and Kavundampalayam.\n\n*TVK Kavundampalayam Team*"
-            send_image_message(phone, IMG_URLS["success"], msg)
+            await send_image_message(phone, IMG_URLS["success"], msg)
             
     elif flow == "FLOW8":
-        ref_id = f"PHT{random.randint(10000, 99999)}"
+        ref_id, ref_seq = await ref_ids.allocate("PHT")
         doc = {
             "ref_id": ref_id,
+            "ref_seq": ref_seq,
             "voter_phone": phone,
             "voter_name": session.get('name', 'Anonymous'),
             "booth": session.get('booth', 'Unknown'),
@@ -747,7 +649,8 @@ async def handle_loc_skip(phone, text, lat, lon, session, flow):
             "category": session.get('photo_cat', 'Others'),
             "description": session.get('photo_desc', ''),
             "status": "Open",
-            "timestamp": today,
+            "createdAt": created_at,
+            "schema_version": schema.SCHEMA_VERSION,
             "type": "Photo Evidence" # Treating photo evidenece like a grievance in DB
         }
         if not skipped:
@@ -755,21 +658,22 @@ async def handle_loc_skip(phone, text, lat, lon, session, flow):
         if session.get("photo_id"):
             doc["photo_id"] = session["photo_id"]
         await grievances_col.insert_one(doc)
+        await ref_index.add("grievances", ref_id, doc["_id"])
+        await counters.changed(grievances_col, None, doc)
 
         if not skipped:
             msg = f"✅ Photo Evidence Submitted!\n\n───────────────\n🔖 Reference: {ref_id}\n📁 Category: {session.get('photo_cat', 'Others')}\n📝 Description: {session.get('photo_desc', '')}\n📸 Photo: Received\n📍 Location: Main Road, Kavundampalayam\n🏛️ Booth: {session['booth']}\n📅 Submitted: {today}\n───────────────\n\nOur field team will inspect the spot and take necessary action."
-            send_image_message(phone, IMG_URLS["success"], msg)
+            await send_image_message(phone, IMG_URLS["success"], msg)
         else:
             msg = f"✅ Photo Evidence Submitted!\n\n🔖 Reference: {ref_id}\n📁 Category: {session.get('photo_cat', 'Others')}\n📸 Photo: Received\n🏛️ Booth: {session['booth']}"
-            send_image_message(phone, IMG_URLS["success"], msg)
+            await send_image_message(phone, IMG_URLS["success"], msg)
 
+    # A new submission changes this phone's "My Activity" numbers
+    activity.invalidate(phone)
     await send_loop_prompt(phone, session)
 
 
 async def send_loop_prompt(phone, session):
-    # Add a small delay to ensure the previous message arrives first and to create a natural pause
-    await asyncio.sleep(2)
-    
     # Rotate between showing Ward Connect, TVK Networks, and Invite
     choice = random.choice(["ward", "network", "invite"])
     
@@ -778,43 +682,153 @@ async def send_loop_prompt(phone, session):
          name = "Suresh Murugan"
          phone_num = "+919876543210"
          msg = f"📞 *Ward Connect — Booth {booth}*\n\nYour designated Ward Coordinator is available for support:\n\n👤 {name}\n📍 Gandhi Nagar, Kavundampalayam\n\nDirect Call: https://wa.me/{phone_num.replace('+', '')}"
-         send_button_message(phone, msg, [{"id": "btn_main_menu", "title": "🏠 Main Menu"}], IMG_URLS["ward_connect"])
+         await send_button_message(phone, msg, [{"id": "btn_main_menu", "title": "🏠 Main Menu"}], IMG_URLS["ward_connect"])
     elif choice == "network":
          msg = "🌐 *TVK Networks*\n\nExplore our digital initiatives:"
-         send_button_message(phone, msg, [
+         await send_button_message(phone, msg, [
             {"id": "btn_tvk_family", "title": "🌐 TVK Family"},
             {"id": "btn_tvk_itwing", "title": "💻 TVK IT Wing"}
         ], IMG_URLS["welcome_banner"])
     else:
          msg = "👥 *Join the Movement*\n\nHelp us build a stronger, more connected Kavundampalayam. Invite your friends and family to join Venkatraman's official WhatsApp platform!"
-         send_button_message(phone, msg, [
+         await send_button_message(phone, msg, [
              {"id": "btn_invite", "title": "👥 Invite a Voter"},
              {"id": "btn_main_menu", "title": "🏠 Main Menu"}
          ], IMG_URLS["invite_1"])
     
     session["state"] = "LOOP_PROMPT"
 
+async def handle_loop_prompt(phone, text, session):
+    choice = LOOP_PROMPT_INTENTS.match(text)
+    if choice == "ward_connect":
+        await menu_ward_connect(phone, session)
+    elif choice == "networks":
+        # Directly handle the network/invite selection
+        await handle_flow9_networks(phone, text, session)
+    else:
+        # Main Menu button, or anything else they type
+        session["state"] = "MAIN_MENU"
+        await send_main_menu(phone, session)
+
 async def handle_flow9_networks(phone, text, session):
-    sel = text.lower() if text else ""
-    if "family" in sel or "btn_tvk_family" in sel:
+    choice = NETWORK_INTENTS.match(text)
+    if choice == "family":
         msg = "👨‍\u200d👩‍\u200d👧‍\u200d👦 *TVK Family*\n\nJoin our digital family and connect with fellow supporters across the globe!\n\nClick here to join 👉 https://tvk.family/"
-        send_image_message(phone, IMG_URLS["welcome_banner"], msg)
+        await send_image_message(phone, IMG_URLS["welcome_banner"], msg)
         await send_loop_prompt(phone, session)
-    elif "itwing" in sel or "btn_tvk_itwing" in sel:
+    elif choice == "itwing":
         msg = "💻 *TVK IT Wing*\n\nBe part of the digital vanguard leading the change! Join the IT Wing today.\n\nClick here to explore 👉 https://tvkitwing.com/"
-        send_image_message(phone, IMG_URLS["welcome_banner"], msg)
+        await send_image_message(phone, IMG_URLS["welcome_banner"], msg)
         await send_loop_prompt(phone, session)
-    elif "invite" in sel or "btn_invite" in sel:
-        send_image_message(phone, IMG_URLS["invite_1"], "👥 *Spread the Word!*\n\nHelp us build a stronger, more connected constituency. Forward the message below to your friends, family, and neighbours:")
-        await asyncio.sleep(1)
-        send_image_message(phone, IMG_URLS["invite_2"], """────────────────────\n🗳️ *TVK Kavundampalayam — Voter Engagement Platform*\n\nYour constituency. Your voice. Your future.\nJoin Venkatraman's official WhatsApp platform to:\n✅ Report local issues directly\n✅ Share ideas for development\n✅ Volunteer and participate\n✅ Get official campaign updates\n✅ Track your submitted issues\n\n👉 Send Hi to +91-XXXXXXXXXX on WhatsApp to get started.\n\nEvery voter's voice matters. Be heard.\nTVK — Kavundampalayam\n────────────────────""")
-        await asyncio.sleep(1)
-        send_image_message(phone, IMG_URLS["invite_3"], f"📊 *Your Referral Stats*\n\n👥 You have invited 3 voters so far.\n🏛️ Booth {session.get('booth', 'Unknown')} total participants: 47\n\nThank you for growing this movement, {session.get('name', 'Anonymous')}.")
-        await asyncio.sleep(1)
+    elif choice == "invite":
+        await send_image_message(phone, IMG_URLS["invite_1"], "👥 *Spread the Word!*\n\nHelp us build a stronger, more connected constituency. Forward the message below to your friends, family, and neighbours:")
+        await send_image_message(phone, IMG_URLS["invite_2"], """────────────────────\n🗳️ *TVK Kavundampalayam — Voter Engagement Platform*\n\nYour constituency. Your voice. Your future.\nJoin Venkatraman's official WhatsApp platform to:\n✅ Report local issues directly\n✅ Share ideas for development\n✅ Volunteer and participate\n✅ Get official campaign updates\n✅ Track your submitted issues\n\n👉 Send Hi to +91-XXXXXXXXXX on WhatsApp to get started.\n\nEvery voter's voice matters. Be heard.\nTVK — Kavundampalayam\n────────────────────""")
+        await send_image_message(phone, IMG_URLS["invite_3"], f"📊 *Your Referral Stats*\n\n👥 You have invited 3 voters so far.\n🏛️ Booth {session.get('booth', 'Unknown')} total participants: 47\n\nThank you for growing this movement, {session.get('name', 'Anonymous')}.")
         await send_loop_prompt(phone, session)
     else:
-        send_button_message(phone, "Please select an option.", [
+        await send_button_message(phone, "Please select an option.", [
             {"id": "btn_tvk_family", "title": "🌐 TVK Family"},
             {"id": "btn_tvk_itwing", "title": "💻 TVK IT Wing"},
             {"id": "btn_main_menu", "title": "🏠 Main Menu"}
         ], None)
+
+
+# ---- Intent tables (first match wins, same precedence as the old if/elif chains) ----
+
+HAS_EPIC_INTENTS = IntentTable([
+    Intent("yes", ids=["btn_have_epic"], contains=["btn_have_epic", "have", "yes"]),
+    Intent("no", ids=["btn_no_epic"], contains=["btn_no_epic", "don", "no"]),
+])
+
+MAIN_MENU_INTENTS = IntentTable([
+    # Invite first so it is not shadowed by the broader matches below
+    Intent("invite", ids=["menu_11", "btn_invite"], contains=["btn_invite"]),
+    Intent("ward_connect", ids=["menu_10"], contains=["menu_10", "ward"]),
+    Intent("report_issue", ids=["menu_1"], contains_all=["report", "issue"]),
+    Intent("ideas", ids=["menu_2"], contains=["idea", "improve"]),
+    Intent("participate", ids=["menu_3"], contains=["participate"]),
+    Intent("stay_informed", ids=["menu_4"], contains=["informed"]),
+    Intent("track", ids=["menu_5", "btn_track_ref"], contains=["track"]),
+    Intent("activity", ids=["menu_6", "btn_activity_report"], contains=["activity", "internal_summary"]),
+    Intent("booth_pulse", ids=["menu_7"], contains=["pulse"]),
+    Intent("photo_evidence", ids=["menu_8"], contains=["photo"]),
+    Intent("networks", ids=["menu_9"], contains=["network"]),
+])
+
+MAIN_MENU_ACTIONS = {
+    "invite": menu_invite,
+    "ward_connect": menu_ward_connect,
+    "report_issue": menu_report_issue,
+    "ideas": menu_ideas,
+    "participate": menu_participate,
+    "stay_informed": menu_stay_informed,
+    "track": menu_track,
+    "activity": menu_activity_summary,
+    "booth_pulse": menu_booth_pulse,
+    "photo_evidence": menu_photo_evidence,
+    "networks": menu_networks,
+}
+
+POLL_INTENTS = IntentTable([
+    Intent("poll_1", ids=["poll_1"], contains=["poll_1", "water"]),
+    Intent("poll_2", ids=["poll_2"], contains=["poll_2", "road"]),
+    Intent("poll_3", ids=["poll_3"], contains=["poll_3", "electr"]),
+    Intent("poll_4", ids=["poll_4"], contains=["poll_4", "educat"]),
+])
+
+NETWORK_INTENTS = IntentTable([
+    Intent("family", ids=["btn_tvk_family"], contains=["family"]),
+    Intent("itwing", ids=["btn_tvk_itwing"], contains=["itwing"]),
+    Intent("invite", ids=["btn_invite"], contains=["invite"]),
+])
+
+LOOP_PROMPT_INTENTS = IntentTable([
+    Intent("main_menu", ids=["btn_main_menu"]),
+    Intent("ward_connect", contains=["ward", "connect"]),
+    Intent("networks", ids=["btn_tvk_family", "btn_tvk_itwing", "btn_invite"], contains=["tvk", "family", "itwing", "invite"]),
+])
+
+# ---- State table: conversation state -> handler(Message, session) ----
+# New flows only need an entry here (or engine.register from another module).
+
+def at_location(flow):
+    return lambda msg, session: handle_loc_skip(msg.phone, msg.text, msg.lat, msg.lon, session, flow)
+
+def unless(skip_id):
+    return lambda text: "" if (text and text.lower() == skip_id) else text
+
+engine = FlowEngine()
+engine.register_all({
+    "ASK_HAS_EPIC": with_text(handle_ask_has_epic),
+    "ASK_EPIC": with_text(verify_epic),
+    "MAIN_MENU": with_text(handle_main_menu),
+
+    "FLOW1_CAT": Capture("cat", "FLOW1_DESC", prompt_flow1_desc),
+    "FLOW1_DESC": Capture("desc", "FLOW1_PHOTO", prompt_flow1_photo, transform=unless("skip_desc")),
+    "FLOW1_PHOTO": with_photo(handle_flow1_photo),
+    "FLOW1_LOC": at_location("FLOW1"),
+
+    "FLOW2_SUGG": Capture("sugg", "FLOW2_LOC", prompt_flow2_loc),
+    "FLOW2_LOC": at_location("FLOW2"),
+
+    "FLOW3_MODE": Capture("vol_role", "FLOW3_LOC", prompt_flow3_loc),
+    "FLOW3_LOC": at_location("FLOW3"),
+
+    "FLOW4_LOC": at_location("FLOW4"),
+
+    "FLOW5_REF": with_text(handle_flow5_ref),
+
+    "FLOW7_POLL": with_text(handle_flow7_poll),
+
+    "FLOW8_CAT": Capture("photo_cat", "FLOW8_PHOTO", prompt_flow8_photo),
+    "FLOW8_PHOTO": with_photo(handle_flow8_photo),
+    "FLOW8_LOC": at_location("FLOW8"),
+
+    "POST_FLOW_EPIC": with_text(handle_post_flow_epic),
+    "POST_FLOW_NAME": with_text(handle_post_flow_name),
+
+    "FLOW9_NETWORKS": with_text(handle_flow9_networks),
+
+    "LOOP_PROMPT": with_text(handle_loop_prompt),
+    "DONE": lambda msg, session: send_loop_prompt(msg.phone, session),
+})
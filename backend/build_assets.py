@@ -0,0 +1,72 @@
+import io
+import os
+import sys
+import json
+import hashlib
+import argparse
+from PIL import Image
+from static_assets import ASSETS_DIR, DIST_DIR, MANIFEST_PATH, sources
+
+# Builds the bot banners into assets/dist: each source is downscaled to what WhatsApp shows,
+# re-encoded as progressive JPEG (or kept as an optimized PNG if that is smaller), named
+# after its content hash and listed in manifest.json for static_assets.asset_urls().
+# WhatsApp image messages only accept JPEG and PNG, so no WebP here.
+# Usage: python build_assets.py [--max-size 640] [--quality 72]
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--max-size", type=int, default=int(os.getenv("ASSET_MAX_SIZE", "640")), help="longest side in pixels")
+parser.add_argument("--quality", type=int, default=int(os.getenv("ASSET_JPEG_QUALITY", "72")))
+
+def encode(path, max_size, quality):
+    with Image.open(path) as im:
+        if im.mode in ("RGBA", "LA", "P"):
+            # Banners have no meaningful transparency; flatten onto white like WhatsApp does
+            rgba = im.convert("RGBA")
+            im = Image.new("RGB", rgba.size, "white")
+            im.paste(rgba, mask=rgba.getchannel("A"))
+        elif im.mode != "RGB":
+            im = im.convert("RGB")
+        if max(im.size) > max_size:
+            im.thumbnail((max_size, max_size), Image.LANCZOS)
+        jpeg = io.BytesIO()
+        im.save(jpeg, "JPEG", quality=quality, optimize=True, progressive=True)
+        png = io.BytesIO()
+        im.save(png, "PNG", optimize=True)
+    if png.tell() < jpeg.tell():
+        return png.getvalue(), ".png"
+    return jpeg.getvalue(), ".jpg"
+
+def build(max_size, quality):
+    os.makedirs(DIST_DIR, exist_ok=True)
+    manifest = {}
+    before = after = 0
+    for name, source in sources().items():
+        src = os.path.join(ASSETS_DIR, source)
+        data, ext = encode(src, max_size, quality)
+        out = f"{name}.{hashlib.sha256(data).hexdigest()[:12]}{ext}"
+        out_path = os.path.join(DIST_DIR, out)
+        if not os.path.exists(out_path):
+            with open(out_path + ".tmp", "wb") as f:
+                f.write(data)
+            os.replace(out_path + ".tmp", out_path)
+        manifest[name] = out
+        size = os.path.getsize(src)
+        before += size
+        after += len(data)
+        print(f"{source:28} {size / 1024:6.1f} KB -> {out:40} {len(data) / 1024:6.1f} KB")
+
+    with open(MANIFEST_PATH + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(MANIFEST_PATH + ".tmp", MANIFEST_PATH)
+    # Drop outputs of earlier builds that no banner points at any more
+    keep = set(manifest.values()) | {os.path.basename(MANIFEST_PATH)}
+    for name in os.listdir(DIST_DIR):
+        if name not in keep:
+            os.remove(os.path.join(DIST_DIR, name))
+    print(f"{len(manifest)} assets: {before / 1024:.0f} KB -> {after / 1024:.0f} KB ({100 * after / max(before, 1):.0f}%)")
+    return manifest
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    build(args.max_size, args.quality)
+    sys.exit(0)
@@ -0,0 +1,121 @@
+import sys
+import asyncio
+import datetime
+from bson import ObjectId
+from db import (voters_collection, grievances_col, member_requests_col, booth_pulse_col, booth_pulse_tallies_col,
+                booth_rollups_col, grievance_trends_col, outbox_col, webhook_events_col, sessions_col, counters_col, ref_index_col,
+                media_col)
+import indexes
+
+# Runs explain() on every query shape the app issues and fails (exit code 1) if any of them
+# is answered by a collection scan. Meant for CI against a database that has the app's data
+# shape, e.g. a staging restore:
+#
+#   python check_query_plans.py            # ensure indexes first, then explain
+#   python check_query_plans.py --no-ensure
+#
+# Keep QUERY_SHAPES in sync with the code: a new find/count/aggregate $match goes here.
+
+PHONE = "919800000000"
+REF = "GRV12345"
+# Until migrate_schema.py has run, queries also match legacy field spellings (schema.match)
+BY_PHONE = {"$or": [{"phoneNumber": PHONE}, {"voter_phone": PHONE}]}
+BY_BOOTH = {"$or": [{"booth": {"$in": ["101", 101]}}, {"partNumber": {"$in": ["101", 101]}}]}
+SUGGESTION = {"$or": [{"type": "Suggestion"}, {"referenceId": {"$regex": "^MBR"}}]}
+BOOTH = {"booth": {"$in": ["101", 101]}}
+DATES = {"createdAt": {"$gte": datetime.datetime(2026, 3, 1), "$lt": datetime.datetime(2026, 4, 1)}}
+AFTER = {"$or": [{"createdAt": {"$lt": datetime.datetime(2026, 3, 20)}}, {"createdAt": datetime.datetime(2026, 3, 20), "_id": {"$lt": ObjectId()}}]}
+BY_DATE = [("createdAt", -1), ("_id", -1)]
+
+# (where it is used, collection, filter, sort)
+QUERY_SHAPES = [
+    ("verify_epic", voters_collection, {"voterId": "ABC1234567"}, None),
+    ("epic_cache.refresh", voters_collection, {"_id": {"$gte": ObjectId()}}, None),
+    ("get_voters", voters_collection, {}, [("_id", -1)]),
+    ("get_voters ?booth=", voters_collection, {"partNumber": {"$in": ["101", 101]}}, [("_id", -1)]),
+    ("get_voters ?status=", voters_collection, {"status": "Unverified"}, [("_id", -1)]),
+
+    ("ref_index.find", ref_index_col, {"_id": REF}, None),
+    ("ref_index.find (until backfilled)", grievances_col, {"$or": [{"ref_id": REF}, {"ticketId": REF}]}, None),
+    ("ref_index.find (until backfilled)", member_requests_col, {"$or": [{"ref_id": REF}, {"referenceId": REF}]}, None),
+    ("get_grievances", grievances_col, {}, [("_id", -1)]),
+    ("get_all_grievances ?status=", grievances_col, {"status": "Open"}, [("_id", -1)]),
+    ("get_all_grievances ?type=", grievances_col, {"type": "Photo Evidence"}, [("_id", -1)]),
+    ("get_all_grievances ?category=", grievances_col, {"category": {"$in": ["cat_2", "Roads & Infra"]}}, [("_id", -1)]),
+    ("get_all_grievances ?booth=", grievances_col, BY_BOOTH, [("_id", -1)]),
+    ("get_all_grievances ?booth= (migrated)", grievances_col, BOOTH, [("_id", -1)]),
+    ("get_suggestions", member_requests_col, SUGGESTION, [("_id", -1)]),
+    ("get_suggestions (migrated)", member_requests_col, {"type": "Suggestion"}, [("_id", -1)]),
+    ("get_volunteers", member_requests_col, {"type": "Volunteer"}, [("_id", -1)]),
+    ("get_volunteers ?status=", member_requests_col, {"$and": [{"type": "Volunteer"}, {"status": "Active"}]}, [("_id", -1)]),
+    ("get_volunteers ?booth=", member_requests_col, {"$and": [{"type": "Volunteer"}, BY_BOOTH]}, [("_id", -1)]),
+    ("get_volunteers ?booth= (migrated)", member_requests_col, {"$and": [{"type": "Volunteer"}, BOOTH]}, [("_id", -1)]),
+
+    ("lists ?date_from=&date_to=", grievances_col, {"$and": [{"status": "Open"}, DATES]}, BY_DATE),
+    ("lists ?date_from=&date_to=", voters_collection, DATES, BY_DATE),
+    ("lists ?date_from= (page 2)", member_requests_col, {"$and": [{"type": "Volunteer"}, DATES, AFTER]}, BY_DATE),
+    ("lists ?date_from= (legacy suggestions)", member_requests_col, {"$and": [SUGGESTION, DATES]}, BY_DATE),
+
+    ("activity.summary", grievances_col, BY_PHONE, None),
+    ("activity.summary", member_requests_col, BY_PHONE, None),
+    ("activity.summary (migrated)", grievances_col, {"voter_phone": PHONE}, None),
+    ("activity.summary (migrated)", member_requests_col, {"voter_phone": PHONE}, None),
+
+    ("counters: open grievances", grievances_col, {"status": "Open"}, None),
+    ("counters: suggestions", member_requests_col, SUGGESTION, None),
+    ("counters: volunteers", member_requests_col, {"type": "Volunteer"}, None),
+    ("counters: snapshot", counters_col, {"_id": {"$in": ["voters"]}}, None),
+
+    ("analytics: window", booth_rollups_col, {"n": {"$gt": 0}, "day": {"$gte": datetime.datetime(2026, 1, 1)}}, None),
+    ("analytics: booth", booth_rollups_col, {"n": {"$gt": 0}, "booth": "101", "day": {"$gte": datetime.datetime(2026, 1, 1)}}, None),
+    ("trends", grievance_trends_col, {"unit": "week", "start": {"$gte": datetime.datetime(2026, 1, 5), "$lt": datetime.datetime(2026, 4, 6)}, "n": {"$gt": 0}}, None),
+    ("trends ?booth=", grievance_trends_col, {"unit": "day", "start": {"$gte": datetime.datetime(2026, 3, 1), "$lt": datetime.datetime(2026, 3, 31)}, "booth": "101", "n": {"$gt": 0}}, None),
+
+    # Votes and tallies are keyed by _id; see booth_pulse.py
+    ("booth pulse: vote", booth_pulse_col, {"_id": f"101:{PHONE}"}, None),
+    ("booth pulse: legacy votes", booth_pulse_col, {"_id": {"$type": "objectId"}}, None),
+    ("booth pulse: tally", booth_pulse_tallies_col, {"_id": "101"}, None),
+
+    ("outbox: expired leases", outbox_col, {"status": "pending", "lease_until": {"$not": {"$gte": 0}}}, [("_id", 1)]),
+    ("inbox: expired events", webhook_events_col, {"status": "pending", "lease_until": {"$not": {"$gte": 0}}}, [("_id", 1)]),
+    ("media ingest: due", media_col, {"status": "pending", "retry_at": {"$not": {"$gt": 0}}}, None),
+    ("sessions: get", sessions_col, {"_id": PHONE}, None),
+    ("migrate_schema", grievances_col, {"schema_version": {"$ne": 1}, "_id": {"$gt": ObjectId("0" * 24)}}, [("_id", 1)]),
+]
+
+def _stages(plan):
+    # Winning plans nest stages under inputStage/inputStages (and queryPlan on the SBE engine)
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan["stage"]
+        for value in plan.values():
+            yield from _stages(value)
+    elif isinstance(plan, list):
+        for item in plan:
+            yield from _stages(item)
+
+async def check():
+    failures = 0
+    for where, col, query, sort in QUERY_SHAPES:
+        cursor = col.find(query)
+        if sort:
+            cursor = cursor.sort(sort)
+        plan = (await cursor.limit(1).explain())["queryPlanner"]["winningPlan"]
+        stages = list(_stages(plan))
+        ok = "COLLSCAN" not in stages
+        failures += not ok
+        print(f"{'ok  ' if ok else 'SCAN'} {col.name:24} {where:36} {' > '.join(stages)}")
+    return failures
+
+async def main():
+    if "--no-ensure" not in sys.argv:
+        await indexes.ensure_indexes()
+    failures = await check()
+    if failures:
+        print(f"FAIL: {failures} query shapes use a collection scan")
+        return 1
+    print("OK: every query shape is index-backed")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
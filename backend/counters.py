@@ -0,0 +1,110 @@
+import os
+import time
+import inspect
+import asyncio
+from db import counters_col, voters_collection, grievances_col, member_requests_col
+import schema
+
+# Dashboard headline counters. Instead of counting the collections on every dashboard load,
+# each counter is a single document in `counters` that is $inc'ed by the code paths that
+# insert, update or delete records. Reads are served from a short-lived in-memory copy, and a
+# background job periodically recounts everything so drift (crashes between a write and its
+# $inc, records edited outside the app) cannot accumulate.
+
+COUNTERS_CACHE_TTL = float(os.getenv("COUNTERS_CACHE_TTL", "5"))
+COUNTERS_RECONCILE_INTERVAL = float(os.getenv("COUNTERS_RECONCILE_INTERVAL", "600"))
+
+def _is_suggestion(doc):
+    return doc.get("type") == "Suggestion" or str(doc.get("referenceId") or "").startswith("MBR")
+
+# name -> (collection, recount query (or a function returning it), predicate deciding whether a document is counted)
+COUNTERS = {
+    "voters": (voters_collection, {}, lambda d: True),
+    "open_grievances": (grievances_col, {"status": "Open"}, lambda d: d.get("status") == "Open"),
+    "suggestions": (member_requests_col, schema.suggestion_filter, _is_suggestion),
+    "volunteers": (member_requests_col, {"type": "Volunteer"}, lambda d: d.get("type") == "Volunteer")
+}
+
+_cache = {}
+_cached_at = 0.0
+_reconcile_task = None
+_listeners = []
+_stats = {"hits": 0, "loads": 0, "recounts": 0, "drift": 0}
+
+async def changed(col, before, after):
+    # Call after a write to `col`: before=None for inserts, after=None for deletes
+    deltas = {}
+    for name, (counted_col, _, counts) in COUNTERS.items():
+        if counted_col is not col:
+            continue
+        delta = (1 if after is not None and counts(after) else 0) - (1 if before is not None and counts(before) else 0)
+        if delta:
+            deltas[name] = delta
+    for name, delta in deltas.items():
+        try:
+            await counters_col.update_one({"_id": name}, {"$inc": {"n": delta}}, upsert=True)
+            if name in _cache:
+                _cache[name] += delta
+        except Exception as e:
+            # The record itself is saved; the next reconcile will fix the count
+            print(f"Counter update failed for {name}: {e!r}")
+    for listener in _listeners:
+        result = listener(col, before, after, deltas)
+        if inspect.isawaitable(result):
+            await result
+
+def subscribe(listener):
+    # listener(col, before, after, deltas), plain or async, is called after every changed()
+    if listener not in _listeners:
+        _listeners.append(listener)
+
+async def recount():
+    global _cache, _cached_at
+    names = list(COUNTERS)
+    queries = [q() if callable(q) else q for q in (COUNTERS[n][1] for n in names)]
+    values = await asyncio.gather(*(COUNTERS[n][0].count_documents(q) for n, q in zip(names, queries)))
+    fresh = dict(zip(names, values))
+    for name, value in fresh.items():
+        if name in _cache and _cache[name] != value:
+            _stats["drift"] += 1
+            print(f"Counter {name} drifted: {_cache[name]} -> {value}")
+        await counters_col.update_one({"_id": name}, {"$set": {"n": value, "reconciled_at": time.time()}}, upsert=True)
+    _stats["recounts"] += 1
+    _cache, _cached_at = fresh, time.time()
+    return fresh
+
+async def snapshot():
+    global _cache, _cached_at
+    if _cache and time.time() - _cached_at < COUNTERS_CACHE_TTL:
+        _stats["hits"] += 1
+        return dict(_cache)
+    docs = await counters_col.find({"_id": {"$in": list(COUNTERS)}}).to_list(length=None)
+    values = {d["_id"]: d.get("n", 0) for d in docs}
+    if len(values) < len(COUNTERS):
+        # First run on this database: seed the counters from a full count
+        return dict(await recount())
+    _stats["loads"] += 1
+    _cache, _cached_at = values, time.time()
+    return dict(_cache)
+
+async def _reconcile_loop():
+    while True:
+        try:
+            await recount()
+        except Exception as e:
+            print(f"Counter reconcile failed: {e!r}")
+        await asyncio.sleep(COUNTERS_RECONCILE_INTERVAL)
+
+async def start():
+    global _reconcile_task
+    _reconcile_task = asyncio.create_task(_reconcile_loop())
+
+async def stop():
+    global _reconcile_task
+    if _reconcile_task:
+        _reconcile_task.cancel()
+        await asyncio.gather(_reconcile_task, return_exceptions=True)
+    _reconcile_task = None
+
+def metrics():
+    return {**_stats, "values": dict(_cache), "age_seconds": round(time.time() - _cached_at, 3) if _cached_at else None}
@@ -22,3 +22,16 @@ grievances_col = member_db[os.getenv("MONGO_COLLECTION_GRIEVANCES")]
 member_requests_col = member_db[os.getenv("MONGO_COLLECTION_MEMBER_REQUESTS")]
 logs_col = member_db[os.getenv("MONGO_COLLECTION_LOGS")]
 booth_pulse_col = member_db[os.getenv("MONGO_COLLECTION_BOOTH_PULSE", "booth_pulse")]
+booth_pulse_tallies_col = member_db[os.getenv("MONGO_COLLECTION_BOOTH_PULSE_TALLIES", "booth_pulse_tallies")]
+outbox_col = member_db[os.getenv("MONGO_COLLECTION_OUTBOX", "outbox")]
+webhook_events_col = member_db[os.getenv("MONGO_COLLECTION_WEBHOOK_EVENTS", "webhook_events")]
+processed_messages_col = member_db[os.getenv("MONGO_COLLECTION_PROCESSED_MESSAGES", "processed_messages")]
+sessions_col = member_db[os.getenv("MONGO_COLLECTION_SESSIONS", "sessions")]
+booth_rollups_col = member_db[os.getenv("MONGO_COLLECTION_BOOTH_ROLLUPS", "booth_rollups")]
+grievance_trends_col = member_db[os.getenv("MONGO_COLLECTION_GRIEVANCE_TRENDS", "grievance_trends")]
+counters_col = member_db[os.getenv("MONGO_COLLECTION_COUNTERS", "counters")]
+media_col = member_db[os.getenv("MONGO_COLLECTION_MEDIA", "media")]
+media_uploads_col = member_db[os.getenv("MONGO_COLLECTION_MEDIA_UPLOADS", "media_uploads")]
+ref_sequences_col = member_db[os.getenv("MONGO_COLLECTION_REF_SEQUENCES", "ref_sequences")]
+ref_index_col = member_db[os.getenv("MONGO_COLLECTION_REF_INDEX", "ref_index")]
+migrations_col = member_db[os.getenv("MONGO_COLLECTION_MIGRATIONS", "migrations")]
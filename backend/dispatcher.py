@@ -0,0 +1,75 @@
+import time
+import asyncio
+from collections import deque
+
+class KeyedDispatcher:
+    # Runs jobs that share a key (a phone number) strictly one after another, in submit
+    # order, while jobs for different keys run concurrently on a fixed pool of workers.
+    # A key with queued work sits in `ready` at most once, so a busy phone can never
+    # occupy more than one worker and cannot starve other phones.
+
+    def __init__(self, name, workers):
+        self.name = name
+        self.size = workers
+        self.pending = {}  # key -> deque of (job, submitted_at); head is the running/next job
+        self.ready = None
+        self.tasks = []
+        self.stats = {"submitted": 0, "completed": 0, "errors": 0, "max_wait": 0.0}
+
+    def start(self):
+        self.ready = asyncio.Queue()
+        self.tasks = [asyncio.create_task(self._worker()) for _ in range(self.size)]
+
+    def submit(self, key, job):
+        # job is a zero-argument coroutine function
+        self.stats["submitted"] += 1
+        queue = self.pending.get(key)
+        if queue is None:
+            self.pending[key] = deque([(job, time.time())])
+            self.ready.put_nowait(key)
+        else:
+            queue.append((job, time.time()))
+
+    async def _worker(self):
+        while True:
+            key = await self.ready.get()
+            queue = self.pending[key]
+            job, submitted_at = queue[0]
+            self.stats["max_wait"] = max(self.stats["max_wait"], time.time() - submitted_at)
+            try:
+                await job()
+                self.stats["completed"] += 1
+            except Exception as e:
+                self.stats["errors"] += 1
+                print(f"{self.name} job for {key} failed: {e!r}")
+            finally:
+                queue.popleft()
+                if queue:
+                    # Back of the line, so other phones get a turn between this phone's messages
+                    self.ready.put_nowait(key)
+                else:
+                    del self.pending[key]
+                self.ready.task_done()
+
+    async def drain(self):
+        if self.ready is not None:
+            await self.ready.join()
+
+    async def stop(self, timeout=5):
+        try:
+            await asyncio.wait_for(self.drain(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        for t in self.tasks:
+            t.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+    def metrics(self):
+        return {
+            **self.stats,
+            "max_wait": round(self.stats["max_wait"], 3),
+            "workers": len(self.tasks),
+            "active_keys": len(self.pending),
+            "queued_jobs": sum(len(q) for q in self.pending.values())
+        }
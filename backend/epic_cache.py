@@ -0,0 +1,198 @@
+import os
+import math
+import time
+import asyncio
+import hashlib
+import datetime
+from collections import OrderedDict
+from bson import ObjectId
+from db import voters_collection
+
+# EPIC (voter id) resolution for the bot. Recent results are kept in an LRU cache, found
+# voters for EPIC_CACHE_TTL and misses for the shorter EPIC_NEGATIVE_TTL. In front of the
+# database sits a Bloom filter of every voterId on the roll: an EPIC the filter has never
+# seen is rejected without a query. The filter is rebuilt from the roll every
+# EPIC_BLOOM_REBUILD_INTERVAL and, in between, voters inserted anywhere (other instances,
+# imports) are added every EPIC_BLOOM_REFRESH_INTERVAL by reading _ids newer than the last
+# pass. Until the first build has finished every miss goes to the database.
+#
+# A voter inserted by another instance or an import can therefore be reported missing for
+# up to EPIC_BLOOM_REFRESH_INTERVAL. That is fine for answering a chat, but callers about to
+# write a voter because it is missing pass confirm=True, which asks the database instead.
+
+EPIC_CACHE_SIZE = int(os.getenv("EPIC_CACHE_SIZE", "20000"))
+EPIC_CACHE_TTL = float(os.getenv("EPIC_CACHE_TTL", "900"))
+EPIC_NEGATIVE_TTL = float(os.getenv("EPIC_NEGATIVE_TTL", "60"))
+EPIC_BLOOM_FP_RATE = float(os.getenv("EPIC_BLOOM_FP_RATE", "0.01"))
+EPIC_BLOOM_REBUILD_INTERVAL = float(os.getenv("EPIC_BLOOM_REBUILD_INTERVAL", "21600"))
+EPIC_BLOOM_REFRESH_INTERVAL = float(os.getenv("EPIC_BLOOM_REFRESH_INTERVAL", "60"))
+BLOOM_HEADROOM = 1.25  # room for voters added between rebuilds
+BUILD_BATCH = 10000
+CLOCK_MARGIN = 120  # seconds; _ids from hosts with a slow clock are still picked up
+VOTER_FIELDS = {"_id": 0, "voterId": 1, "name": 1, "partNumber": 1}
+
+class BloomFilter:
+    def __init__(self, capacity, fp_rate):
+        capacity = max(capacity, 1000)
+        self.size = math.ceil(-capacity * math.log(fp_rate) / math.log(2) ** 2)
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, key):
+        # count stays the number of distinct keys, so re-adding recent voters is harmless
+        new = False
+        for p in self._positions(key):
+            mask = 1 << (p & 7)
+            if not self.bits[p >> 3] & mask:
+                self.bits[p >> 3] |= mask
+                new = True
+        self.count += new
+
+    def add_many(self, keys):
+        for key in keys:
+            self.add(key)
+
+    def __contains__(self, key):
+        return all(self.bits[p >> 3] & (1 << (p & 7)) for p in self._positions(key))
+
+    def fill_ratio(self):
+        return 1 - math.exp(-self.hashes * self.count / self.size)
+
+_cache = OrderedDict()  # epic -> (voter or None, cached_at)
+_bloom = None
+_building = None  # filter being built
+_pending = []  # voters added while it is built
+_bloom_built_at = 0.0
+_since = None  # ObjectId watermark for the incremental refresh
+_task = None
+_stats = {"hits": 0, "negative_hits": 0, "misses": 0, "bloom_rejects": 0, "bloom_false_positives": 0,
+          "invalidations": 0, "builds": 0, "refreshed": 0, "confirmed": 0}
+
+def _watermark():
+    return ObjectId.from_datetime(datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(seconds=CLOCK_MARGIN))
+
+def _remember(epic, voter):
+    _cache[epic] = (voter, time.time())
+    _cache.move_to_end(epic)
+    while len(_cache) > EPIC_CACHE_SIZE:
+        _cache.popitem(last=False)
+
+async def lookup(epic, confirm=False):
+    # Returns {"voterId", "name", "partNumber"} for a voter on the roll, or None. With
+    # confirm, None is only returned when the database has no such voter.
+    if not epic:
+        return None
+    hit = _cache.get(epic)
+    if hit:
+        voter, cached_at = hit
+        if (voter or not confirm) and time.time() - cached_at < (EPIC_CACHE_TTL if voter else EPIC_NEGATIVE_TTL):
+            _cache.move_to_end(epic)
+            _stats["hits" if voter else "negative_hits"] += 1
+            return voter
+    rejected = _bloom is not None and epic not in _bloom
+    if rejected and not confirm:
+        _stats["bloom_rejects"] += 1
+        return None
+    _stats["misses"] += 1
+    voter = await voters_collection.find_one({"voterId": epic}, VOTER_FIELDS)
+    if rejected and voter is not None:
+        _stats["confirmed"] += 1  # on the roll, but not in this filter yet
+        _bloom.add(epic)
+        if _building is not None:
+            _pending.append(epic)
+    elif voter is None and _bloom is not None and not rejected:
+        _stats["bloom_false_positives"] += 1
+    _remember(epic, voter)
+    return voter
+
+def added(epic, voter):
+    # Call after inserting a voter, so neither the cache nor the filter reports it missing
+    if _bloom is not None:
+        _bloom.add(epic)
+    if _building is not None:
+        _pending.append(epic)  # the build thread owns the new filter until it is done
+    _remember(epic, {k: voter.get(k) for k in VOTER_FIELDS if k != "_id"})
+
+def invalidate(epic):
+    # Call after renaming or deleting a voter
+    if epic and _cache.pop(epic, None) is not None:
+        _stats["invalidations"] += 1
+
+async def rebuild():
+    global _bloom, _building, _bloom_built_at, _since
+    started = time.perf_counter()
+    since = _watermark()
+    expected = await voters_collection.estimated_document_count()
+    _building = BloomFilter(int(expected * BLOOM_HEADROOM), EPIC_BLOOM_FP_RATE)
+    batch = []
+    async for doc in voters_collection.find({}, {"_id": 0, "voterId": 1}, batch_size=BUILD_BATCH):
+        if doc.get("voterId"):
+            batch.append(doc["voterId"])
+        if len(batch) >= BUILD_BATCH:
+            await asyncio.to_thread(_building.add_many, batch)  # hashing stays off the event loop
+            batch = []
+    await asyncio.to_thread(_building.add_many, batch)
+    # Voters inserted while the roll was read: by other hosts, then by this process
+    async for doc in voters_collection.find({"_id": {"$gte": since}}, {"_id": 0, "voterId": 1}):
+        if doc.get("voterId"):
+            _building.add(doc["voterId"])
+    _building.add_many(_pending)
+    _pending.clear()
+    _bloom, _building = _building, None
+    _bloom_built_at, _since = time.time(), _watermark()
+    _stats["builds"] += 1
+    print(f"EPIC filter built: {_bloom.count} voters, {len(_bloom.bits) // 1024} KiB, {time.perf_counter() - started:.1f} s")
+
+async def refresh():
+    # Adds voters inserted since the last pass
+    global _since
+    if _bloom is None:
+        return
+    since = _watermark()
+    async for doc in voters_collection.find({"_id": {"$gte": _since}}, {"_id": 0, "voterId": 1}):
+        if doc.get("voterId") and doc["voterId"] not in _bloom:
+            _bloom.add(doc["voterId"])
+            _stats["refreshed"] += 1
+    _since = since
+
+async def _maintain():
+    global _building
+    while True:
+        try:
+            if _bloom is None or time.time() - _bloom_built_at >= EPIC_BLOOM_REBUILD_INTERVAL:
+                await rebuild()
+            else:
+                await refresh()
+        except Exception as e:
+            _building = None
+            _pending.clear()
+            print(f"EPIC filter update failed: {e!r}")
+        await asyncio.sleep(EPIC_BLOOM_REFRESH_INTERVAL)
+
+async def start():
+    global _task
+    _task = asyncio.create_task(_maintain())
+
+async def stop():
+    global _task
+    if _task:
+        _task.cancel()
+        await asyncio.gather(_task, return_exceptions=True)
+    _task = None
+
+def metrics():
+    served = _stats["hits"] + _stats["negative_hits"] + _stats["bloom_rejects"]
+    lookups = served + _stats["misses"]
+    bloom = None
+    if _bloom is not None:
+        bloom = {"voters": _bloom.count, "bytes": len(_bloom.bits), "hashes": _bloom.hashes,
+                 "expected_fp_rate": round(_bloom.fill_ratio() ** _bloom.hashes, 5),
+                 "age_seconds": round(time.time() - _bloom_built_at, 1)}
+    return {**_stats, "size": len(_cache), "hit_ratio": round(served / lookups, 4) if lookups else None, "bloom": bloom}
@@ -0,0 +1,183 @@
+import os
+import json
+import time
+import asyncio
+from collections import deque
+from pymongo.errors import OperationFailure
+from db import member_db, grievances_col, member_requests_col, counters_col
+import counters
+
+# Change feed for the dashboard, served as Server-Sent Events by /api/dashboard/events.
+# Events are "record" (a grievance / suggestion / volunteer row was added, changed or
+# removed) and "stats" (new values of the headline counters that changed). They come from a
+# MongoDB change stream on the members database when the server supports one (replica set /
+# Atlas), so writes made by any instance reach every dashboard; otherwise from this process's
+# own write paths through counters.changed(). Every event has an id; a reconnecting browser
+# sends the last one it saw and gets what it missed from a short in-memory buffer, or a
+# "reset" event (reload everything) when that is no longer possible.
+
+EVENTS_SOURCE = os.getenv("EVENTS_SOURCE", "auto")  # auto | change_stream | bus
+EVENTS_BUFFER = int(os.getenv("EVENTS_BUFFER", "1000"))
+EVENTS_QUEUE_SIZE = int(os.getenv("EVENTS_QUEUE_SIZE", "256"))
+EVENTS_HEARTBEAT = float(os.getenv("EVENTS_HEARTBEAT", "15"))
+EVENTS_STATS_DELAY = float(os.getenv("EVENTS_STATS_DELAY", "0.5"))
+RETRY_MS = 3000
+
+WATCHED = {grievances_col.name: "grievances", member_requests_col.name: "member_requests"}
+RESET = "reset"
+
+_epoch = format(int(time.time()), "x")  # ids from an earlier process cannot be replayed
+_seq = 0
+_buffer = deque(maxlen=EVENTS_BUFFER)  # (seq, wire text)
+_subscribers = set()
+_serializer = None
+_source = "bus"
+_task = None
+_pending_stats = set()
+_stats_task = None
+_stats = {"published": 0, "replayed": 0, "resets": 0, "overflows": 0, "stream_errors": 0}
+
+def set_serializer(fn):
+    # fn(name, doc) -> (list name, dashboard row), or None if no dashboard list shows doc
+    global _serializer
+    _serializer = fn
+
+def _wire(event_id, kind, data):
+    return f"id: {event_id}\nevent: {kind}\ndata: {json.dumps(data, default=str)}\n\n"
+
+def publish(kind, data):
+    global _seq
+    _seq += 1
+    text = _wire(f"{_epoch}-{_seq}", kind, data)
+    _buffer.append((_seq, text))
+    _stats["published"] += 1
+    for queue in list(_subscribers):
+        try:
+            queue.put_nowait(text)
+        except asyncio.QueueFull:
+            # A client that stopped reading: drop its backlog, it will reload instead
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(RESET)
+            _stats["overflows"] += 1
+
+def _record(op, name, key, doc=None):
+    # op: insert | update | delete; key is the record's _id
+    if op == "delete":
+        publish("record", {"op": op, "key": str(key)})
+        return
+    row = _serializer(name, doc) if _serializer else None
+    if row:
+        publish("record", {"op": op, "list": row[0], "key": str(key), "row": row[1]})
+
+async def _push_stats():
+    global _stats_task
+    await asyncio.sleep(EVENTS_STATS_DELAY)  # one push for a burst of writes
+    names = set(_pending_stats)
+    _pending_stats.clear()
+    _stats_task = None
+    try:
+        values = await counters.snapshot()
+    except Exception as e:
+        print(f"Stats event skipped: {e!r}")
+        return
+    publish("stats", {n: values[n] for n in names if n in values})
+
+def _written(col, before, after, deltas):
+    # counters.changed() listener: the in-process source
+    global _stats_task
+    if _source != "bus":
+        return
+    name = "grievances" if col is grievances_col else "member_requests" if col is member_requests_col else None
+    if name:
+        op = "insert" if before is None else "delete" if after is None else "update"
+        _record(op, name, (after or before)["_id"], after)
+    if deltas:
+        _pending_stats.update(deltas)
+        if _stats_task is None:
+            _stats_task = asyncio.create_task(_push_stats())
+
+def _changed(change):
+    coll = change["ns"]["coll"]
+    doc = change.get("fullDocument")
+    if coll == counters_col.name:
+        if doc and doc["_id"] in counters.COUNTERS:
+            publish("stats", {doc["_id"]: doc.get("n", 0)})
+    elif change["operationType"] == "delete":
+        _record("delete", WATCHED[coll], change["documentKey"]["_id"])
+    elif doc is not None:  # None: deleted again before the lookup
+        _record("insert" if change["operationType"] == "insert" else "update", WATCHED[coll], doc["_id"], doc)
+
+async def _watch():
+    global _source
+    pipeline = [{"$match": {"ns.coll": {"$in": list(WATCHED) + [counters_col.name]},
+                            "operationType": {"$in": ["insert", "update", "replace", "delete"]}}}]
+    token = None
+    while True:
+        try:
+            async with member_db.watch(pipeline, full_document="updateLookup", resume_after=token) as stream:
+                _source = "change_stream"
+                async for change in stream:
+                    token = stream.resume_token
+                    _changed(change)
+        except asyncio.CancelledError:
+            raise
+        except OperationFailure as e:
+            if _source != "change_stream" and EVENTS_SOURCE == "auto":
+                print(f"Change streams unavailable ({e.code}), dashboard events come from this process only")
+                return
+            _stats["stream_errors"] += 1
+            print(f"Change stream failed, restarting: {e!r}")
+            token = None
+            publish(RESET, {})  # events since the token are lost
+        except Exception as e:
+            _stats["stream_errors"] += 1
+            print(f"Change stream interrupted, resuming: {e!r}")
+        _source = "bus"
+        await asyncio.sleep(5)
+
+async def stream(last_event_id=None):
+    # Async generator of SSE text for one client
+    queue = asyncio.Queue(EVENTS_QUEUE_SIZE)
+    _subscribers.add(queue)
+    try:
+        yield f"retry: {RETRY_MS}\n\n"
+        if last_event_id:
+            epoch, _, seq = last_event_id.partition("-")
+            seq = int(seq) if seq.isdigit() else -1
+            if epoch == _epoch and 0 <= seq <= _seq and (not _buffer or _buffer[0][0] <= seq + 1):
+                missed = [text for s, text in _buffer if s > seq]
+                _stats["replayed"] += len(missed)
+                for text in missed:
+                    yield text
+            else:
+                _stats["resets"] += 1
+                yield _wire(f"{_epoch}-{_seq}", RESET, {})
+        while True:
+            try:
+                text = await asyncio.wait_for(queue.get(), EVENTS_HEARTBEAT)
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"  # keeps proxies from closing an idle connection
+                continue
+            if text == RESET:
+                _stats["resets"] += 1
+                text = _wire(f"{_epoch}-{_seq}", RESET, {})
+            yield text
+    finally:
+        _subscribers.discard(queue)
+
+async def start():
+    global _task
+    counters.subscribe(_written)
+    if EVENTS_SOURCE != "bus":
+        _task = asyncio.create_task(_watch())
+
+async def stop():
+    global _task
+    if _task:
+        _task.cancel()
+        await asyncio.gather(_task, return_exceptions=True)
+    _task = None
+
+def metrics():
+    return {**_stats, "source": _source, "clients": len(_subscribers), "last_id": f"{_epoch}-{_seq}"}
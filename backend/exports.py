@@ -0,0 +1,137 @@
+import io
+import os
+import csv
+import json
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # Parquet exports are optional
+    pyarrow = None
+
+# Full-collection exports for the dashboard (/api/dashboard/export/{dataset}). Rows are read
+# from a Motor cursor one batch at a time, turned into dashboard rows and encoded as they
+# arrive, so an export of the whole voter roll holds one cursor batch and one output chunk
+# in memory, never the result set. Parquet needs pyarrow; it is written one row group at a
+# time, every column as a string.
+
+EXPORT_BATCH = int(os.getenv("EXPORT_BATCH", "1000"))
+EXPORT_CHUNK_BYTES = int(os.getenv("EXPORT_CHUNK_BYTES", str(64 * 1024)))
+EXPORT_ROW_GROUP = int(os.getenv("EXPORT_ROW_GROUP", "20000"))
+
+# format -> (media type, file extension)
+FORMATS = {
+    "csv": ("text/csv; charset=utf-8", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+_stats = {"exports": 0, "rows": 0, "bytes": 0, "failed": 0}
+
+def available(fmt):
+    return fmt in FORMATS and (fmt != "parquet" or pyarrow is not None)
+
+async def _csv(rows, columns):
+    buf = io.StringIO()
+    buf.write("\ufeff")  # lets Excel detect UTF-8 (names are often in Tamil)
+    writer = csv.DictWriter(buf, columns, extrasaction="ignore")
+    writer.writeheader()
+    async for row in rows:
+        writer.writerow(row)
+        if buf.tell() >= EXPORT_CHUNK_BYTES:
+            yield buf.getvalue().encode()
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue().encode()
+
+async def _ndjson(rows, columns):
+    chunk = []
+    size = 0
+    async for row in rows:
+        line = json.dumps({c: row.get(c) for c in columns}, ensure_ascii=False, default=str) + "\n"
+        chunk.append(line)
+        size += len(line)
+        if size >= EXPORT_CHUNK_BYTES:
+            yield "".join(chunk).encode()
+            chunk, size = [], 0
+    yield "".join(chunk).encode()
+
+class _Sink:
+    # Write-only file the Parquet writer streams into; take() hands over what it wrote so far
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+async def _parquet(rows, columns):
+    schema = pyarrow.schema([(c, pyarrow.string()) for c in columns])
+    sink = _Sink()
+    writer = pyarrow.parquet.ParquetWriter(sink, schema, compression="zstd")
+    group = {c: [] for c in columns}
+    count = 0
+
+    def write_group():
+        writer.write_table(pyarrow.table(group, schema=schema))
+        for values in group.values():
+            values.clear()
+
+    async for row in rows:
+        for c in columns:
+            value = row.get(c)
+            group[c].append(None if value is None else str(value))
+        count += 1
+        if count % EXPORT_ROW_GROUP == 0:
+            write_group()
+            yield sink.take()
+    if count % EXPORT_ROW_GROUP or not count:
+        write_group()
+    writer.close()
+    yield sink.take()
+
+ENCODERS = {"csv": _csv, "ndjson": _ndjson, "parquet": _parquet}
+
+async def stream(cursor, to_row, columns, fmt):
+    # Yields the encoded export of every document cursor returns
+    _stats["exports"] += 1
+    count = 0
+
+    async def rows():
+        nonlocal count
+        async for doc in cursor.batch_size(EXPORT_BATCH):
+            count += 1
+            yield to_row(doc)
+
+    try:
+        async for chunk in ENCODERS[fmt](rows(), columns):
+            if chunk:
+                _stats["bytes"] += len(chunk)
+                yield chunk
+    except Exception as e:
+        # Headers are already sent: the client sees a truncated download
+        _stats["failed"] += 1
+        print(f"Export failed after {count} rows: {e!r}")
+        raise
+    finally:
+        _stats["rows"] += count
+        await cursor.close()
+
+def metrics():
+    return {**_stats, "parquet": pyarrow is not None}
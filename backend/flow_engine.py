@@ -0,0 +1,92 @@
+import re
+from collections import namedtuple
+
+# Declarative conversation engine used by bot_logic. States map to handlers in a dict
+# (O(1) dispatch), user replies are classified by precompiled intent tables, and simple
+# "save the answer, move on, ask the next question" steps are declared as Capture data.
+
+Message = namedtuple("Message", ["phone", "text", "lat", "lon", "image_id"])
+
+class Intent:
+    # Matches when the lowered reply equals one of `ids`, contains any of `contains`,
+    # or contains every word in `contains_all`
+    def __init__(self, name, ids=(), contains=(), contains_all=()):
+        self.name = name
+        self.ids = frozenset(ids)
+        self.pattern = re.compile("|".join(re.escape(c) for c in contains)) if contains else None
+        self.contains_all = tuple(contains_all)
+
+    def matches(self, text):
+        if text in self.ids:
+            return True
+        if self.pattern is not None and self.pattern.search(text):
+            return True
+        return bool(self.contains_all) and all(w in text for w in self.contains_all)
+
+class IntentTable:
+    # Ordered: the first matching intent wins, mirroring the old if/elif precedence
+    def __init__(self, intents):
+        self.intents = tuple(intents)
+        # Button/list ids are by far the most common replies: resolve each one once, with
+        # full precedence, so matching them is a single dict lookup
+        self.exact = {i: self._scan(i) for intent in self.intents for i in intent.ids}
+
+    def _scan(self, text):
+        for intent in self.intents:
+            if intent.matches(text):
+                return intent.name
+        return None
+
+    def match(self, text):
+        text = text.lower() if text else ""
+        name = self.exact.get(text)
+        return name if name is not None else self._scan(text)
+
+class Capture:
+    # Store the reply in a session field, move to `next_state` and send the next prompt
+    def __init__(self, field, next_state, prompt, transform=None):
+        self.field = field
+        self.next_state = next_state
+        self.prompt = prompt
+        self.transform = transform
+
+    async def __call__(self, msg, session):
+        session[self.field] = self.transform(msg.text) if self.transform else msg.text
+        session["state"] = self.next_state
+        await self.prompt(msg.phone, session)
+
+class FlowEngine:
+    def __init__(self):
+        self.handlers = {}
+
+    def register(self, state, handler):
+        # handler: async (Message, session) -> None
+        self.handlers[state] = handler
+
+    def register_all(self, table):
+        for state, handler in table.items():
+            self.register(state, handler)
+
+    def state(self, name):
+        def decorator(fn):
+            self.register(name, fn)
+            return fn
+        return decorator
+
+    def __contains__(self, state):
+        return state in self.handlers
+
+    async def dispatch(self, state, msg, session):
+        handler = self.handlers.get(state)
+        if handler is None:
+            return False
+        await handler(msg, session)
+        return True
+
+def with_text(fn):
+    # Adapts the classic (phone, text, session) handlers
+    return lambda msg, session: fn(msg.phone, msg.text, session)
+
+def with_photo(fn):
+    # Adapts (phone, image_id, text, session) handlers
+    return lambda msg, session: fn(msg.phone, msg.image_id, msg.text, session)
@@ -0,0 +1,225 @@
+import os
+import re
+import csv
+import sys
+import time
+import asyncio
+import hashlib
+import argparse
+import datetime
+from collections import deque
+from pymongo import UpdateOne
+from db import voters_collection, counters_col, migrations_col
+
+# Loads an electoral roll export (CSV or XLSX) into the voters collection.
+# Usage: python import_voters.py roll.csv [--batch 5000] [--concurrency 4] [--district X] [--dry-run]
+#
+# Rows are read one at a time (XLSX in openpyxl's read-only mode, which needs
+# `pip install openpyxl`) and written as unordered bulk upserts on voterId, --concurrency
+# batches in flight, so memory stays bounded by the batch size whatever the file size.
+# Roll fields are overwritten; voters the bot registered as Unverified become Active and
+# keep their phone and createdAt. Rows with a malformed EPIC go to <file>.rejects.csv.
+# After every batch the number of rows done is stored in the migrations collection, keyed
+# by a fingerprint of the file, so re-running the same command continues where it stopped
+# (--restart starts over). Running bots pick new voters up within a minute (epic_cache.py).
+
+# Current EPICs are 3 letters + 7 digits; older cards use a state/AC/part/serial form
+EPIC_PATTERN = re.compile(os.getenv("EPIC_PATTERN", r"[A-Z]{3}[0-9]{7}|[A-Z]{2,3}/[0-9]{2}/[0-9]{2,3}/[0-9]{6,7}"))
+
+# voter field -> accepted column headers (compared lower-cased, without spaces, dots, _ or -)
+COLUMNS = {
+    "voterId": ("voterid", "epic", "epicno", "epicnumber", "idcardno", "cardno"),
+    "name": ("name", "votername", "electorname", "fullname"),
+    "partNumber": ("partnumber", "partno", "part", "booth", "boothno", "pollingstation", "psno"),
+    "district": ("district", "districtname"),
+    "age": ("age",),
+    "gender": ("gender", "sex"),
+}
+
+parser = argparse.ArgumentParser()
+parser.add_argument("path")
+parser.add_argument("--format", choices=["csv", "xlsx"], help="default: from the file extension")
+parser.add_argument("--sheet", help="XLSX sheet name (default: the first)")
+parser.add_argument("--district", help="district for rows that do not have one")
+parser.add_argument("--batch", type=int, default=5000)
+parser.add_argument("--concurrency", type=int, default=4, help="bulk writes in flight")
+parser.add_argument("--restart", action="store_true", help="ignore the checkpoint")
+parser.add_argument("--dry-run", action="store_true", help="validate only, write nothing")
+
+def _header_key(value):
+    return re.sub(r"[\s._-]", "", str(value or "")).lower()
+
+def column_map(header):
+    keys = [_header_key(h) for h in header]
+    found = {}
+    for field, names in COLUMNS.items():
+        for i, key in enumerate(keys):
+            if key in names:
+                found[field] = i
+                break
+    if "voterId" not in found:
+        raise SystemExit(f"No EPIC column found in header {header}; expected one of {COLUMNS['voterId']}")
+    return found
+
+def csv_rows(path):
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        yield from csv.reader(f)
+
+def xlsx_rows(path, sheet=None):
+    try:
+        import openpyxl
+    except ModuleNotFoundError:
+        raise SystemExit("XLSX import needs openpyxl: pip install openpyxl (or export the roll as CSV)")
+    book = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        yield from book[sheet or book.sheetnames[0]].iter_rows(values_only=True)
+    finally:
+        book.close()
+
+def fingerprint(path):
+    # Size plus the first MiB: cheap, and changes when a different export is given the same name
+    h = hashlib.sha256(str(os.path.getsize(path)).encode())
+    with open(path, "rb") as f:
+        h.update(f.read(1 << 20))
+    return h.hexdigest()[:16]
+
+def normalize_epic(value):
+    return re.sub(r"\s", "", str(value or "")).upper()
+
+def part_number(value):
+    # Rolls store part numbers as numbers (see pagination.booth_values)
+    text = str(value).strip()
+    if text.endswith(".0"):
+        text = text[:-2]  # spreadsheets turn 101 into 101.0
+    return int(text) if text.isdigit() else text
+
+def voter_fields(row, columns, district):
+    def cell(field):
+        i = columns.get(field)
+        value = row[i] if i is not None and i < len(row) else None
+        return value.strip() if isinstance(value, str) else value
+    fields = {"voterId": normalize_epic(cell("voterId"))}
+    if cell("name"):
+        fields["name"] = str(cell("name"))
+    if cell("partNumber") not in (None, ""):
+        fields["partNumber"] = part_number(cell("partNumber"))
+    if cell("district") or district:
+        fields["district"] = str(cell("district") or district)
+    if cell("age") not in (None, "") and str(cell("age")).split(".")[0].isdigit():
+        fields["age"] = int(str(cell("age")).split(".")[0])
+    if cell("gender"):
+        fields["gender"] = str(cell("gender"))
+    return fields
+
+def upsert(fields, now):
+    # Pipeline update so one op covers new voters, roll updates and bot-registered voters
+    return UpdateOne({"voterId": fields["voterId"]}, [{"$set": {
+        **{k: {"$literal": v} for k, v in fields.items()},
+        "status": {"$cond": [{"$eq": [{"$ifNull": ["$status", "Unverified"]}, "Unverified"]}, "Active", "$status"]},
+        "source": {"$ifNull": ["$source", "Electoral Roll"]},
+        "createdAt": {"$ifNull": ["$createdAt", now]},
+        "rollImportedAt": now
+    }}], upsert=True)
+
+async def write(ops, end_row):
+    result = await voters_collection.bulk_write(ops, ordered=False)
+    if result.upserted_count:
+        # New voters bypass counters.changed(); keep the dashboard total in step
+        await counters_col.update_one({"_id": "voters"}, {"$inc": {"n": result.upserted_count}}, upsert=True)
+    return result, end_row
+
+async def main(args):
+    fmt = args.format or ("xlsx" if args.path.lower().endswith((".xlsx", ".xlsm")) else "csv")
+    rows = xlsx_rows(args.path, args.sheet) if fmt == "xlsx" else csv_rows(args.path)
+    columns = column_map(next(rows))
+    print(f"Columns: {', '.join(f'{k}=#{v + 1}' for k, v in columns.items())}")
+
+    state_id = f"import_voters:{fingerprint(args.path)}"
+    if args.restart and not args.dry_run:
+        await migrations_col.delete_one({"_id": state_id})
+    state = {} if args.restart or args.dry_run else await migrations_col.find_one({"_id": state_id}) or {}
+    if state.get("done"):
+        print(f"{args.path} was already imported on {state.get('completed_at')}; use --restart to import it again")
+        return 0
+    skip = state.get("rows_done", 0)
+    if skip:
+        print(f"Resuming after row {skip}")
+
+    rejects_path = args.path + ".rejects.csv"
+    rejects_file = None
+    counts = {"read": 0, "valid": 0, "rejected": 0, "duplicates": 0, "inserted": 0, "updated": 0}
+    in_flight = deque()
+    batch = {}
+    last_row = skip
+    started = last_report = time.perf_counter()
+
+    async def settle(task):
+        result, end_row = await task
+        counts["inserted"] += result.upserted_count
+        counts["updated"] += result.modified_count
+        # Batches are awaited in order, so every row up to end_row is written
+        await migrations_col.update_one({"_id": state_id}, {"$set": {
+            "path": os.path.basename(args.path), "rows_done": end_row,
+            "updated_at": datetime.datetime.now(datetime.timezone.utc)}}, upsert=True)
+
+    async def flush(end_row):
+        nonlocal batch
+        if not batch:
+            return
+        now = datetime.datetime.now(datetime.timezone.utc)
+        ops = [upsert(fields, now) for fields in batch.values()]
+        batch = {}
+        if args.dry_run:
+            return
+        in_flight.append(asyncio.create_task(write(ops, end_row)))
+        if len(in_flight) >= args.concurrency:
+            await settle(in_flight.popleft())
+
+    for row_number, row in enumerate(rows, start=1):
+        if row_number <= skip:
+            continue
+        last_row = row_number
+        if not row or all(v in (None, "") for v in row):
+            continue
+        counts["read"] += 1
+        fields = voter_fields(row, columns, args.district)
+        if not EPIC_PATTERN.fullmatch(fields["voterId"]):
+            counts["rejected"] += 1
+            if rejects_file is None:
+                resumed = skip and os.path.exists(rejects_path)
+                rejects_file = open(rejects_path, "a" if resumed else "w", newline="", encoding="utf-8")
+                rejects = csv.writer(rejects_file)
+                if not resumed:
+                    rejects.writerow(["row", "reason", "epic"])
+            rejects.writerow([row_number + 1, "malformed EPIC", fields["voterId"]])
+            continue
+        counts["valid"] += 1
+        if fields["voterId"] in batch:
+            counts["duplicates"] += 1  # same EPIC twice in one batch: the later row wins
+        batch[fields["voterId"]] = fields
+        if len(batch) >= args.batch:
+            await flush(row_number)
+            if time.perf_counter() - last_report >= 5:
+                last_report = time.perf_counter()
+                rate = counts["read"] / (last_report - started)
+                print(f"{skip + counts['read']} rows, {counts['inserted']} new, {counts['updated']} updated, "
+                      f"{counts['rejected']} rejected ({rate:.0f} rows/s)")
+    await flush(last_row)
+    while in_flight:
+        await settle(in_flight.popleft())
+    if rejects_file:
+        rejects_file.close()
+
+    elapsed = time.perf_counter() - started
+    print(f"Read {counts['read']} rows in {elapsed:.1f} s ({counts['read'] / max(elapsed, 1e-9):.0f} rows/s): "
+          f"{counts['inserted']} new voters, {counts['updated']} updated, {counts['rejected']} rejected, "
+          f"{counts['duplicates']} repeated EPICs")
+    if counts["rejected"]:
+        print(f"Rejected rows: {rejects_path}")
+    if not args.dry_run:
+        await migrations_col.update_one({"_id": state_id}, {"$set": {
+            "done": True, "completed_at": datetime.datetime.now(datetime.timezone.utc), **counts}}, upsert=True)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(parser.parse_args())))
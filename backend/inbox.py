@@ -0,0 +1,265 @@
+import os
+import time
+import socket
+import asyncio
+import datetime
+from collections import OrderedDict
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from db import webhook_events_col, processed_messages_col
+from bot_logic import handle_incoming_message
+from dispatcher import KeyedDispatcher
+
+# Acknowledge-first webhook ingestion. The webhook only persists the raw payload and
+# returns; messages are handled in the background. Every WhatsApp message id is claimed
+# in processed_messages ("processing", then "done" once its handler has succeeded), so
+# Meta's redeliveries of a slow webhook are dropped.
+#
+# Events and message claims are leased to the process handling them, which renews the
+# leases while it works. When a handler fails the claim is released and the event is left
+# pending; when a process dies its leases run out. Either way another pass (or another
+# process) replays the event and takes the message over, up to INBOX_MAX_ATTEMPTS times.
+
+INBOX_WORKERS = int(os.getenv("INBOX_WORKERS", "32"))
+INBOX_DEDUP_CACHE = int(os.getenv("INBOX_DEDUP_CACHE", "20000"))
+# Lease on events and message claims; also the delay before a failed event is replayed
+INBOX_RECOVER_AFTER = float(os.getenv("INBOX_RECOVER_AFTER", "60"))
+INBOX_MAX_ATTEMPTS = int(os.getenv("INBOX_MAX_ATTEMPTS", "5"))
+PROCESSED_TTL = int(os.getenv("INBOX_PROCESSED_TTL", str(7 * 24 * 3600)))
+EVENTS_TTL = int(os.getenv("INBOX_EVENTS_TTL", str(3 * 24 * 3600)))
+
+OWNER = f"{socket.gethostname()}:{os.getpid()}"
+
+class MongoInboxStore:
+    def __init__(self, events, processed):
+        self.events = events
+        self.processed = processed
+
+    async def save_event(self, payload, message_ids):
+        now = datetime.datetime.now(datetime.timezone.utc)
+        event = {"payload": payload, "message_ids": message_ids, "status": "pending", "received_at": now,
+                 "owner": OWNER, "lease_until": time.time() + INBOX_RECOVER_AFTER, "updated_at": time.time()}
+        result = await self.events.insert_one(event)
+        event["_id"] = result.inserted_id
+        return event
+
+    async def claim_message(self, message_id):
+        now = time.time()
+        try:
+            await self.processed.insert_one({"_id": message_id, "status": "processing", "owner": OWNER, "attempts": 1,
+                                             "lease_until": now + INBOX_RECOVER_AFTER, "at": datetime.datetime.now(datetime.timezone.utc)})
+            return True
+        except DuplicateKeyError:
+            pass
+        # Done (or marked before claims had a status), held by a live process, or out of attempts otherwise
+        doc = await self.processed.find_one_and_update(
+            {"_id": message_id, "status": "processing", "lease_until": {"$lt": now}, "attempts": {"$lt": INBOX_MAX_ATTEMPTS}},
+            {"$set": {"owner": OWNER, "lease_until": now + INBOX_RECOVER_AFTER}, "$inc": {"attempts": 1}}
+        )
+        return doc is not None
+
+    async def complete_message(self, message_id):
+        await self.processed.update_one({"_id": message_id, "owner": OWNER}, {"$set": {
+            "status": "done", "at": datetime.datetime.now(datetime.timezone.utc)}})
+
+    async def release_message(self, message_id, error):
+        await self.processed.update_one({"_id": message_id, "owner": OWNER}, {"$set": {"lease_until": 0, "last_error": error}})
+
+    async def heartbeat(self, event_ids, message_ids):
+        lease = {"$set": {"lease_until": time.time() + INBOX_RECOVER_AFTER}}
+        if event_ids:
+            await self.events.update_many({"_id": {"$in": list(event_ids)}, "status": "pending", "owner": OWNER}, lease)
+        if message_ids:
+            await self.processed.update_many({"_id": {"$in": list(message_ids)}, "status": "processing", "owner": OWNER}, lease)
+
+    async def finish_event(self, event):
+        await self.events.update_one({"_id": event["_id"]}, {"$set": {"status": "done", "updated_at": time.time()}})
+
+    async def claim_expired_events(self, skip_ids):
+        # One event at a time, so when processes race for an event exactly one replays it
+        claimed = []
+        while len(claimed) < 1000:
+            now = time.time()
+            event = await self.events.find_one_and_update(
+                {"status": "pending", "lease_until": {"$not": {"$gte": now}}, "_id": {"$nin": list(skip_ids)}},
+                {"$set": {"owner": OWNER, "lease_until": now + INBOX_RECOVER_AFTER, "updated_at": now}},
+                sort=[("_id", 1)], return_document=ReturnDocument.AFTER
+            )
+            if event is None:
+                break
+            claimed.append(event)
+        return claimed
+
+_store = None
+_handler = None
+_queue = None
+_tasks = []
+_in_progress = set()  # event ids this process is working on
+_held = set()  # message ids this process has claimed and not completed or released
+_recent_ids = OrderedDict()
+_stats = {"events": 0, "messages": 0, "duplicates": 0, "failed": 0}
+# Messages from one phone are handled strictly in order; different phones in parallel
+_dispatcher = KeyedDispatcher("inbox", INBOX_WORKERS)
+
+def parse_message(message):
+    phone_number = message.get("from")
+    msg_type = message.get("type")
+
+    text = None
+    lat = None
+    lon = None
+    image_id = None
+
+    if msg_type == "text":
+        text = message["text"]["body"]
+    elif msg_type == "interactive":
+        interactive = message["interactive"]
+        itype = interactive.get("type")
+        if itype == "button_reply":
+            text = interactive["button_reply"]["id"]
+        elif itype == "list_reply":
+            text = interactive["list_reply"]["id"]
+    elif msg_type == "location":
+        lat = message["location"]["latitude"]
+        lon = message["location"]["longitude"]
+    elif msg_type == "image":
+        image_id = message["image"]["id"]
+        text = message["image"].get("caption", "IMAGE")
+
+    return phone_number, text, lat, lon, image_id
+
+def iter_messages(payload):
+    for entry in payload.get("entry", []):
+        for change in entry.get("changes", []):
+            for message in change.get("value", {}).get("messages", []):
+                yield message
+
+def _seen_recently(message_id):
+    if message_id in _recent_ids:
+        _recent_ids.move_to_end(message_id)
+        return True
+    _recent_ids[message_id] = True
+    if len(_recent_ids) > INBOX_DEDUP_CACHE:
+        _recent_ids.popitem(last=False)
+    return False
+
+async def ingest(payload):
+    # Called from the webhook: must stay cheap. Status callbacks carry no messages and are not stored.
+    message_ids = [m.get("id") for m in iter_messages(payload)]
+    if not message_ids:
+        return
+    fresh = [mid for mid in message_ids if not mid or not _seen_recently(mid)]
+    if not fresh:
+        _stats["duplicates"] += len(message_ids)
+        return
+    try:
+        event = await _store.save_event(payload, message_ids)
+    except Exception:
+        # Not persisted: forget the ids so Meta's retry of this webhook is accepted
+        for mid in fresh:
+            _recent_ids.pop(mid, None)
+        raise
+    _stats["events"] += 1
+    _in_progress.add(event["_id"])
+    _queue.put_nowait(event)
+
+async def _process_event(event):
+    # Claims run here in arrival order; handlers run on the per-phone dispatcher
+    claimed = []
+    for message in iter_messages(event["payload"]):
+        message_id = message.get("id")
+        if message_id and not await _store.claim_message(message_id):
+            _stats["duplicates"] += 1
+            continue
+        if message_id:
+            _held.add(message_id)
+        claimed.append(message)
+    if not claimed:
+        await _finish_event(event)
+        return
+    state = {"remaining": len(claimed), "failed": False}
+    for message in claimed:
+        _stats["messages"] += 1
+        _dispatcher.submit(message.get("from"), _message_job(event, message, state))
+
+def _message_job(event, message, state):
+    async def job():
+        message_id = message.get("id")
+        try:
+            await _handler(*parse_message(message))
+            if message_id:
+                await _store.complete_message(message_id)
+        except Exception as e:
+            state["failed"] = True
+            _stats["failed"] += 1
+            print(f"Inbox handler failed on message {message_id} from {message.get('from')}: {e!r}")
+            if message_id:
+                try:
+                    await _store.release_message(message_id, repr(e)[:500])
+                except Exception as e:
+                    print(f"Inbox could not release message {message_id}: {e!r}")
+        finally:
+            _held.discard(message_id)
+            state["remaining"] -= 1
+            if state["remaining"] == 0:
+                if state["failed"]:
+                    # Left pending: its lease runs out and the event is replayed
+                    _in_progress.discard(event["_id"])
+                else:
+                    await _finish_event(event)
+    return job
+
+async def _finish_event(event):
+    _in_progress.discard(event["_id"])
+    await _store.finish_event(event)
+
+async def _consumer():
+    while True:
+        event = await _queue.get()
+        try:
+            await _process_event(event)
+        except Exception as e:
+            _in_progress.discard(event["_id"])
+            print(f"Inbox failed on event {event.get('_id')}: {e!r}")
+        finally:
+            _queue.task_done()
+
+async def _recover_loop():
+    while True:
+        try:
+            await _store.heartbeat(set(_in_progress), set(_held))
+            events = await _store.claim_expired_events(set(_in_progress))
+            for event in events:
+                _in_progress.add(event["_id"])
+                _queue.put_nowait(event)
+            if events:
+                print(f"Inbox replaying {len(events)} unprocessed webhook events")
+        except Exception as e:
+            print(f"Inbox recovery failed: {e!r}")
+        await asyncio.sleep(INBOX_RECOVER_AFTER / 4)
+
+async def start(handler=None, store=None):
+    global _store, _handler, _queue
+    _store = store or MongoInboxStore(webhook_events_col, processed_messages_col)
+    _handler = handler or handle_incoming_message
+    _queue = asyncio.Queue()
+    _dispatcher.start()
+    _tasks[:] = [asyncio.create_task(_consumer()), asyncio.create_task(_recover_loop())]
+
+async def drain():
+    await _queue.join()
+    await _dispatcher.drain()
+
+async def stop(timeout=5):
+    try:
+        await asyncio.wait_for(drain(), timeout)
+    except asyncio.TimeoutError:
+        pass  # unfinished events stay pending and are replayed by the next process
+    await _dispatcher.stop(timeout=0)
+    for t in _tasks:
+        t.cancel()
+    await asyncio.gather(*_tasks, return_exceptions=True)
+    _tasks.clear()
+
+def metrics():
+    return {**_stats, "backlog": _queue.qsize() if _queue else 0, "dispatcher": _dispatcher.metrics()}
@@ -0,0 +1,166 @@
+import os
+import asyncio
+from pymongo.errors import OperationFailure
+from db import (voters_collection, grievances_col, member_requests_col, booth_rollups_col, grievance_trends_col, outbox_col,
+                webhook_events_col, processed_messages_col, sessions_col, media_col)
+from inbox import PROCESSED_TTL, EVENTS_TTL
+
+# Every index the app relies on, declared in one place and created at startup. Each entry is
+# (collection, keys, options). Add the index here in the same change that adds a new query
+# shape, and add the shape to check_query_plans.py so CI catches collection scans.
+
+ENSURE_INDEXES = os.getenv("ENSURE_INDEXES", "1") == "1"
+
+INDEX_SPECS = [
+    # verify_epic / handle_post_flow_name
+    (voters_collection, [("voterId", 1)], {"unique": True}),
+    # Voters list filters, newest first
+    (voters_collection, [("partNumber", 1), ("_id", -1)], {}),
+    (voters_collection, [("status", 1), ("_id", -1)], {}),
+    # Any list with ?date_from/?date_to: createdAt range, newest first (pagination.py)
+    (voters_collection, [("createdAt", -1), ("_id", -1)], {}),
+
+    # Reference lookups (update_status, handle_flow5_ref, delete_record); ticketId is the legacy field
+    (grievances_col, [("ref_id", 1)], {}),
+    (grievances_col, [("ticketId", 1)], {}),
+    # Ids from ref_ids carry ref_seq; legacy random ids may already repeat, so they are exempt
+    (grievances_col, [("ref_id", 1)], {"name": "ref_id_unique", "unique": True, "partialFilterExpression": {"ref_seq": {"$exists": True}}}),
+    # "My Activity" summary ($match on either phone field); new records use voter_phone, legacy ones phoneNumber
+    (grievances_col, [("voter_phone", 1), ("status", 1)], {}),
+    (grievances_col, [("phoneNumber", 1), ("status", 1)], {}),
+    # Grievances list filters, newest first (status also serves the open-grievance recount)
+    (grievances_col, [("status", 1), ("_id", -1)], {}),
+    (grievances_col, [("type", 1), ("_id", -1)], {}),
+    (grievances_col, [("category", 1), ("_id", -1)], {}),
+    (grievances_col, [("booth", 1), ("_id", -1)], {}),
+    (grievances_col, [("partNumber", 1), ("_id", -1)], {}),
+    (grievances_col, [("createdAt", -1), ("_id", -1)], {}),
+
+    (member_requests_col, [("ref_id", 1)], {}),
+    (member_requests_col, [("referenceId", 1)], {}),
+    (member_requests_col, [("ref_id", 1)], {"name": "ref_id_unique", "unique": True, "partialFilterExpression": {"ref_seq": {"$exists": True}}}),
+    # Suggestions / volunteers lists (newest first) and counts
+    (member_requests_col, [("type", 1), ("_id", -1)], {}),
+    (member_requests_col, [("type", 1), ("createdAt", -1), ("_id", -1)], {}),
+    (member_requests_col, [("createdAt", -1), ("_id", -1)], {}),
+    (member_requests_col, [("type", 1), ("status", 1), ("_id", -1)], {}),
+    (member_requests_col, [("type", 1), ("booth", 1), ("_id", -1)], {}),
+    (member_requests_col, [("voter_phone", 1), ("type", 1)], {}),
+    (member_requests_col, [("phoneNumber", 1), ("type", 1)], {}),
+
+    # Dashboard analytics over a window of days, optionally for one booth
+    (booth_rollups_col, [("day", 1), ("booth", 1)], {}),
+    (booth_rollups_col, [("booth", 1), ("day", 1)], {}),
+    # Trends: one unit, a range of buckets, optionally one booth
+    (grievance_trends_col, [("unit", 1), ("start", 1)], {}),
+    (grievance_trends_col, [("unit", 1), ("booth", 1), ("start", 1)], {}),
+
+    # Outbox recovery and metrics
+    (outbox_col, [("status", 1), ("lease_until", 1)], {}),
+
+    # Inbox: dedup markers and raw events expire, events with an expired lease are replayed
+    (processed_messages_col, [("at", 1)], {"expireAfterSeconds": PROCESSED_TTL}),
+    (webhook_events_col, [("received_at", 1)], {"expireAfterSeconds": EVENTS_TTL}),
+    (webhook_events_col, [("status", 1), ("lease_until", 1)], {}),
+
+    # Media ingestion retries
+    (media_col, [("status", 1), ("retry_at", 1)], {}),
+
+    # Mongo session store: documents carry their own expiry time
+    (sessions_col, [("exp", 1)], {"expireAfterSeconds": 0}),
+]
+
+INDEX_OPTIONS_CONFLICT = (85, 86)
+
+def _label(col):
+    return f"{col.database.name}.{col.name}"
+
+def _collections():
+    seen = {}
+    for col, _, _ in INDEX_SPECS:
+        seen.setdefault(_label(col), col)
+    return list(seen.values())
+
+async def _existing(col):
+    try:
+        info = await col.index_information()
+    except OperationFailure:
+        return {}  # collection does not exist yet
+    return {name: tuple(tuple(k) for k in spec["key"]) for name, spec in info.items()}
+
+async def _ensure(col, keys, options):
+    try:
+        await col.create_index(keys, **options)
+        return None
+    except OperationFailure as e:
+        if e.code in INDEX_OPTIONS_CONFLICT and "expireAfterSeconds" in options:
+            # TTL changed: adjust the existing index in place instead of dropping and rebuilding it
+            await col.database.command("collMod", col.name, index={"keyPattern": dict(keys), "expireAfterSeconds": options["expireAfterSeconds"]})
+            return None
+        return e.details.get("errmsg") if e.details else str(e)
+
+async def ensure_indexes():
+    # Returns {"created": [...], "failed": [...]}; a failed build (e.g. duplicates under a
+    # unique index) is reported but does not stop the app
+    report = {"created": [], "failed": []}
+    before = {}
+    for col in _collections():
+        existing = await _existing(col)
+        before[_label(col)] = set(existing) | set(existing.values())
+    results = await asyncio.gather(*(_ensure(col, keys, options) for col, keys, options in INDEX_SPECS))
+    for (col, keys, options), error in zip(INDEX_SPECS, results):
+        name = f"{_label(col)} {options.get('name', dict(keys))}"
+        if error:
+            report["failed"].append(f"{name}: {error}")
+        elif options.get("name", tuple(keys)) not in before[_label(col)]:
+            report["created"].append(name)
+    for name in report["created"]:
+        print(f"Created index {name}")
+    for line in report["failed"]:
+        print(f"Index build failed {line}")
+    return report
+
+async def index_report():
+    # Per collection: declared indexes that are missing, indexes that exist but are not
+    # declared here, and indexes the server has not used since it last restarted
+    report = {}
+    declared = {}
+    for col, keys, options in INDEX_SPECS:
+        declared.setdefault(_label(col), set()).add((tuple(keys), options.get("name")))
+    for col in _collections():
+        label = _label(col)
+        existing = await _existing(col)
+        declared_keys = {k for k, _ in declared[label]}
+        entry = {
+            # Indexes declared with an explicit name share keys with another one; match those by name
+            "missing": [name or dict(k) for k, name in declared[label] if (name not in existing if name else k not in existing.values())],
+            "undeclared": [name for name, keys in existing.items() if name != "_id_" and keys not in declared_keys],
+            "unused": []
+        }
+        try:
+            stats = await col.aggregate([{"$indexStats": {}}]).to_list(length=None)
+            entry["unused"] = [s["name"] for s in stats if s["name"] != "_id_" and s["accesses"]["ops"] == 0]
+        except OperationFailure:
+            entry["unused"] = None  # $indexStats not permitted on this deployment
+        report[label] = entry
+    return report
+
+async def startup():
+    if not ENSURE_INDEXES:
+        return
+    try:
+        await ensure_indexes()
+        for label, entry in (await index_report()).items():
+            if entry["missing"] or entry["undeclared"]:
+                print(f"Indexes on {label}: {entry}")
+    except Exception as e:
+        print(f"Index bootstrap failed: {e!r}")
+
+if __name__ == "__main__":
+    import json
+
+    async def main():
+        print(json.dumps(await ensure_indexes(), indent=2))
+        print(json.dumps(await index_report(), indent=2))
+
+    asyncio.run(main())
@@ -1,14 +1,33 @@
 import os
+import asyncio
+import inspect
 import datetime
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, HTTPException
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import JSONResponse, Response
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
-import requests
-from bot_logic import handle_incoming_message, IMG_URLS
+from bot_logic import IMG_URLS, sessions
 from db import voters_collection, grievances_col, member_requests_col
-from whatsapp import send_text_message, send_image_message, TOKEN
+from whatsapp import send_text_message, send_image_message, close_client
+import outbox
+import inbox
+import counters
+import booth_pulse
+import booth_rollups
+import events
+import epic_cache
+import exports
+import activity
+import indexes
+import media_proxy
+import media_ingest
+import media_registry
+import ref_ids
+import ref_index
+import schema
+from pagination import fetch_page, list_query, sort_keys, booth_values
+from static_assets import AssetFiles, ASSETS_DIR
 
 load_dotenv()
 
@@ -21,9 +40,151 @@ CAT_MAP = {
     "vol_1": "Volunteer @ Booth", "vol_2": "Organise Meetings", "vol_3": "Spread Information", "vol_4": "Future Coordination"
 }
 
-app = FastAPI(title="TVK WhatsApp Bot Backend")
+GRIEVANCE_FIELDS = schema.projection("grievances", ["ref_id", "voter_name", "epic", "booth", "category", "status",
+                                                   "description", "type", "photo_id"])
+SUGGESTION_FIELDS = schema.projection("member_requests", ["ref_id", "voter_name", "booth", "suggestion", "status", "photo_id"])
+VOLUNTEER_FIELDS = schema.projection("member_requests", ["ref_id", "voter_name", "booth", "role", "status", "photo_id"])
+VOTER_FIELDS = ["voterId", "name", "partNumber", "district", "status", "createdAt"]
 
-app.mount("/assets", StaticFiles(directory="assets"), name="assets")
+def category_values(category):
+    # Accept either the stored id (cat_2) or the label the dashboard shows (Roads & Infra)
+    return [category] + [k for k, v in CAT_MAP.items() if v == category]
+
+def booth_filter(name, booth):
+    if not booth:
+        return None
+    return schema.match(name, "booth", {"$in": booth_values(booth)})
+
+# Dashboard rows; "key" is the record's _id, which change events refer to
+def grievance_row(r):
+    cat_raw = r.category or "General"
+    return {
+        "key": str(r.id),
+        "id": r.ref_id or "",
+        "name": r.voter_name or "",
+        "epic": r.epic or "",
+        "booth": r.booth or "",
+        "category": CAT_MAP.get(cat_raw, cat_raw),
+        "status": r.status or "Open",
+        "date": schema.format_date(r.created_at),
+        "description": r.description or "",
+        "type": r.type,
+        "photo_id": r.photo_id
+    }
+
+def suggestion_row(r):
+    return {
+        "key": str(r.id),
+        "id": r.ref_id or "",
+        "name": r.voter_name or "",
+        "booth": r.booth or "",
+        "suggestion": r.suggestion or "Member Request",
+        "status": r.status or "Pending",
+        "date": schema.format_date(r.created_at),
+        "photo_id": r.photo_id
+    }
+
+def volunteer_row(r):
+    role_raw = r.role or ""
+    return {
+        "key": str(r.id),
+        "id": r.ref_id or "",
+        "name": r.voter_name or "",
+        "booth": r.booth or "",
+        "role": CAT_MAP.get(role_raw, role_raw),
+        "status": r.status or "Registered",
+        "date": schema.format_date(r.created_at),
+        "photo_id": r.photo_id
+    }
+
+def voter_row(i):
+    return {
+        "id": i.get("voterId") or "N/A",
+        "name": i.get("name") or "Anonymous",
+        "booth": str(i.get("partNumber") or "N/A"),
+        "district": i.get("district") or "N/A",
+        "status": i.get("status") or "Active"
+    }
+
+def grievance_filters(status=None, booth=None, category=None, type=None):
+    return [
+        {"status": status} if status else None,
+        {"type": type} if type else None,
+        {"category": {"$in": category_values(category)}} if category else None,
+        booth_filter("grievances", booth)
+    ]
+
+def suggestion_filters(status=None, booth=None):
+    return [schema.suggestion_filter(), {"status": status} if status else None, booth_filter("member_requests", booth)]
+
+def volunteer_filters(status=None, booth=None, category=None):
+    return [
+        {"type": "Volunteer"},
+        {"status": status} if status else None,
+        {"role": {"$in": category_values(category)}} if category else None,
+        booth_filter("member_requests", booth)
+    ]
+
+def voter_filters(status=None, booth=None):
+    return [
+        {"status": status} if status else None,
+        {"partNumber": {"$in": booth_values(booth)}} if booth else None
+    ]
+
+# dataset -> (collection, filter builder, projection, row builder, exported columns)
+EXPORTS = {
+    "grievances": (grievances_col, grievance_filters, GRIEVANCE_FIELDS, lambda d: grievance_row(schema.record("grievances", d)),
+                   ["id", "name", "epic", "booth", "category", "status", "date", "description", "type", "photo_id"]),
+    "suggestions": (member_requests_col, suggestion_filters, SUGGESTION_FIELDS, lambda d: suggestion_row(schema.record("member_requests", d)),
+                    ["id", "name", "booth", "suggestion", "status", "date", "photo_id"]),
+    "volunteers": (member_requests_col, volunteer_filters, VOLUNTEER_FIELDS, lambda d: volunteer_row(schema.record("member_requests", d)),
+                   ["id", "name", "booth", "role", "status", "date", "photo_id"]),
+    "voters": (voters_collection, voter_filters, VOTER_FIELDS, voter_row, ["id", "name", "booth", "district", "status"]),
+}
+
+def event_row(name, doc):
+    r = schema.record(name, doc)
+    if name == "grievances":
+        return "grievances", grievance_row(r)
+    if r.type == "Suggestion":
+        return "suggestions", suggestion_row(r)
+    if r.type == "Volunteer":
+        return "volunteers", volunteer_row(r)
+    return None
+
+@asynccontextmanager
+async def lifespan(app):
+    await indexes.startup()
+    await schema.startup()
+    await ref_index.startup()
+    media_proxy.load()
+    await media_ingest.start()
+    await media_registry.start(IMG_URLS)
+    await sessions.start()
+    await outbox.start()
+    await inbox.start()
+    await counters.start()
+    await booth_pulse.start()
+    await booth_rollups.start()
+    await epic_cache.start()
+    events.set_serializer(event_row)
+    await events.start()
+    yield
+    await events.stop()
+    await epic_cache.stop()
+    await booth_rollups.stop()
+    await booth_pulse.stop()
+    await counters.stop()
+    await media_ingest.stop()
+    await media_registry.stop()
+    await inbox.stop()
+    await outbox.stop()
+    await sessions.stop()
+    await close_client()
+
+app = FastAPI(title="TVK WhatsApp Bot Backend", lifespan=lifespan)
+
+app.mount("/assets", AssetFiles(directory=ASSETS_DIR), name="assets")
 
 # CORS Configuration
 origins = os.getenv("ALLOWED_ORIGINS", "http://localhost:5173").split(",")
@@ -41,15 +202,33 @@ WHATSAPP_VERIFY_TOKEN = os.getenv("WHATSAPP_VERIFY_TOKEN", "tvk_verify_token_202
 def read_root():
     return {"status": "ok", "message": "Backend is running"}
 
+@app.get("/api/metrics")
+async def get_metrics():
+    return {
+        "outbox": await outbox.metrics(),
+        "inbox": inbox.metrics(),
+        "sessions": sessions.metrics(),
+        "counters": counters.metrics(),
+        "booth_pulse": booth_pulse.metrics(),
+        "booth_rollups": booth_rollups.metrics(),
+        "events": events.metrics(),
+        "epic_cache": epic_cache.metrics(),
+        "exports": exports.metrics(),
+        "activity": activity.metrics(),
+        "media": media_proxy.metrics(),
+        "media_ingest": media_ingest.metrics(),
+        "media_registry": media_registry.metrics(),
+        "ref_ids": ref_ids.metrics(),
+        "ref_index": ref_index.metrics()
+    }
+
 @app.get("/api/dashboard/stats")
 async def get_stats():
-    # Gather live data from DB!
-    total_voters = await voters_collection.count_documents({})
-    open_issues = await grievances_col.count_documents({"status": "Open"})
-    # Existing member requests might not have 'type', so we look for our new types + old MBR prefix
-    suggestions = await member_requests_col.count_documents({"$or": [{"type": "Suggestion"}, {"referenceId": {"$regex": "^MBR"}}]})
-    volunteers = await member_requests_col.count_documents({"type": "Volunteer"})
-    
+    # Maintained incrementally by the write paths, see counters.py
+    c = await counters.snapshot()
+    total_voters, open_issues = c["voters"], c["open_grievances"]
+    suggestions, volunteers = c["suggestions"], c["volunteers"]
+
     return {
         "stats": [
             {"id": 1, "title": "Total Voters Registered", "value": str(total_voters), "trend": "Database link active"},
@@ -59,136 +238,144 @@ async def get_stats():
         ]
     }
 
+@app.get("/api/dashboard/events")
+async def dashboard_events(request: Request):
+    # Server-Sent Events: record upserts/deletes and counter changes, see events.py.
+    # Browsers resume with the Last-Event-ID header after a reconnect.
+    return StreamingResponse(events.stream(request.headers.get("last-event-id")), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
 @app.get("/api/dashboard/grievances")
 async def get_grievances():
     cursor = grievances_col.find().sort("_id", -1).limit(10)
     items = await cursor.to_list(length=10)
     results = []
-    for i in items:
-        ref_id = i.get("ref_id") or i.get("ticketId") or "Unknown"
-        voter_name = i.get("voter_name") or i.get("voterName") or i.get("name") or "Anonymous"
-        cat_raw = i.get("category") or "Uncategorized"
+    for r in (schema.record("grievances", i) for i in items):
+        cat_raw = r.category or "Uncategorized"
         results.append({
-            "id": ref_id,
-            "name": voter_name,
-            "epic": i.get("epic") or "",
-            "booth": str(i.get("booth") or i.get("partNumber") or "Unknown"),
+            "key": str(r.id),
+            "id": r.ref_id or "Unknown",
+            "name": r.voter_name or "Anonymous",
+            "epic": r.epic or "",
+            "booth": r.booth or "Unknown",
             "category": CAT_MAP.get(cat_raw, cat_raw),
-            "status": i.get("status", "Open"),
-            "date": i.get("timestamp") or (i.get("createdAt").strftime("%d %b %Y") if i.get("createdAt") else "N/A"),
-            "description": i.get("description") or i.get("message") or "",
-            "type": i.get("type", "Grievance"),
-            "photo_id": i.get("photo_id")
+            "status": r.status or "Open",
+            "date": schema.format_date(r.created_at, "N/A"),
+            "description": r.description or "",
+            "type": r.type,
+            "photo_id": r.photo_id
         })
     return {"grievances": results}
 
 @app.get("/api/dashboard/all_grievances")
-async def get_all_grievances():
-    cursor = grievances_col.find().sort("_id", -1).limit(100)
-    items = await cursor.to_list(length=100)
-    results = []
-    for i in items:
-        ref_id = i.get("ref_id") or i.get("ticketId") or ""
-        voter_name = i.get("voter_name") or i.get("voterName") or i.get("name") or ""
-        cat_raw = i.get("category") or i.get("area", "General")
-        results.append({
-            "id": ref_id,
-            "name": voter_name,
-            "epic": i.get("epic") or "",
-            "booth": str(i.get("booth") or i.get("partNumber") or ""),
-            "category": CAT_MAP.get(cat_raw, cat_raw),
-            "status": i.get("status", "Open"),
-            "date": i.get("timestamp") or (i.get("createdAt").strftime("%d %b %Y") if i.get("createdAt") else ""),
-            "description": i.get("description") or i.get("message") or "",
-            "type": i.get("type", "Grievance"),
-            "photo_id": i.get("photo_id")
-        })
-    return {"grievances": results}
+async def get_all_grievances(cursor: str = None, limit: int = None, status: str = None, booth: str = None,
+                             category: str = None, type: str = None, date_from: str = None, date_to: str = None):
+    filters = grievance_filters(status, booth, category, type)
+    items, next_cursor = await fetch_page(grievances_col, filters, GRIEVANCE_FIELDS, limit, cursor, date_from, date_to)
+    results = [grievance_row(schema.record("grievances", i)) for i in items]
+    return {"grievances": results, "next_cursor": next_cursor}
 
 @app.get("/api/dashboard/suggestions")
-async def get_suggestions():
-    cursor = member_requests_col.find({"$or": [{"type": "Suggestion"}, {"referenceId": {"$regex": "^MBR"}}]}).sort("_id", -1).limit(100)
-    items = await cursor.to_list(length=100)
-    results = []
-    for i in items:
-        ref_id = i.get("ref_id") or i.get("referenceId") or ""
-        voter_name = i.get("voter_name") or i.get("name") or ""
-        results.append({
-            "id": ref_id,
-            "name": voter_name,
-            "booth": str(i.get("booth") or i.get("partNumber") or ""),
-            "suggestion": i.get("suggestion") or i.get("area") or "Member Request",
-            "status": i.get("status", "Pending"),
-            "date": i.get("timestamp") or (i.get("createdAt").strftime("%d %b %Y") if i.get("createdAt") else ""),
-            "photo_id": i.get("photo_id")
-        })
-    return {"suggestions": results}
+async def get_suggestions(cursor: str = None, limit: int = None, status: str = None, booth: str = None,
+                          date_from: str = None, date_to: str = None):
+    filters = suggestion_filters(status, booth)
+    items, next_cursor = await fetch_page(member_requests_col, filters, SUGGESTION_FIELDS, limit, cursor, date_from, date_to)
+    results = [suggestion_row(schema.record("member_requests", i)) for i in items]
+    return {"suggestions": results, "next_cursor": next_cursor}
 
 @app.get("/api/dashboard/volunteers")
-async def get_volunteers():
-    cursor = member_requests_col.find({"type": "Volunteer"}).sort("_id", -1).limit(100)
-    items = await cursor.to_list(length=100)
-    results = []
-    for i in items:
-        role_raw = i.get("role", "")
-        results.append({
-            "id": i.get("ref_id", ""),
-            "name": i.get("voter_name", i.get("name", "")),
-            "booth": str(i.get("booth", i.get("partNumber", ""))),
-            "role": CAT_MAP.get(role_raw, role_raw),
-            "status": i.get("status", "Registered"),
-            "date": i.get("timestamp", i.get("createdAt").strftime("%d %b %Y") if i.get("createdAt") else ""),
-            "photo_id": i.get("photo_id")
-        })
-    return {"volunteers": results}
+async def get_volunteers(cursor: str = None, limit: int = None, status: str = None, booth: str = None,
+                         category: str = None, date_from: str = None, date_to: str = None):
+    filters = volunteer_filters(status, booth, category)
+    items, next_cursor = await fetch_page(member_requests_col, filters, VOLUNTEER_FIELDS, limit, cursor, date_from, date_to)
+    results = [volunteer_row(schema.record("member_requests", i)) for i in items]
+    return {"volunteers": results, "next_cursor": next_cursor}
 
 @app.get("/api/dashboard/booth_analytics")
 async def get_booth_analytics():
-    pipeline = [
-        {"$project": {"booth_id": {"$ifNull": ["$booth", "$partNumber"]}}},
-        {"$group": {"_id": "$booth_id", "count": {"$sum": 1}}},
-        {"$sort": {"count": -1}},
-        {"$limit": 15}
-    ]
-    cursor = grievances_col.aggregate(pipeline)
-    items = await cursor.to_list(length=15)
-    results = [{"booth": str(i["_id"]), "issues": i["count"]} for i in items if i["_id"]]
-    return {"analytics": results}
+    # Read from the per-booth rollups, see booth_rollups.py
+    booths = await booth_rollups.top_booths(15)
+    return {"analytics": [{"booth": b["booth"], "issues": b["issues"]} for b in booths]}
+
+@app.get("/api/dashboard/analytics")
+async def get_analytics(days: int = 30, booth: str = None, limit: int = 15):
+    # Top booths and category mix over the last `days` days (0: all time) and, per day raised,
+    # how many grievances are still open vs resolved. Reads only the rollups.
+    if days < 0 or limit < 1:
+        raise HTTPException(status_code=400, detail="days must be >= 0 and limit >= 1")
+    since = booth_rollups.since_days(days)
+    booths, categories, trend = await asyncio.gather(
+        booth_rollups.top_booths(min(limit, 100), since),
+        booth_rollups.category_mix(since, booth),
+        booth_rollups.status_trend(since or booth_rollups.since_days(90), booth)
+    )
+    for c in categories:
+        c["label"] = CAT_MAP.get(c["category"], c["category"])
+    return {"days": days, "booth": booth, "top_booths": booths, "category_mix": categories, "trend": trend}
+
+TREND_PERIODS = {"day": 30, "week": 12, "month": 12}
+
+@app.get("/api/dashboard/trends")
+async def get_trends(interval: str = "day", periods: int = None, booth: str = None, category: str = None,
+                     group_by: str = None, limit: int = 10):
+    # Grievances raised per day / week / month, in total or per booth or category. Read from
+    # the bucketed rollups (booth_rollups.py), so the cost does not grow with the grievances.
+    if interval not in TREND_PERIODS:
+        raise HTTPException(status_code=400, detail="interval must be day, week or month")
+    if group_by not in (None, "booth", "category"):
+        raise HTTPException(status_code=400, detail="group_by must be booth or category")
+    periods = periods or TREND_PERIODS[interval]
+    if not 1 <= periods <= 366 or limit < 1:
+        raise HTTPException(status_code=400, detail="periods must be 1-366 and limit >= 1")
+    buckets, series = await booth_rollups.trend(interval, periods, booth, category_values(category) if category else None, group_by)
+    ranked = sorted(series.items(), key=lambda s: (-sum(s[1]), s[0]))[:limit]
+    return {
+        "interval": interval,
+        "buckets": buckets,
+        "series": [{
+            "key": name,
+            "label": CAT_MAP.get(name, name) if group_by == "category" else name,
+            "counts": counts,
+            "total": sum(counts)
+        } for name, counts in ranked]
+    }
 
 @app.get("/api/dashboard/voters")
-async def get_voters():
-    cursor = voters_collection.find().sort("_id", -1).limit(200)
-    items = await cursor.to_list(length=200)
-    results = []
-    for i in items:
-        results.append({
-            "id": i.get("voterId") or "N/A",
-            "name": i.get("name") or "Anonymous",
-            "booth": str(i.get("partNumber") or "N/A"),
-            "district": i.get("district") or "N/A",
-            "status": i.get("status") or "Active"
-        })
-    return {"voters": results}
+async def get_voters(cursor: str = None, limit: int = None, status: str = None, booth: str = None,
+                     date_from: str = None, date_to: str = None):
+    items, next_cursor = await fetch_page(voters_collection, voter_filters(status, booth), VOTER_FIELDS, limit, cursor, date_from, date_to)
+    results = [voter_row(i) for i in items]
+    return {"voters": results, "next_cursor": next_cursor}
+
+@app.get("/api/dashboard/export/{dataset}")
+async def export_dataset(dataset: str, format: str = "csv", status: str = None, booth: str = None, category: str = None,
+                         type: str = None, date_from: str = None, date_to: str = None):
+    # Every matching row, streamed (see exports.py); same filters and row fields as the lists
+    if dataset not in EXPORTS:
+        raise HTTPException(status_code=404, detail="Unknown dataset")
+    if format not in exports.FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown format, expected one of {', '.join(exports.FORMATS)}")
+    if not exports.available(format):
+        raise HTTPException(status_code=501, detail="Parquet export is not available on this server (pyarrow is not installed)")
+    col, build_filters, projection, to_row, columns = EXPORTS[dataset]
+    given = {k: v for k, v in {"status": status, "booth": booth, "category": category, "type": type}.items() if v}
+    unsupported = [k for k in given if k not in inspect.signature(build_filters).parameters]
+    if unsupported:
+        raise HTTPException(status_code=400, detail=f"{dataset} cannot be filtered by {', '.join(unsupported)}")
+    query = list_query(build_filters(**given), None, date_from, date_to)
+    cursor = col.find(query, projection).sort(sort_keys(date_from, date_to))
+    media_type, ext = exports.FORMATS[format]
+    part = "".join(c for c in booth if c.isalnum()) if booth else ""
+    filename = f"{dataset}{'-' + part if part else ''}-{datetime.date.today():%Y%m%d}.{ext}"
+    return StreamingResponse(exports.stream(cursor, to_row, columns, format), media_type=media_type,
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
 
 @app.get("/api/dashboard/image/{photo_id}")
-async def get_whatsapp_image(photo_id: str):
-    try:
-        if not TOKEN:
-            raise HTTPException(status_code=500, detail="Missing WhatsApp token")
-        headers = {"Authorization": f"Bearer {TOKEN}"}
-        res = requests.get(f"https://graph.facebook.com/v17.0/{photo_id}", headers=headers)
-        res_data = res.json()
-        if "url" not in res_data:
-            raise HTTPException(status_code=404, detail="Image not found on WhatsApp API")
-            
-        img_url = res_data["url"]
-        img_res = requests.get(img_url, headers=headers)
-        if img_res.status_code != 200:
-            raise HTTPException(status_code=500, detail="Failed to download image from WhatsApp")
-            
-        return Response(content=img_res.content, media_type=img_res.headers.get("content-type", "image/jpeg"))
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+async def get_whatsapp_image(photo_id: str, request: Request, size: str = None, w: int = None, fmt: str = None):
+    # Cached on disk, shared between concurrent requests, ETag/Range aware (see media_proxy.py).
+    # ?size=thumb serves the small JPEG made at ingestion time; ?w=200&fmt=webp a resized variant
+    # (width snapped to media_variants.VARIANT_WIDTHS). Both fall back to the original.
+    return await media_proxy.serve(request, photo_id, media_proxy.requested_kind(size, w, fmt))
 
 @app.post("/api/dashboard/update_status")
 async def update_status(request: Request):
@@ -197,42 +384,49 @@ async def update_status(request: Request):
     new_status = data.get("status")
     
     # Find the record first to get the phone number
-    record = await grievances_col.find_one({"$or": [{"ref_id": ref_id}, {"ticketId": ref_id}]})
-    col = grievances_col
-    
-    if not record:
-        record = await member_requests_col.find_one({"$or": [{"ref_id": ref_id}, {"referenceId": ref_id}]})
-        col = member_requests_col
-        
+    col, record = await ref_index.find(ref_id)
+
     if record:
         # Update in DB
         await col.update_one(
             {"_id": record["_id"]},
-            {"$set": {"status": new_status, "updatedAt": datetime.datetime.now()}}
+            {"$set": {"status": new_status, "updatedAt": datetime.datetime.now(datetime.timezone.utc)}}
         )
-        
+        await counters.changed(col, record, {**record, "status": new_status})
+        phone = schema.record(schema.name_of(col), record).voter_phone
+        activity.invalidate(phone)
+
         # Send WhatsApp Notification
-        phone = record.get("voter_phone") or record.get("phoneNumber")
         if phone:
             msg = f"🔔 *Constituency Update*\n\nYour reported issue/suggestion (ID: {ref_id}) status has been changed to: *{new_status}*.\n\nThank you for your engagement.\n_TVK Kavundampalayam Team_"
-            send_image_message(phone, IMG_URLS.get("constituency_update", f"{IMG_URLS['welcome_banner'].replace('welcome_banner.jpg', 'constituency_update.png')}"), msg)
+            await send_image_message(phone, IMG_URLS.get("constituency_update", f"{IMG_URLS['welcome_banner'].replace('welcome_banner.jpg', 'constituency_update.png')}"), msg)
         
     return {"status": "success"}
 
 @app.delete("/api/dashboard/delete/{item_type}/{item_id}")
 async def delete_record(item_type: str, item_id: str):
     if item_type == "voter":
-        result = await voters_collection.delete_one({"voterId": item_id})
-    elif item_type == "grievance":
-        result = await grievances_col.delete_one({"$or": [{"ref_id": item_id}, {"ticketId": item_id}]})
-    elif item_type == "suggestion" or item_type == "volunteer":
-        result = await member_requests_col.delete_one({"$or": [{"ref_id": item_id}, {"referenceId": item_id}]})
+        col, query = voters_collection, {"voterId": item_id}
+    elif item_type in ("grievance", "suggestion", "volunteer"):
+        col, record = await ref_index.find(item_id)
+        expected = grievances_col if item_type == "grievance" else member_requests_col
+        if record is None or col is not expected:
+            raise HTTPException(status_code=404, detail="Record not found")
+        query = {"_id": record["_id"]}
     else:
         raise HTTPException(status_code=400, detail="Unknown item type")
 
-    if result.deleted_count == 0:
+    # find_one_and_delete hands back the removed record so the counters know what to decrement
+    deleted = await col.find_one_and_delete(query)
+    if deleted is None:
         raise HTTPException(status_code=404, detail="Record not found")
-        
+    await counters.changed(col, deleted, None)
+    if item_type == "voter":
+        epic_cache.invalidate(item_id)
+    else:
+        await ref_index.remove(item_id)
+        activity.invalidate(schema.record(schema.name_of(col), deleted).voter_phone)
+
     return {"status": "success", "message": "Record deleted"}
 
 @app.get("/webhook")
@@ -253,36 +447,8 @@ async def handle_webhook(request: Request):
     data = await request.json()
 
     if data.get("object") == "whatsapp_business_account":
-        for entry in data.get("entry", []):
-            for change in entry.get("changes", []):
-                value = change.get("value", {})
-                if "messages" in value:
-                    for message in value["messages"]:
-                        phone_number = message.get("from")
-                        msg_type = message.get("type")
-                        
-                        text = None
-                        lat = None
-                        lon = None
-                        image_id = None
-                        
-                        if msg_type == "text":
-                            text = message["text"]["body"]
-                        elif msg_type == "interactive":
-                            interactive = message["interactive"]
-                            itype = interactive.get("type")
-                            if itype == "button_reply":
-                                text = interactive["button_reply"]["id"]
-                            elif itype == "list_reply":
-                                text = interactive["list_reply"]["id"]
-                        elif msg_type == "location":
-                            lat = message["location"]["latitude"]
-                            lon = message["location"]["longitude"]
-                        elif msg_type == "image":
-                            image_id = message["image"]["id"]
-                            text = message["image"].get("caption", "IMAGE")
-                        
-                        await handle_incoming_message(phone_number, text, lat, lon, image_id)
+        # Persist and acknowledge right away; messages are processed by the inbox consumer
+        await inbox.ingest(data)
         return JSONResponse(content={"status": "ok"})
     return JSONResponse(status_code=404, content={"status": "not_found"})
 
@@ -0,0 +1,176 @@
+import os
+import time
+import asyncio
+import anyio
+from pymongo.errors import DuplicateKeyError
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+from db import member_db, media_col
+from dispatcher import KeyedDispatcher
+import media_proxy
+import media_variants
+
+# Eager media ingestion. When a voter sends photo evidence the bot hands the media id to
+# submit(); a background worker downloads it while the WhatsApp URL is still valid, keeps
+# the original in GridFS and adds a small JPEG thumbnail for the dashboard lists. The
+# media_proxy then serves both from here instead of going back to Meta.
+
+MEDIA_INGEST_WORKERS = int(os.getenv("MEDIA_INGEST_WORKERS", "4"))
+MEDIA_INGEST_MAX_ATTEMPTS = int(os.getenv("MEDIA_INGEST_MAX_ATTEMPTS", "5"))
+# First retry delay after a transient failure, doubled on each further attempt; media a
+# crashed worker left behind is picked up again after the same delay
+MEDIA_INGEST_RETRY_AFTER = float(os.getenv("MEDIA_INGEST_RETRY_AFTER", "120"))
+MEDIA_THUMB_SIZE = int(os.getenv("MEDIA_THUMB_SIZE", "320"))
+MEDIA_THUMB_QUALITY = int(os.getenv("MEDIA_THUMB_QUALITY", "70"))
+MEDIA_GRIDFS_BUCKET = os.getenv("MEDIA_GRIDFS_BUCKET", "media_blobs")
+# Variants the dashboard grids request, rendered into the proxy cache right after ingestion
+MEDIA_PRECOMPUTE_VARIANTS = [k for k in os.getenv("MEDIA_PRECOMPUTE_VARIANTS", "w100.webp,w200.webp").split(",") if k]
+
+class MongoMediaStore:
+    def __init__(self, col, bucket):
+        self.col = col
+        self.bucket = bucket
+
+    async def claim(self, photo_id):
+        try:
+            now = time.time()
+            await self.col.insert_one({"_id": photo_id, "status": "pending", "attempts": 0, "updated_at": now,
+                                       "retry_at": now + MEDIA_INGEST_RETRY_AFTER})
+            return True
+        except DuplicateKeyError:
+            return False
+
+    async def get(self, photo_id):
+        return await self.col.find_one({"_id": photo_id})
+
+    async def put(self, photo_id, kind, data, content_type):
+        return await self.bucket.upload_from_stream(f"{photo_id}/{kind}", data, metadata={"photo_id": photo_id, "kind": kind, "content_type": content_type})
+
+    async def read(self, file_id):
+        stream = await self.bucket.open_download_stream(file_id)
+        return await stream.read()
+
+    async def update(self, photo_id, fields):
+        await self.col.update_one({"_id": photo_id}, {"$set": {**fields, "updated_at": time.time()}})
+
+    async def due(self, now, skip_ids):
+        cursor = self.col.find({"status": "pending", "retry_at": {"$not": {"$gt": now}}, "_id": {"$nin": list(skip_ids)}})
+        return [d["_id"] for d in await cursor.to_list(length=500)]
+
+_store = None
+_dispatcher = None
+_recovery_task = None
+_queued = set()
+_stats = {"submitted": 0, "stored": 0, "failed": 0, "retried": 0, "bytes": 0, "thumb_bytes": 0}
+
+async def submit(photo_id):
+    # Called from the bot when a photo arrives; cheap, the download happens in the background
+    if not photo_id or _store is None:
+        return
+    try:
+        if await _store.claim(photo_id):
+            _stats["submitted"] += 1
+            _schedule(photo_id)
+    except Exception as e:
+        # The photo_id is still on the record; the proxy falls back to fetching it on demand
+        print(f"Media ingest could not queue {photo_id}: {e!r}")
+
+def _schedule(photo_id):
+    _queued.add(photo_id)
+
+    async def job():
+        try:
+            await _ingest(photo_id)
+        finally:
+            _queued.discard(photo_id)
+
+    _dispatcher.submit(photo_id, job)
+
+async def _ingest(photo_id):
+    doc = await _store.get(photo_id)
+    if not doc or doc["status"] != "pending":
+        return
+    attempts = doc.get("attempts", 0) + 1
+    # Not picked up again while this attempt runs, unless the worker dies
+    await _store.update(photo_id, {"retry_at": time.time() + MEDIA_INGEST_RETRY_AFTER})
+    try:
+        # Goes through the proxy so the download also warms its disk cache
+        record = await media_proxy.get(photo_id)
+        async with await anyio.open_file(media_proxy.path(record), "rb") as f:
+            data = await f.read()
+        try:
+            thumb = await media_variants.render_async(data, MEDIA_THUMB_SIZE, "jpeg", MEDIA_THUMB_QUALITY)
+        except Exception as e:
+            thumb = None  # not an image Pillow understands; keep the original only
+            print(f"Media ingest could not thumbnail {photo_id}: {e!r}")
+
+        fields = {"status": "stored", "attempts": attempts, "content_type": record["content_type"], "size": len(data),
+                  "sha256": record["sha256"], "original": await _store.put(photo_id, "original", data, record["content_type"])}
+        if thumb:
+            fields["thumb"] = await _store.put(photo_id, "thumb", thumb, "image/jpeg")
+            fields["thumb_size"] = len(thumb)
+            _stats["thumb_bytes"] += len(thumb)
+        await _store.update(photo_id, fields)
+        _stats["stored"] += 1
+        _stats["bytes"] += len(data)
+        if thumb:
+            for kind in MEDIA_PRECOMPUTE_VARIANTS:
+                try:
+                    await media_proxy.get(photo_id, kind)
+                except Exception as e:
+                    print(f"Media ingest could not precompute {kind} for {photo_id}: {e!r}")
+    except media_proxy.MediaNotFound:
+        # WhatsApp says the media does not exist; retrying cannot bring it back
+        await _store.update(photo_id, {"status": "failed", "attempts": attempts, "last_error": "media not found"})
+        _stats["failed"] += 1
+    except Exception as e:
+        # Transient (MediaUnavailable, network, GridFS): retried with backoff
+        error = repr(e)[:500]
+        if attempts >= MEDIA_INGEST_MAX_ATTEMPTS:
+            print(f"Media ingest giving up on {photo_id}: {error}")
+            await _store.update(photo_id, {"status": "failed", "attempts": attempts, "last_error": error})
+            _stats["failed"] += 1
+        else:
+            # Left pending; the recovery loop queues it again once retry_at has passed
+            delay = MEDIA_INGEST_RETRY_AFTER * 2 ** (attempts - 1)
+            await _store.update(photo_id, {"attempts": attempts, "last_error": error, "retry_at": time.time() + delay})
+            _stats["retried"] += 1
+
+async def load(photo_id, kind):
+    # Origin for media_proxy: (bytes, content_type) of a stored kind, or None
+    doc = await _store.get(photo_id)
+    if not doc or doc.get("status") != "stored" or not doc.get(kind):
+        return None
+    content_type = "image/jpeg" if kind == "thumb" else doc.get("content_type", "image/jpeg")
+    return await _store.read(doc[kind]), content_type
+
+async def _recover_loop():
+    while True:
+        await asyncio.sleep(MEDIA_INGEST_RETRY_AFTER / 2)
+        try:
+            for photo_id in await _store.due(time.time(), set(_queued)):
+                _schedule(photo_id)
+        except Exception as e:
+            print(f"Media ingest recovery failed: {e!r}")
+
+async def start(store=None):
+    global _store, _dispatcher, _recovery_task
+    _store = store or MongoMediaStore(media_col, AsyncIOMotorGridFSBucket(member_db, bucket_name=MEDIA_GRIDFS_BUCKET))
+    _dispatcher = KeyedDispatcher("media", MEDIA_INGEST_WORKERS)
+    _dispatcher.start()
+    _recovery_task = asyncio.create_task(_recover_loop())
+    media_proxy.set_origin(load)
+
+async def drain():
+    await _dispatcher.drain()
+
+async def stop(timeout=5):
+    global _recovery_task
+    media_proxy.set_origin(None)
+    await _dispatcher.stop(timeout)
+    if _recovery_task:
+        _recovery_task.cancel()
+        await asyncio.gather(_recovery_task, return_exceptions=True)
+    _recovery_task = None
+
+def metrics():
+    return {**_stats, "queued": len(_queued), "dispatcher": _dispatcher.metrics() if _dispatcher else {}}
@@ -0,0 +1,308 @@
+import os
+import re
+import json
+import time
+import uuid
+import asyncio
+import hashlib
+from collections import OrderedDict
+import anyio
+from fastapi import HTTPException
+from fastapi.responses import Response, StreamingResponse
+import whatsapp
+import media_variants
+
+# Dashboard media proxy. WhatsApp photos are fetched from the Graph API at most once and kept
+# in a content-addressed disk cache (blobs/<sha256>), with a small per-photo_id record
+# pointing at the blob. The cache is bounded by total size and evicts least recently used
+# blobs. Concurrent requests for a photo that is not cached yet share one upstream download.
+# Media ids never change content, so responses are immutable with a strong ETag, and Range
+# requests are served from the cached file.
+#
+# Besides the original, a photo can have derived kinds: "thumb", made at ingestion and served
+# by the origin hook media_ingest sets (which also covers originals whose WhatsApp URL has
+# expired), and resized variants like "w200.webp", rendered from the original on first use.
+
+MEDIA_CACHE_DIR = os.getenv("MEDIA_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "media_cache"))
+MEDIA_CACHE_MAX_BYTES = int(os.getenv("MEDIA_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+MEDIA_CACHE_CONTROL = os.getenv("MEDIA_CACHE_CONTROL", "private, max-age=604800, immutable")
+CHUNK_SIZE = 64 * 1024
+
+class MediaNotFound(Exception):
+    pass
+
+class MediaUnavailable(Exception):
+    # WhatsApp could not be asked right now (token, rate limit, 5xx); worth retrying later
+    pass
+
+# Graph error codes that come back as HTTP 400 without saying anything about the media
+# (expired token, rate limits)
+TRANSIENT_GRAPH_CODES = {1, 2, 4, 17, 32, 190, 613, 80007, 130429}
+
+_blobs = OrderedDict()  # sha256 -> size, least recently used first
+_records = {}  # photo_id -> cache record, mirrors ids/*.json
+_total = 0
+_inflight = {}  # cache key -> Task downloading it
+_origin = None  # async (photo_id, kind) -> (bytes, content_type) or None
+_stats = {"hits": 0, "misses": 0, "fetches": 0, "collapsed": 0, "upstream": 0, "origin": 0, "evictions": 0, "errors": 0, "unavailable": 0}
+
+def _blob_path(sha):
+    return os.path.join(MEDIA_CACHE_DIR, "blobs", sha[:2], sha)
+
+def _record_path(key):
+    # photo ids come from the URL; hash them instead of trusting them as file names
+    return os.path.join(MEDIA_CACHE_DIR, "ids", hashlib.sha1(key.encode()).hexdigest() + ".json")
+
+def _key(photo_id, kind):
+    return photo_id if kind == "original" else f"{photo_id}@{kind}"
+
+def path(record):
+    return _blob_path(record["sha256"])
+
+def set_origin(fn):
+    global _origin
+    _origin = fn
+
+def load():
+    # Rebuild the LRU from what is on disk, oldest access first
+    global _total
+    _blobs.clear()
+    _total = 0
+    os.makedirs(os.path.join(MEDIA_CACHE_DIR, "ids"), exist_ok=True)
+    os.makedirs(os.path.join(MEDIA_CACHE_DIR, "blobs"), exist_ok=True)
+    found = []
+    for root, _, files in os.walk(os.path.join(MEDIA_CACHE_DIR, "blobs")):
+        for name in files:
+            st = os.stat(os.path.join(root, name))
+            found.append((st.st_mtime, name, st.st_size))
+    for _, sha, size in sorted(found):
+        _blobs[sha] = size
+        _total += size
+    _evict()
+
+def _touch(sha):
+    _blobs.move_to_end(sha)
+    try:
+        os.utime(_blob_path(sha))  # keeps LRU order across restarts
+    except OSError:
+        pass
+
+def _evict():
+    global _total
+    while _total > MEDIA_CACHE_MAX_BYTES and len(_blobs) > 1:
+        sha, size = _blobs.popitem(last=False)
+        _total -= size
+        _stats["evictions"] += 1
+        try:
+            os.remove(_blob_path(sha))
+        except OSError:
+            pass
+
+def _lookup(key):
+    record = _records.get(key)
+    if record is None:
+        try:
+            with open(_record_path(key)) as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            return None
+        _records[key] = record
+    if record["sha256"] not in _blobs:
+        _records.pop(key, None)  # blob was evicted
+        return None
+    return record
+
+async def _save(key, chunks, content_type):
+    # Writes an async iterable of bytes into the content-addressed store and records it under key
+    global _total
+    tmp = os.path.join(MEDIA_CACHE_DIR, f"tmp-{uuid.uuid4().hex}")
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        async with await anyio.open_file(tmp, "wb") as f:
+            async for chunk in chunks:
+                digest.update(chunk)
+                size += len(chunk)
+                await f.write(chunk)
+        sha = digest.hexdigest()
+        blob = _blob_path(sha)
+        os.makedirs(os.path.dirname(blob), exist_ok=True)
+        os.replace(tmp, blob)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+    if sha not in _blobs:
+        _blobs[sha] = size
+        _total += size
+    _touch(sha)
+    record = {"sha256": sha, "size": size, "content_type": content_type, "fetched_at": time.time()}
+    with open(_record_path(key), "w") as f:
+        json.dump(record, f)
+    _records[key] = record
+    _evict()
+    return record
+
+async def _once(data):
+    yield data
+
+def _json(res):
+    try:
+        body = res.json()
+    except ValueError:
+        return {}
+    return body if isinstance(body, dict) else {}
+
+async def _download(photo_id, kind):
+    if _origin is not None:
+        stored = await _origin(photo_id, kind)
+        if stored:
+            _stats["origin"] += 1
+            return await _save(_key(photo_id, kind), _once(stored[0]), stored[1])
+    variant = media_variants.parse(kind)
+    if variant:
+        original = await get(photo_id)
+        async with await anyio.open_file(_blob_path(original["sha256"]), "rb") as f:
+            data = await f.read()
+        try:
+            rendered = await media_variants.render_async(data, *variant)
+        except (OSError, ValueError) as e:
+            # Not an image Pillow can read (UnidentifiedImageError is an OSError)
+            raise MediaNotFound(f"{photo_id} cannot be rendered as {kind}: {e!r}")
+        return await _save(_key(photo_id, kind), _once(rendered), media_variants.content_type(variant[1]))
+    if kind != "original":
+        raise MediaNotFound(f"{photo_id} has no {kind}")
+
+    _stats["upstream"] += 1
+    client = whatsapp.get_client()
+    headers = {"Authorization": f"Bearer {whatsapp.TOKEN}"}
+    res = await client.get(f"{whatsapp.GRAPH_API_BASE}/{photo_id}", headers=headers)
+    info = _json(res)
+    if res.status_code != 200 or "url" not in info:
+        code = (info.get("error") or {}).get("code")
+        if code == 100 or (res.status_code in (400, 404) and code not in TRANSIENT_GRAPH_CODES):
+            raise MediaNotFound(photo_id)
+        raise MediaUnavailable(f"Graph API answered {res.status_code} (code {code}) for {photo_id}")
+    async with client.stream("GET", info["url"], headers=headers) as body:
+        if body.status_code != 200:
+            raise MediaUnavailable(f"Media download failed with {body.status_code}")
+        content_type = body.headers.get("content-type") or info.get("mime_type") or "image/jpeg"
+        return await _save(photo_id, body.aiter_bytes(CHUNK_SIZE), content_type)
+
+async def get(photo_id, kind="original"):
+    # Returns the cache record for photo_id/kind, fetching it once if needed
+    key = _key(photo_id, kind)
+    record = _lookup(key)
+    if record:
+        _stats["hits"] += 1
+        _touch(record["sha256"])
+        return record
+    _stats["misses"] += 1
+    task = _inflight.get(key)
+    if task is None:
+        _stats["fetches"] += 1
+        task = asyncio.create_task(_download(photo_id, kind))
+        _inflight[key] = task
+        task.add_done_callback(lambda t: _inflight.pop(key, None))
+    else:
+        _stats["collapsed"] += 1
+    # shield: a client disconnecting must not cancel the download the others are waiting on
+    return await asyncio.shield(task)
+
+def _parse_range(header, size):
+    # Single byte range only; anything else is answered with the full body, as HTTP allows
+    m = re.fullmatch(r"bytes=(\d*)-(\d*)", header.strip())
+    if not m or not (m.group(1) or m.group(2)):
+        return None
+    if not m.group(1):
+        start, end = max(0, size - int(m.group(2))), size - 1
+    else:
+        start = int(m.group(1))
+        end = min(int(m.group(2)), size - 1) if m.group(2) else size - 1
+    if start >= size or start > end:
+        raise HTTPException(status_code=416, headers={"Content-Range": f"bytes */{size}"})
+    return start, end
+
+async def _stream(f, start, length):
+    try:
+        await f.seek(start)
+        while length > 0:
+            chunk = await f.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        await f.aclose()
+
+async def _open(photo_id, kind):
+    # Opened before responding, so a later eviction cannot pull the file out from under the
+    # stream; if it was evicted between lookup and open, fetch it again
+    for _ in range(2):
+        record = await get(photo_id, kind)
+        try:
+            return record, await anyio.open_file(_blob_path(record["sha256"]), "rb")
+        except FileNotFoundError:
+            global _total
+            _total -= _blobs.pop(record["sha256"], 0)
+            _records.pop(_key(photo_id, kind), None)
+    raise RuntimeError("cached media disappeared twice")
+
+async def serve(request, photo_id, kind="original"):
+    try:
+        try:
+            record, f = await _open(photo_id, kind)
+        except MediaNotFound:
+            if kind == "original":
+                raise
+            # Derived kind not produced (yet): the original will do
+            record, f = await _open(photo_id, "original")
+    except MediaNotFound:
+        raise HTTPException(status_code=404, detail="Image not found on WhatsApp API")
+    except MediaUnavailable as e:
+        # Nothing is cached, so the next request asks WhatsApp again
+        _stats["unavailable"] += 1
+        print(f"Media proxy could not reach WhatsApp for {photo_id}: {e}")
+        raise HTTPException(status_code=502, detail="WhatsApp media is temporarily unavailable")
+    except Exception as e:
+        _stats["errors"] += 1
+        print(f"Media proxy failed for {photo_id}: {e!r}")
+        raise HTTPException(status_code=502, detail="Failed to download image from WhatsApp")
+
+    etag = f'"{record["sha256"]}"'
+    headers = {"ETag": etag, "Cache-Control": MEDIA_CACHE_CONTROL, "Accept-Ranges": "bytes"}
+    if etag in request.headers.get("if-none-match", ""):
+        await f.aclose()
+        return Response(status_code=304, headers=headers)
+
+    size = record["size"]
+    status, start, end = 200, 0, size - 1
+    byte_range = request.headers.get("range")
+    if byte_range and request.headers.get("if-range", etag) == etag:
+        try:
+            parsed = _parse_range(byte_range, size)
+        except HTTPException:
+            await f.aclose()
+            raise
+        if parsed:
+            status, (start, end) = 206, parsed
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(_stream(f, start, end - start + 1), status_code=status, headers=headers, media_type=record["content_type"])
+
+def requested_kind(size=None, w=None, fmt=None):
+    # Query parameters -> cache kind: ?size=thumb, ?w=&fmt= (width snapped), or the original
+    if size == "thumb":
+        return "thumb"
+    if w is None and fmt is None:
+        return "original"
+    if fmt is not None and fmt not in media_variants.FORMATS:
+        raise HTTPException(status_code=400, detail=f"fmt must be one of {', '.join(media_variants.FORMATS)}")
+    if w is not None and w <= 0:
+        raise HTTPException(status_code=400, detail="w must be positive")
+    width = media_variants.snap(w) if w else media_variants.VARIANT_WIDTHS[-1]
+    return media_variants.kind(width, fmt or "jpeg")
+
+def metrics():
+    return {**_stats, "blobs": len(_blobs), "bytes": _total, "max_bytes": MEDIA_CACHE_MAX_BYTES, "inflight": len(_inflight),
+            "variants": media_variants.metrics()}
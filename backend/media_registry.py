@@ -0,0 +1,188 @@
+import os
+import time
+import asyncio
+import hashlib
+import mimetypes
+import anyio
+from pymongo.errors import DuplicateKeyError
+import whatsapp
+from db import media_uploads_col
+from static_assets import local_path
+
+# Pre-uploaded banners. Each bot banner is uploaded once to the WhatsApp media endpoint and
+# sends reference the returned media id instead of a link, so Meta does not download the
+# banner from us for every message. Uploaded media lives for MEDIA_ID_TTL_DAYS; the refresh
+# loop uploads again well before that, and when a banner changes (new content hash). Until
+# a banner has a valid id, sends keep using its link.
+#
+# Ids are shared through the media_uploads collection: every refresh reads it first and
+# reuses what another instance (or an earlier run) uploaded while it is still valid. A banner
+# that is due is claimed there before uploading, so one instance uploads it and the rest
+# pick the id up on their next pass.
+
+MEDIA_REGISTRY_ENABLED = os.getenv("MEDIA_REGISTRY_ENABLED", "1") == "1"
+MEDIA_ID_TTL = float(os.getenv("MEDIA_ID_TTL_DAYS", "30")) * 86400
+# Refresh this long before expiry; ids closer to expiry than MEDIA_ID_MIN_REMAINING are not used
+MEDIA_ID_REFRESH_MARGIN = float(os.getenv("MEDIA_ID_REFRESH_MARGIN_DAYS", "5")) * 86400
+MEDIA_ID_MIN_REMAINING = float(os.getenv("MEDIA_ID_MIN_REMAINING_HOURS", "12")) * 3600
+MEDIA_REGISTRY_CHECK_INTERVAL = float(os.getenv("MEDIA_REGISTRY_CHECK_INTERVAL", "3600"))
+MEDIA_UPLOAD_CONCURRENCY = int(os.getenv("MEDIA_UPLOAD_CONCURRENCY", "4"))
+# How long an upload claim holds, and how soon instances that lost a claim look again
+MEDIA_UPLOAD_CLAIM = 60
+
+class MongoUploadStore:
+    def __init__(self, col):
+        self.col = col
+
+    async def load(self, phone_number_id):
+        return await self.col.find({"phone_number_id": phone_number_id}).to_list(length=None)
+
+    async def claim(self, entry_id):
+        # False while another instance is uploading this banner (a claim without a media id yet)
+        now = time.time()
+        try:
+            await self.col.update_one(
+                {"_id": entry_id, "$or": [{"claim_until": {"$lt": now}}, {"claim_until": {"$exists": False}}]},
+                {"$set": {"claim_until": now + MEDIA_UPLOAD_CLAIM}, "$setOnInsert": {"phone_number_id": whatsapp.PHONE_NUMBER_ID}},
+                upsert=True
+            )
+            return True
+        except DuplicateKeyError:
+            return False
+
+    async def save(self, entry):
+        await self.col.replace_one({"_id": entry["_id"]}, entry, upsert=True)
+
+_store = None
+_task = None
+_banners = {}  # url -> (file path, sha256 of its content)
+_entries = {}  # entry _id -> {"media_id", "expires_at", ...}
+_stats = {"uploads": 0, "upload_errors": 0, "upload_bytes": 0, "by_id": 0, "by_link": 0, "reused": 0, "claimed_elsewhere": 0}
+
+def _entry_id(sha):
+    # Media ids belong to the sending phone number; content hash so a rebuilt banner re-uploads
+    return f"{whatsapp.PHONE_NUMBER_ID}:{sha}"
+
+def resolve(url):
+    # whatsapp.image_object hook: media id for a registered banner, or None to send the link
+    banner = _banners.get(url)
+    entry = _entries.get(_entry_id(banner[1])) if banner else None
+    if entry and entry["expires_at"] - time.time() > MEDIA_ID_MIN_REMAINING:
+        _stats["by_id"] += 1
+        return entry["media_id"]
+    _stats["by_link"] += 1
+    return None
+
+async def upload(path):
+    # Returns the media id WhatsApp assigned to the file
+    async with await anyio.open_file(path, "rb") as f:
+        data = await f.read()
+    content_type = mimetypes.guess_type(path)[0] or "image/jpeg"
+    client = whatsapp.get_client()
+    res = await client.post(
+        f"{whatsapp.GRAPH_API_BASE}/{whatsapp.PHONE_NUMBER_ID}/media",
+        headers={"Authorization": f"Bearer {whatsapp.TOKEN}"},
+        data={"messaging_product": "whatsapp", "type": content_type},
+        files={"file": (os.path.basename(path), data, content_type)},
+    )
+    if res.status_code != 200 or "id" not in res.json():
+        raise RuntimeError(f"Media upload failed with {res.status_code}: {res.text[:200]}")
+    _stats["upload_bytes"] += len(data)
+    return res.json()["id"]
+
+async def _refresh_one(path, sha, limit):
+    async with limit:
+        try:
+            if not await _store.claim(_entry_id(sha)):
+                _stats["claimed_elsewhere"] += 1
+                return False
+        except Exception as e:
+            print(f"Media registry could not claim {os.path.basename(path)}, uploading anyway: {e!r}")
+        try:
+            media_id = await upload(path)
+        except Exception as e:
+            _stats["upload_errors"] += 1
+            print(f"Media registry could not upload {os.path.basename(path)}: {e!r}")
+            return True
+    now = time.time()
+    entry = {"_id": _entry_id(sha), "phone_number_id": whatsapp.PHONE_NUMBER_ID, "file": os.path.basename(path),
+             "media_id": media_id, "uploaded_at": now, "expires_at": now + MEDIA_ID_TTL}
+    _entries[entry["_id"]] = entry
+    _stats["uploads"] += 1
+    try:
+        await _store.save(entry)
+    except Exception as e:
+        # The id is still used by this process; another instance will upload its own
+        print(f"Media registry could not save {entry['file']}: {e!r}")
+    return True
+
+def _due(entry):
+    return "media_id" not in (entry or {}) or entry["expires_at"] - time.time() < MEDIA_ID_REFRESH_MARGIN
+
+async def load():
+    # Takes over ids saved by other instances when they are newer than ours
+    for entry in await _store.load(whatsapp.PHONE_NUMBER_ID):
+        if "media_id" not in entry:
+            continue  # claimed, upload in progress
+        ours = _entries.get(entry["_id"])
+        if ours is None or ours["expires_at"] < entry["expires_at"]:
+            if ours is None or ours.get("media_id") != entry["media_id"]:
+                _stats["reused"] += 1
+            _entries[entry["_id"]] = entry
+
+async def refresh():
+    # Uploads every banner that has no id yet or whose id is within the refresh margin, unless
+    # the shared store already has a fresh one
+    try:
+        await load()
+    except Exception as e:
+        print(f"Media registry could not load uploaded ids: {e!r}")
+    due = {sha: path for path, sha in _banners.values() if _due(_entries.get(_entry_id(sha)))}
+    limit = asyncio.Semaphore(MEDIA_UPLOAD_CONCURRENCY)
+    await asyncio.gather(*(_refresh_one(path, sha, limit) for sha, path in due.items()))
+    return len(due)
+
+async def _refresh_loop():
+    while True:
+        try:
+            await refresh()
+        except Exception as e:
+            print(f"Media registry refresh failed: {e!r}")
+        # Come back soon for ids another instance is uploading or that failed to upload
+        waiting = any(_due(_entries.get(_entry_id(sha))) for _, sha in _banners.values())
+        await asyncio.sleep(min(MEDIA_REGISTRY_CHECK_INTERVAL, MEDIA_UPLOAD_CLAIM) if waiting else MEDIA_REGISTRY_CHECK_INTERVAL)
+
+def register(urls):
+    # urls: banner name -> URL as handed out by static_assets.asset_urls
+    for url in urls.values():
+        path = local_path(url)
+        if path and os.path.exists(path):
+            with open(path, "rb") as f:
+                _banners[url] = (path, hashlib.sha256(f.read()).hexdigest())
+
+async def start(urls, store=None):
+    global _store, _task
+    if not MEDIA_REGISTRY_ENABLED:
+        return
+    _store = store or MongoUploadStore(media_uploads_col)
+    register(urls)
+    try:
+        await load()
+    except Exception as e:
+        print(f"Media registry could not load uploaded ids: {e!r}")
+    whatsapp.set_media_resolver(resolve)
+    # Uploads happen in the background; sends use links until the ids are in
+    _task = asyncio.create_task(_refresh_loop())
+
+async def stop():
+    global _task
+    whatsapp.set_media_resolver(None)
+    if _task:
+        _task.cancel()
+        await asyncio.gather(_task, return_exceptions=True)
+    _task = None
+
+def metrics():
+    now = time.time()
+    valid = sum(1 for _, sha in _banners.values() if _entry_id(sha) in _entries and _entries[_entry_id(sha)]["expires_at"] > now)
+    return {**_stats, "banners": len(_banners), "with_id": valid}
@@ -0,0 +1,72 @@
+import io
+import os
+import time
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image, ImageOps
+
+# Resized / re-encoded variants of evidence photos for the dashboard grids. Requested widths
+# are snapped to a small fixed set so every variant is shared by many requests and cached
+# once (media_proxy keeps them in its disk cache like any other kind). Rendering runs on a
+# dedicated thread pool: Pillow drops the GIL while decoding, resizing and encoding, so it
+# neither blocks the event loop nor competes with the default executor.
+
+VARIANT_WIDTHS = tuple(sorted(int(w) for w in os.getenv("MEDIA_VARIANT_WIDTHS", "100,200,320,640,1280").split(",")))
+FORMATS = {"jpeg": ("JPEG", "image/jpeg"), "webp": ("WEBP", "image/webp")}
+VARIANT_QUALITY = int(os.getenv("MEDIA_VARIANT_QUALITY", "75"))
+MEDIA_VARIANT_WORKERS = int(os.getenv("MEDIA_VARIANT_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+_pool = None
+_stats = {"rendered": 0, "render_seconds": 0.0}
+
+def snap(width):
+    # Smallest configured width that is at least the requested one
+    for w in VARIANT_WIDTHS:
+        if w >= width:
+            return w
+    return VARIANT_WIDTHS[-1]
+
+def kind(width, fmt):
+    return f"w{width}.{fmt}"
+
+def parse(kind_name):
+    # "w200.webp" -> (200, "webp"); None for anything that is not a variant kind
+    if not kind_name.startswith("w") or "." not in kind_name:
+        return None
+    width, fmt = kind_name[1:].split(".", 1)
+    if not width.isdigit() or int(width) not in VARIANT_WIDTHS or fmt not in FORMATS:
+        return None
+    return int(width), fmt
+
+def content_type(fmt):
+    return FORMATS[fmt][1]
+
+def render(data, width, fmt, quality=None):
+    with Image.open(io.BytesIO(data)) as im:
+        # Let the JPEG decoder downscale by a power of two while decoding; far cheaper than
+        # decoding full size first (a square target keeps both orientations large enough)
+        im.draft("RGB", (width, width))
+        im = ImageOps.exif_transpose(im)
+        if im.width > width:
+            im = im.resize((width, max(1, round(im.height * width / im.width))), Image.LANCZOS)
+        if im.mode not in ("RGB", "L"):
+            im = im.convert("RGB")
+        out = io.BytesIO()
+        if fmt == "webp":
+            im.save(out, "WEBP", quality=quality or VARIANT_QUALITY, method=4)
+        else:
+            im.save(out, "JPEG", quality=quality or VARIANT_QUALITY, optimize=True, progressive=True)
+        return out.getvalue()
+
+async def render_async(data, width, fmt, quality=None):
+    global _pool
+    if _pool is None:
+        _pool = ThreadPoolExecutor(max_workers=MEDIA_VARIANT_WORKERS, thread_name_prefix="media-variant")
+    started = time.perf_counter()
+    out = await asyncio.get_running_loop().run_in_executor(_pool, render, data, width, fmt, quality)
+    _stats["rendered"] += 1
+    _stats["render_seconds"] += time.perf_counter() - started
+    return out
+
+def metrics():
+    return {**_stats, "render_seconds": round(_stats["render_seconds"], 3), "workers": MEDIA_VARIANT_WORKERS, "widths": VARIANT_WIDTHS}
@@ -0,0 +1,93 @@
+import sys
+import time
+import asyncio
+import argparse
+import datetime
+from pymongo import UpdateOne
+from db import migrations_col
+import schema
+from ref_index import COLLECTIONS
+
+# Rewrites legacy grievance / member-request documents into the canonical schema (schema.py).
+# Usage: python migrate_schema.py [--collection grievances] [--batch 500] [--pause 0.1] [--dry-run]
+#
+# Works through each collection in _id order, --batch documents per bulk write, and stores
+# the last _id done in the migrations collection after every batch, so an interrupted run
+# continues where it stopped. Safe while the bot is live: a document whose status changed
+# between read and write is left for the next run. When nothing legacy is left the
+# collection is marked done, and the app drops its legacy-aware queries on its next start.
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--collection", choices=list(COLLECTIONS), help="only this collection (default: all)")
+parser.add_argument("--batch", type=int, default=500)
+parser.add_argument("--pause", type=float, default=0.0, help="seconds to sleep between batches")
+parser.add_argument("--dry-run", action="store_true", help="report what would change, write nothing")
+
+def changes(doc, canonical):
+    set_fields = {k: v for k, v in canonical.items() if k != "_id" and doc.get(k, object()) != v}
+    unset_fields = {k: "" for k in doc if k not in canonical}
+    update = {"$set": set_fields}
+    if unset_fields:
+        update["$unset"] = unset_fields
+    return update
+
+async def migrate(name, batch_size, pause, dry_run):
+    col = COLLECTIONS[name]
+    state_id = schema.checkpoint_id(name)
+    state = await migrations_col.find_one({"_id": state_id}) or {}
+    last_id = state.get("last_id")
+    pending = {"schema_version": {"$ne": schema.SCHEMA_VERSION}}
+    migrated = skipped = 0
+    started = time.perf_counter()
+    if last_id:
+        print(f"{name}: resuming after {last_id}")
+
+    while True:
+        query = {**pending, "_id": {"$gt": last_id}} if last_id else pending
+        docs = await col.find(query).sort("_id", 1).limit(batch_size).to_list(length=batch_size)
+        if not docs:
+            break
+        ops = []
+        for doc in docs:
+            update = changes(doc, schema.normalize(name, doc))
+            if dry_run and migrated + len(ops) < 3:
+                print(f"{name} {doc['_id']}: {update}")
+            # Only the dashboard changes these records concurrently, and only their status
+            guard = {"_id": doc["_id"], "schema_version": {"$ne": schema.SCHEMA_VERSION}, "status": doc.get("status", {"$exists": False})}
+            ops.append(UpdateOne(guard, update))
+        last_id = docs[-1]["_id"]
+        if dry_run:
+            migrated += len(ops)
+            continue
+        result = await col.bulk_write(ops, ordered=False)
+        migrated += result.modified_count
+        skipped += len(ops) - result.matched_count
+        await migrations_col.update_one({"_id": state_id}, {"$set": {"last_id": last_id, "updated_at": datetime.datetime.now(datetime.timezone.utc)},
+                                                           "$inc": {"migrated": result.modified_count}}, upsert=True)
+        elapsed = time.perf_counter() - started
+        print(f"{name}: {migrated} migrated ({migrated / max(elapsed, 1e-9):.0f}/s), up to {last_id}")
+        if pause:
+            await asyncio.sleep(pause)
+
+    if dry_run:
+        print(f"{name}: {migrated} documents would be migrated")
+        return True
+    left = await col.count_documents(pending)
+    if left:
+        # Skipped or written by an older app version meanwhile: rescan from the start next run
+        await migrations_col.update_one({"_id": state_id}, {"$set": {"last_id": None}}, upsert=True)
+        print(f"{name}: {migrated} migrated, {left} still legacy ({skipped} changed during the run); run again")
+        return False
+    await migrations_col.update_one({"_id": state_id}, {"$set": {"done": True, "completed_at": datetime.datetime.now(datetime.timezone.utc)}}, upsert=True)
+    print(f"{name}: done, {migrated} migrated in {time.perf_counter() - started:.1f} s")
+    return True
+
+async def main(args):
+    names = [args.collection] if args.collection else list(COLLECTIONS)
+    ok = True
+    for name in names:
+        ok = await migrate(name, args.batch, args.pause, args.dry_run) and ok
+    return 0 if ok else 1
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(parser.parse_args())))
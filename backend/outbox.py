@@ -0,0 +1,195 @@
+import os
+import time
+import random
+import socket
+import asyncio
+import httpx
+from pymongo import ReturnDocument
+import whatsapp
+from db import outbox_col
+from dispatcher import KeyedDispatcher
+
+# Outbound WhatsApp queue. send_* payloads are persisted, acknowledged to the caller
+# immediately and delivered by background workers. Deliveries go through a per-phone
+# dispatcher, so messages to the same phone keep FIFO order while different phones go
+# out in parallel.
+
+OUTBOX_WORKERS = int(os.getenv("OUTBOX_WORKERS", "20"))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "6"))
+OUTBOX_BACKOFF_BASE = float(os.getenv("OUTBOX_BACKOFF_BASE", "1"))
+OUTBOX_BACKOFF_MAX = float(os.getenv("OUTBOX_BACKOFF_MAX", "60"))
+# Every pending message is leased to the process that queued it, which renews the lease
+# while the message waits or is being delivered. Another process claims it only once the
+# lease has expired (the owner crashed or lost the database for this long).
+OUTBOX_RECOVER_AFTER = float(os.getenv("OUTBOX_RECOVER_AFTER", "120"))
+OUTBOX_CLAIM_BATCH = 500
+
+OWNER = f"{socket.gethostname()}:{os.getpid()}"
+
+class MongoOutboxStore:
+    def __init__(self, col):
+        self.col = col
+
+    async def add(self, doc):
+        result = await self.col.insert_one(doc)
+        doc["_id"] = result.inserted_id
+
+    async def done(self, doc):
+        await self.col.delete_one({"_id": doc["_id"]})
+
+    async def renew(self, doc):
+        # False when another process has taken the message over
+        result = await self.col.update_one({"_id": doc["_id"], "status": "pending", "owner": OWNER},
+                                           {"$set": {"lease_until": time.time() + OUTBOX_RECOVER_AFTER}})
+        return result.matched_count == 1
+
+    async def heartbeat(self, ids):
+        if ids:
+            await self.col.update_many({"_id": {"$in": list(ids)}, "status": "pending", "owner": OWNER},
+                                       {"$set": {"lease_until": time.time() + OUTBOX_RECOVER_AFTER}})
+
+    async def retry(self, doc, error):
+        await self.col.update_one({"_id": doc["_id"]}, {"$set": {"attempts": doc["attempts"], "last_error": error, "updated_at": time.time()}})
+
+    async def fail(self, doc, error):
+        await self.col.update_one({"_id": doc["_id"]}, {"$set": {"status": "failed", "attempts": doc["attempts"], "last_error": error, "updated_at": time.time()}})
+
+    async def claim_expired(self, skip_ids):
+        # One document at a time, so when processes race for a message exactly one wins it
+        claimed = []
+        while len(claimed) < OUTBOX_CLAIM_BATCH:
+            now = time.time()
+            doc = await self.col.find_one_and_update(
+                {"status": "pending", "lease_until": {"$not": {"$gte": now}}, "_id": {"$nin": list(skip_ids)}},
+                {"$set": {"owner": OWNER, "lease_until": now + OUTBOX_RECOVER_AFTER, "updated_at": now}},
+                sort=[("_id", 1)], return_document=ReturnDocument.AFTER
+            )
+            if doc is None:
+                break
+            claimed.append(doc)
+        return claimed
+
+    async def counts(self):
+        return {
+            "pending": await self.col.count_documents({"status": "pending"}),
+            "failed": await self.col.count_documents({"status": "failed"})
+        }
+
+_store = None
+_dispatcher = None
+_recovery_task = None
+_queued = {}  # _id -> enqueued_at, for everything waiting in the dispatcher or being delivered
+_stats = {"enqueued": 0, "sent": 0, "retried": 0, "failed": 0, "lost": 0}
+
+def _backoff(attempts):
+    delay = min(OUTBOX_BACKOFF_MAX, OUTBOX_BACKOFF_BASE * (2 ** (attempts - 1)))
+    return delay + random.uniform(0, OUTBOX_BACKOFF_BASE)
+
+def _retryable(status_code):
+    return status_code == 429 or status_code >= 500
+
+async def enqueue(payload):
+    now = time.time()
+    doc = {
+        "phone": payload.get("to"),
+        "payload": payload,
+        "status": "pending",
+        "attempts": 0,
+        "owner": OWNER,
+        "lease_until": now + OUTBOX_RECOVER_AFTER,
+        "enqueued_at": now,
+        "updated_at": now
+    }
+    await _store.add(doc)
+    _stats["enqueued"] += 1
+    _schedule(doc)
+    return doc["_id"]
+
+def _schedule(doc):
+    _queued[doc["_id"]] = doc.get("enqueued_at", time.time())
+
+    async def job():
+        try:
+            await _deliver(doc)
+        finally:
+            _queued.pop(doc["_id"], None)
+
+    _dispatcher.submit(doc["phone"], job)
+
+async def _deliver(doc):
+    while True:
+        # A message that waited past its lease may have been claimed elsewhere; never send it twice
+        if doc["attempts"] or time.time() - doc.get("enqueued_at", 0) > OUTBOX_RECOVER_AFTER / 2:
+            if not await _store.renew(doc):
+                _stats["lost"] += 1
+                return
+        try:
+            res = await whatsapp.send_payload(doc["payload"])
+        except httpx.HTTPError as e:
+            res = None
+            error = f"Request failed: {e!r}"
+        if res is not None:
+            if res.status_code in (200, 201):
+                await _store.done(doc)
+                _stats["sent"] += 1
+                return
+            error = f"WhatsApp API Error {res.status_code}: {res.text[:500]}"
+
+        doc["attempts"] += 1
+        if (res is not None and not _retryable(res.status_code)) or doc["attempts"] >= OUTBOX_MAX_ATTEMPTS:
+            print(f"Outbox giving up on message {doc['_id']} to {doc['phone']}: {error}")
+            await _store.fail(doc, error)
+            _stats["failed"] += 1
+            return
+        _stats["retried"] += 1
+        await _store.retry(doc, error)
+        # Backing off inside the job holds back later messages for the same phone, preserving order
+        await asyncio.sleep(_backoff(doc["attempts"]))
+
+async def _recover_loop():
+    while True:
+        try:
+            await _store.heartbeat(set(_queued))
+            docs = await _store.claim_expired(set(_queued))
+            for doc in docs:
+                _schedule(doc)
+            if docs:
+                print(f"Outbox recovered {len(docs)} pending messages")
+        except Exception as e:
+            print(f"Outbox recovery failed: {e!r}")
+        await asyncio.sleep(OUTBOX_RECOVER_AFTER / 4)
+
+async def start(store=None, workers=None):
+    global _store, _dispatcher, _recovery_task
+    _store = store or MongoOutboxStore(outbox_col)
+    _dispatcher = KeyedDispatcher("outbox", workers or OUTBOX_WORKERS)
+    _dispatcher.start()
+    _recovery_task = asyncio.create_task(_recover_loop())
+    whatsapp.set_dispatcher(enqueue)
+
+async def drain():
+    await _dispatcher.drain()
+
+async def stop(timeout=5):
+    global _recovery_task
+    whatsapp.set_dispatcher(None)
+    try:
+        await asyncio.wait_for(drain(), timeout)
+    except asyncio.TimeoutError:
+        pass  # undelivered messages stay pending in the store and are recovered on next start
+    await _dispatcher.stop(timeout=0)
+    if _recovery_task:
+        _recovery_task.cancel()
+        await asyncio.gather(_recovery_task, return_exceptions=True)
+    _recovery_task = None
+
+async def metrics():
+    now = time.time()
+    oldest = min(_queued.values(), default=None)
+    return {
+        **_stats,
+        "depth": len(_queued),
+        "lag_seconds": round(now - oldest, 3) if oldest else 0.0,
+        "dispatcher": _dispatcher.metrics() if _dispatcher else {},
+        "store": await _store.counts() if _store else {}
+    }
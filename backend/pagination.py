@@ -0,0 +1,72 @@
+import datetime
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import HTTPException
+
+# Keyset pagination for the dashboard lists. Pages are newest first on _id; the cursor is
+# the hex _id of the last row of the previous page, so fetching page N costs the same as
+# page 1 (no skip). With a date range the lists filter and sort on createdAt, the date the
+# dashboard shows (imported and migrated rows were created long before their _id), with
+# _id as the tiebreaker; the cursor then carries both. Rows whose createdAt is not a date
+# yet (see migrate_schema.py and backfill_dates.py) have no date to match.
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+def _object_id(value, what):
+    try:
+        return ObjectId(value)
+    except (InvalidId, TypeError):
+        raise HTTPException(status_code=400, detail=f"Invalid {what}")
+
+def _day(value, what):
+    try:
+        return datetime.datetime.strptime(value, "%Y-%m-%d").replace(tzinfo=datetime.timezone.utc)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid {what}, expected YYYY-MM-DD")
+
+def booth_values(booth):
+    # Booths are stored as strings by the bot but as numbers in imported voter rolls
+    return [booth, int(booth)] if booth.isdigit() else [booth]
+
+def _date_cursor(value):
+    try:
+        ms, oid = value.split("_")
+        return datetime.datetime.fromtimestamp(int(ms) / 1000, datetime.timezone.utc), ObjectId(oid)
+    except (ValueError, InvalidId):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def _cursor_value(doc, by_date):
+    if not by_date:
+        return str(doc["_id"])
+    created = doc["createdAt"]
+    if created.tzinfo is None:
+        created = created.replace(tzinfo=datetime.timezone.utc)  # Motor returns naive UTC
+    return f"{round(created.timestamp() * 1000)}_{doc['_id']}"
+
+def sort_keys(date_from=None, date_to=None):
+    return [("createdAt", -1), ("_id", -1)] if date_from or date_to else [("_id", -1)]
+
+def list_query(filters, cursor=None, date_from=None, date_to=None):
+    # filters: list of query fragments, ANDed together (they may each carry their own $or)
+    clauses = [f for f in filters if f]
+    if date_from or date_to:
+        created = {}
+        if date_from:
+            created["$gte"] = _day(date_from, "date_from")
+        if date_to:
+            created["$lt"] = _day(date_to, "date_to") + datetime.timedelta(days=1)
+        clauses.append({"createdAt": created})
+        if cursor:
+            at, oid = _date_cursor(cursor)
+            clauses.append({"$or": [{"createdAt": {"$lt": at}}, {"createdAt": at, "_id": {"$lt": oid}}]})
+    elif cursor:
+        clauses.append({"_id": {"$lt": _object_id(cursor, "cursor")}})
+    return {"$and": clauses} if len(clauses) > 1 else (clauses[0] if clauses else {})
+
+async def fetch_page(col, filters, projection, limit=None, cursor=None, date_from=None, date_to=None):
+    limit = max(1, min(limit or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE))
+    query = list_query(filters, cursor, date_from, date_to)
+    items = await col.find(query, projection).sort(sort_keys(date_from, date_to)).limit(limit + 1).to_list(length=limit + 1)
+    next_cursor = _cursor_value(items[limit - 1], date_from or date_to) if len(items) > limit else None
+    return items[:limit], next_cursor
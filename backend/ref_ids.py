@@ -0,0 +1,105 @@
+import os
+import re
+import asyncio
+from pymongo import ReturnDocument
+from db import ref_sequences_col
+
+# Reference ids given to voters: GRV/SUG/VOL/PHT followed by digits. The number comes from a
+# per-prefix sequence in MongoDB, reserved REF_ID_BLOCK_SIZE at a time with one atomic $inc
+# and handed out from memory, so ids never repeat across workers or restarts (a restart
+# just skips the rest of its block). The last digit is a Damm check digit: every single
+# mistyped digit and every swap of two adjacent digits is caught before any lookup.
+# Ids issued before this had five random digits and no check digit; those are still
+# accepted as typed. New ids always have six or more digits, so the two never collide.
+
+PREFIXES = ("GRV", "SUG", "VOL", "PHT")
+REF_ID_BLOCK_SIZE = int(os.getenv("REF_ID_BLOCK_SIZE", "20"))
+SEQUENCE_START = 10000
+LEGACY_DIGITS = 5
+
+_DAMM = (
+    (0, 3, 1, 7, 5, 9, 8, 6, 4, 2),
+    (7, 0, 9, 2, 1, 5, 4, 8, 6, 3),
+    (4, 2, 0, 6, 8, 7, 1, 3, 5, 9),
+    (1, 7, 5, 0, 9, 8, 3, 4, 2, 6),
+    (6, 1, 2, 3, 0, 4, 5, 9, 7, 8),
+    (3, 6, 7, 4, 2, 0, 9, 5, 8, 1),
+    (5, 8, 6, 9, 7, 2, 0, 1, 3, 4),
+    (8, 9, 4, 5, 3, 6, 2, 0, 1, 7),
+    (9, 4, 3, 8, 6, 1, 7, 2, 0, 5),
+    (2, 5, 8, 1, 4, 3, 6, 7, 9, 0),
+)
+_REF_RE = re.compile(r"([A-Z]{3})(\d+)")
+
+def check_digit(digits):
+    interim = 0
+    for d in digits:
+        interim = _DAMM[interim][int(d)]
+    return str(interim)
+
+def format_id(prefix, number):
+    digits = str(number)
+    return prefix + digits + check_digit(digits)
+
+def normalize(text):
+    # What voters type: any case, sometimes with spaces or dashes ("grv-10000 7")
+    return re.sub(r"[\s\-]", "", text or "").upper()
+
+def is_valid(ref):
+    m = _REF_RE.fullmatch(ref)
+    if not m or m.group(1) not in PREFIXES:
+        return False
+    digits = m.group(2)
+    if len(digits) == LEGACY_DIGITS:
+        return True
+    return len(digits) > LEGACY_DIGITS and check_digit(digits) == "0"
+
+def sequence(ref):
+    # The sequence number inside a new-style id, None for legacy ids
+    m = _REF_RE.fullmatch(ref)
+    if not m or len(m.group(2)) <= LEGACY_DIGITS:
+        return None
+    return int(m.group(2)[:-1])
+
+EXAMPLE = format_id("GRV", 12345)
+
+class MongoSequences:
+    def __init__(self, col):
+        self.col = col
+
+    async def reserve(self, prefix, count):
+        # First number of a freshly reserved block of count numbers
+        doc = await self.col.find_one_and_update({"_id": prefix}, {"$inc": {"next": count}}, upsert=True,
+                                                 return_document=ReturnDocument.AFTER)
+        return SEQUENCE_START + doc["next"] - count
+
+_sequences = None
+_blocks = {}  # prefix -> [next number, end of block]
+_locks = {}
+_stats = {"issued": 0, "blocks": 0}
+
+def use(sequences):
+    global _sequences
+    _sequences = sequences
+    _blocks.clear()
+
+async def allocate(prefix):
+    # Returns (ref_id, sequence number); only a block boundary costs a database round-trip
+    if _sequences is None:
+        use(MongoSequences(ref_sequences_col))
+    block = _blocks.get(prefix)
+    if block is None or block[0] >= block[1]:
+        lock = _locks.setdefault(prefix, asyncio.Lock())
+        async with lock:
+            block = _blocks.get(prefix)
+            if block is None or block[0] >= block[1]:
+                first = await _sequences.reserve(prefix, REF_ID_BLOCK_SIZE)
+                block = _blocks[prefix] = [first, first + REF_ID_BLOCK_SIZE]
+                _stats["blocks"] += 1
+    number = block[0]
+    block[0] += 1
+    _stats["issued"] += 1
+    return format_id(prefix, number), number
+
+def metrics():
+    return {**_stats, "block_size": REF_ID_BLOCK_SIZE, "remaining": {p: b[1] - b[0] for p, b in _blocks.items()}}
@@ -0,0 +1,91 @@
+import os
+import time
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+from db import ref_index_col, grievances_col, member_requests_col, migrations_col
+
+# One lookup collection for every reference id, whichever collection the record lives in:
+# {_id: ref, col: "grievances" | "member_requests", doc_id: ObjectId}. Resolving a ref is a
+# single _id read instead of $or probes on two collections. Entries are added on every
+# insert; records from before this are added by backfill_ref_index.py, and until it has
+# completed a miss falls back to the legacy probes and indexes what it finds. Afterwards a
+# miss is answered from the index alone.
+
+COLLECTIONS = {"grievances": grievances_col, "member_requests": member_requests_col}
+# Fields holding a reference id, per collection; ticketId and referenceId are legacy
+REF_FIELDS = {"grievances": ("ref_id", "ticketId"), "member_requests": ("ref_id", "referenceId")}
+# "auto": probe on a miss until the backfill has completed; "1" always, "0" never
+REF_INDEX_PROBE = os.getenv("REF_INDEX_PROBE", "auto")
+BACKFILL_ID = "ref_index_backfill"
+BACKFILL_RECHECK = 60  # seconds between looks for the backfill marker while it is missing
+
+_backfilled = False
+_checked_at = 0.0
+_stats = {"hits": 0, "misses": 0, "probes": 0, "healed": 0, "stale": 0, "duplicates": 0}
+
+def entry(name, ref, doc_id):
+    # Upsert for one ref (used by the backfill); the first record indexed under a ref keeps it
+    return UpdateOne({"_id": ref}, {"$setOnInsert": {"col": name, "doc_id": doc_id}}, upsert=True)
+
+async def add(name, ref, doc_id):
+    try:
+        await ref_index_col.insert_one({"_id": ref, "col": name, "doc_id": doc_id})
+    except DuplicateKeyError:
+        _stats["duplicates"] += 1
+        print(f"Reference {ref} is already indexed; {name} {doc_id} not added")
+
+async def remove(ref):
+    await ref_index_col.delete_one({"_id": ref})
+
+async def _probe(ref):
+    # The pre-index lookup order: grievances first, then member requests
+    for name, fields in REF_FIELDS.items():
+        doc = await COLLECTIONS[name].find_one({"$or": [{f: ref} for f in fields]})
+        if doc:
+            return name, doc
+    return None, None
+
+async def _probe_needed():
+    global _backfilled, _checked_at
+    if REF_INDEX_PROBE != "auto":
+        return REF_INDEX_PROBE == "1"
+    if not _backfilled and time.monotonic() - _checked_at >= BACKFILL_RECHECK:
+        _checked_at = time.monotonic()
+        try:
+            _backfilled = bool(await migrations_col.find_one({"_id": BACKFILL_ID, "done": True}))
+        except Exception as e:
+            print(f"Reference index backfill state unavailable, still probing: {e!r}")
+    return not _backfilled
+
+async def startup():
+    await _probe_needed()
+    if not _backfilled and REF_INDEX_PROBE == "auto":
+        print("ref_index: backfill not completed, missed references fall back to legacy lookups (run backfill_ref_index.py)")
+
+async def find(ref):
+    # Returns (collection, record) for a reference id, or (None, None)
+    if not ref:
+        return None, None
+    indexed = await ref_index_col.find_one({"_id": ref})
+    if indexed:
+        col = COLLECTIONS[indexed["col"]]
+        doc = await col.find_one({"_id": indexed["doc_id"]})
+        if doc:
+            _stats["hits"] += 1
+            return col, doc
+        # Record removed without going through remove()
+        _stats["stale"] += 1
+        await remove(ref)
+    _stats["misses"] += 1
+    if not await _probe_needed():
+        return None, None
+    _stats["probes"] += 1
+    name, doc = await _probe(ref)
+    if doc is None:
+        return None, None
+    await ref_index_col.update_one({"_id": ref}, {"$setOnInsert": {"col": name, "doc_id": doc["_id"]}}, upsert=True)
+    _stats["healed"] += 1
+    return COLLECTIONS[name], doc
+
+def metrics():
+    return {**_stats, "backfilled": _backfilled}
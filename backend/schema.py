@@ -0,0 +1,145 @@
+import os
+import datetime
+from collections import namedtuple
+from bson import ObjectId
+from db import grievances_col, member_requests_col, migrations_col
+
+# Canonical shape of grievance and member-request documents, and the read model built on it.
+# Older records spell the same field several ways (voterName/name, partNumber, phoneNumber,
+# ticketId, referenceId, message, area) and only have the submission day as a display
+# string. migrate_schema.py rewrites them into the canonical shape; until it has finished
+# for a collection, queries also match the legacy spellings (match(), suggestion_filter())
+# and record() normalizes legacy rows as they are read.
+
+SCHEMA_VERSION = 1
+# "auto": legacy-aware queries until migrate_schema.py has completed; "1"/"0" force it
+SCHEMA_LEGACY_READS = os.getenv("SCHEMA_LEGACY_READS", "auto")
+
+# canonical field -> legacy spellings, in order of preference
+ALIASES = {
+    "grievances": {"ref_id": ("ticketId",), "voter_name": ("voterName", "name"), "voter_phone": ("phoneNumber",),
+                   "booth": ("partNumber",), "description": ("message",), "category": ("area",)},
+    "member_requests": {"ref_id": ("referenceId",), "voter_name": ("voterName", "name"), "voter_phone": ("phoneNumber",),
+                        "booth": ("partNumber",), "suggestion": ("area",)},
+}
+DEFAULT_TYPE = {"grievances": "Grievance"}
+DEFAULT_STATUS = {"Grievance": "Open", "Photo Evidence": "Open", "Suggestion": "Pending", "Volunteer": "Registered"}
+DATE_FORMAT = "%d %b %Y"
+
+Record = namedtuple("Record", ["id", "ref_id", "voter_name", "voter_phone", "booth", "epic", "type", "category",
+                               "description", "suggestion", "role", "status", "created_at", "photo_id"])
+
+_migrated = set()  # collections migrate_schema.py has completed
+
+def name_of(col):
+    return "grievances" if col is grievances_col else "member_requests"
+
+def checkpoint_id(name):
+    return f"schema_v{SCHEMA_VERSION}:{name}"
+
+def _utc(value):
+    # datetime (naive values from Mongo are UTC) or a legacy date string -> aware UTC datetime
+    if isinstance(value, datetime.datetime):
+        return value if value.tzinfo else value.replace(tzinfo=datetime.timezone.utc)
+    if isinstance(value, str):
+        for parse in (lambda v: datetime.datetime.strptime(v, DATE_FORMAT), datetime.datetime.fromisoformat):
+            try:
+                return _utc(parse(value.strip()))
+            except ValueError:
+                pass
+    return None
+
+def creation_time(day, oid):
+    # Legacy dates only have the day; the ObjectId has the exact insert time, which is used
+    # when it agrees with that day (records imported later do not)
+    day = _utc(day)
+    inserted = oid.generation_time if isinstance(oid, ObjectId) else None
+    return inserted if inserted and (day is None or inserted.date() == day.date()) else day
+
+def normalize(name, doc):
+    # Returns the canonical form of doc. A legacy field is dropped only when its value was
+    # taken over (or repeats the canonical one); otherwise it holds different data and stays.
+    out = dict(doc)
+    for field, legacy in ALIASES[name].items():
+        value = out.get(field)
+        for alt in legacy:
+            if alt not in out:
+                continue
+            if value in (None, "") and out[alt] not in (None, ""):
+                value = out.pop(alt)
+            elif out[alt] in (None, "", value):
+                out.pop(alt)
+        if value is not None:
+            out[field] = value
+    if out.get("booth") is not None:
+        out["booth"] = str(out["booth"])
+
+    if not out.get("type"):
+        if str(out.get("ref_id") or "").startswith("MBR"):
+            out["type"] = "Suggestion"  # member requests from the old form
+        elif name in DEFAULT_TYPE:
+            out["type"] = DEFAULT_TYPE[name]
+    if not out.get("status") and out.get("type") in DEFAULT_STATUS:
+        out["status"] = DEFAULT_STATUS[out["type"]]
+
+    created = _utc(out.get("createdAt"))
+    if created is None:
+        created = creation_time(out.get("timestamp"), out.get("_id"))
+    if created is not None:
+        out["createdAt"] = created
+        if _utc(out.get("timestamp")) is not None:
+            out.pop("timestamp")
+    out["schema_version"] = SCHEMA_VERSION
+    return out
+
+def record(name, doc):
+    if doc.get("schema_version") != SCHEMA_VERSION:
+        doc = normalize(name, doc)
+    return Record(
+        id=doc.get("_id"), ref_id=doc.get("ref_id"), voter_name=doc.get("voter_name"), voter_phone=doc.get("voter_phone"),
+        booth=doc.get("booth"), epic=doc.get("epic"), type=doc.get("type"), category=doc.get("category"),
+        description=doc.get("description"), suggestion=doc.get("suggestion"), role=doc.get("role"),
+        status=doc.get("status"), created_at=_utc(doc.get("createdAt")), photo_id=doc.get("photo_id")
+    )
+
+def format_date(value, default=""):
+    return value.strftime(DATE_FORMAT) if value else default
+
+def projection(name, fields):
+    # The canonical fields plus whatever record() needs to derive them from a legacy row
+    extra = [alt for f in fields for alt in ALIASES[name].get(f, ())]
+    return list(dict.fromkeys(list(fields) + extra + ["type", "createdAt", "timestamp", "schema_version"]))
+
+def legacy_reads(name):
+    if SCHEMA_LEGACY_READS == "auto":
+        return name not in _migrated
+    return SCHEMA_LEGACY_READS == "1"
+
+def fields(name, field):
+    # Every spelling a query on field has to cover right now
+    return (field,) + (ALIASES[name].get(field, ()) if legacy_reads(name) else ())
+
+def match(name, field, condition):
+    names = fields(name, field)
+    return {field: condition} if len(names) == 1 else {"$or": [{f: condition} for f in names]}
+
+def coalesce(name, field):
+    # Aggregation expression for field, falling back through its legacy spellings
+    names = fields(name, field)
+    return f"${field}" if len(names) == 1 else {"$ifNull": [f"${f}" for f in names]}
+
+def suggestion_filter():
+    if legacy_reads("member_requests"):
+        return {"$or": [{"type": "Suggestion"}, {"referenceId": {"$regex": "^MBR"}}]}
+    return {"type": "Suggestion"}
+
+async def startup():
+    try:
+        done = await migrations_col.find({"_id": {"$in": [checkpoint_id(n) for n in ALIASES]}, "done": True}).to_list(length=None)
+    except Exception as e:
+        print(f"Schema migration state unavailable, keeping legacy-aware queries: {e!r}")
+        return
+    _migrated.update(n for n in ALIASES if checkpoint_id(n) in {d["_id"] for d in done})
+    for name in ALIASES:
+        if legacy_reads(name):
+            print(f"{name}: legacy documents may remain, queries match legacy fields (run migrate_schema.py)")
@@ -0,0 +1,183 @@
+import os
+import time
+import asyncio
+import datetime
+from collections import OrderedDict
+from pymongo import UpdateOne
+from db import sessions_col
+
+# Conversation state storage. "memory" keeps sessions in a bounded LRU with TTL eviction
+# (single process); "mongo" shares them between workers through a TTL-indexed collection.
+# Any change to a session's content (flow step, collected answers) is written through
+# before put() returns, so the next message from that phone sees it on whichever worker
+# it lands. Only the last-active touches of messages that change nothing else are
+# coalesced and flushed in batches; those never overwrite content another worker wrote.
+
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory")  # "memory" or "mongo"
+SESSION_MAX_ENTRIES = int(os.getenv("SESSION_MAX_ENTRIES", "50000"))
+SESSION_FLUSH_INTERVAL = float(os.getenv("SESSION_FLUSH_INTERVAL", "0.2"))
+SESSION_FLUSH_BATCH = int(os.getenv("SESSION_FLUSH_BATCH", "500"))
+
+# Short field names keep stored sessions small; unknown keys are stored as-is
+FIELD_ALIASES = {
+    "state": "s", "last_active": "t", "epic": "e", "name": "n", "booth": "b",
+    "cat": "c", "desc": "d", "photo_id": "p", "sugg": "g", "vol_role": "r",
+    "photo_cat": "pc", "photo_desc": "pd", "temp_epic": "te", "temp_lat": "la",
+    "temp_lon": "lo", "temp_skipped": "ts", "temp_flow": "tf",
+    "post_flow_skipped": "pf", "epic_unverified": "eu"
+}
+FIELD_NAMES = {v: k for k, v in FIELD_ALIASES.items()}
+
+def pack(session):
+    # None and missing are equivalent for every handler (they use .get), so None is dropped
+    return {FIELD_ALIASES.get(k, k): v for k, v in session.items() if v is not None}
+
+def unpack(data):
+    return {FIELD_NAMES.get(k, k): v for k, v in data.items()}
+
+def _content(packed):
+    # Everything but the last-active time
+    return {k: v for k, v in packed.items() if k != "t"}
+
+class MemorySessionStore:
+    def __init__(self, ttl, max_entries=SESSION_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # phone -> (expires_at, packed)
+        self.stats = {"hits": 0, "misses": 0, "expired": 0, "evicted": 0}
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def get(self, phone):
+        entry = self.entries.get(phone)
+        if entry is None:
+            self.stats["misses"] += 1
+            return None
+        if entry[0] <= time.time():
+            del self.entries[phone]
+            self.stats["expired"] += 1
+            self.stats["misses"] += 1
+            return None
+        self.entries.move_to_end(phone)
+        self.stats["hits"] += 1
+        return unpack(entry[1])
+
+    async def put(self, phone, session):
+        self.entries[phone] = (time.time() + self.ttl, pack(session))
+        self.entries.move_to_end(phone)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.stats["evicted"] += 1
+
+    async def delete(self, phone):
+        self.entries.pop(phone, None)
+
+    def metrics(self):
+        return {"backend": "memory", "size": len(self.entries), **self.stats}
+
+class MongoSessionStore:
+    def __init__(self, col, ttl):
+        self.col = col
+        self.ttl = ttl
+        self.touches = {}  # phone -> (state, last_active) waiting for the next flush
+        self.known = OrderedDict()  # phone -> packed session as last read or written here
+        self.flush_task = None
+        self.wakeup = None
+        self.stats = {"hits": 0, "misses": 0, "flushes": 0, "writes": 0, "write_through": 0}
+
+    async def start(self):
+        self.wakeup = asyncio.Event()
+        self.flush_task = asyncio.create_task(self._flush_loop())
+
+    async def stop(self):
+        if self.flush_task:
+            self.flush_task.cancel()
+            await asyncio.gather(self.flush_task, return_exceptions=True)
+            self.flush_task = None
+        await self.flush()
+
+    def _remember(self, phone, packed):
+        self.known[phone] = packed
+        self.known.move_to_end(phone)
+        while len(self.known) > SESSION_MAX_ENTRIES:
+            self.known.popitem(last=False)
+
+    def _expires(self):
+        return datetime.datetime.utcnow() + datetime.timedelta(seconds=self.ttl)
+
+    async def get(self, phone):
+        doc = await self.col.find_one({"_id": phone})
+        # The TTL monitor only runs once a minute, so expiry is checked here too
+        packed = doc["d"] if doc and doc["exp"] > datetime.datetime.utcnow() else None
+        if packed is None:
+            self.known.pop(phone, None)
+            self.stats["misses"] += 1
+            return None
+        touch = self.touches.get(phone)
+        if touch and touch[0] == packed.get("s") and touch[1] > packed.get("t", 0):
+            packed = {**packed, "t": touch[1]}  # read-your-writes for a touch not flushed yet
+        self._remember(phone, packed)
+        self.stats["hits"] += 1
+        return unpack(packed)
+
+    async def put(self, phone, session):
+        packed = pack(session)
+        before = self.known.get(phone)
+        self._remember(phone, packed)
+        if self.flush_task is not None and before is not None and _content(before) == _content(packed):
+            self.touches[phone] = (packed.get("s"), packed.get("t", 0))
+            if len(self.touches) >= SESSION_FLUSH_BATCH:
+                self.wakeup.set()
+            return
+        self.touches.pop(phone, None)
+        await self.col.replace_one({"_id": phone}, {"d": packed, "exp": self._expires()}, upsert=True)
+        self.stats["writes"] += 1
+        self.stats["write_through"] += 1
+
+    async def delete(self, phone):
+        self.touches.pop(phone, None)
+        self.known.pop(phone, None)
+        await self.col.delete_one({"_id": phone})
+        self.stats["writes"] += 1
+
+    async def flush(self):
+        if not self.touches:
+            return
+        batch, self.touches = self.touches, {}
+        expires = self._expires()
+        # Only while the session is still at the same step: a worker that moved it on wins
+        ops = [UpdateOne({"_id": phone, "d.s": state}, {"$set": {"d.t": t, "exp": expires}}) for phone, (state, t) in batch.items()]
+        try:
+            await self.col.bulk_write(ops, ordered=False)
+        except Exception:
+            # Put back anything not superseded meanwhile so the next flush retries it
+            for phone, touch in batch.items():
+                self.touches.setdefault(phone, touch)
+            raise
+        self.stats["flushes"] += 1
+        self.stats["writes"] += len(ops)
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), SESSION_FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Session flush failed: {e!r}")
+
+    def metrics(self):
+        return {"backend": "mongo", "pending_writes": len(self.touches), **self.stats}
+
+def create_session_store(ttl, backend=None):
+    backend = backend or SESSION_BACKEND
+    if backend == "mongo":
+        return MongoSessionStore(sessions_col, ttl)
+    return MemorySessionStore(ttl)
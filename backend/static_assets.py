@@ -0,0 +1,59 @@
+import os
+import json
+from fastapi.staticfiles import StaticFiles
+
+# Bot banner images. build_assets.py writes optimized, content-hashed copies to assets/dist
+# plus a manifest (banner name -> file name), and the bot links to those. A fingerprinted
+# file never changes, so it is served as immutable; anything else under /assets (the
+# sources, or everything when the build has not run) gets a short max-age.
+
+ASSETS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets")
+DIST_DIR = os.path.join(ASSETS_DIR, "dist")
+MANIFEST_PATH = os.path.join(DIST_DIR, "manifest.json")
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+ASSET_CACHE_CONTROL = os.getenv("ASSET_CACHE_CONTROL", "public, max-age=3600")
+SOURCE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+
+_files = {}  # url handed out by asset_urls -> file on disk
+
+def load_manifest():
+    try:
+        with open(MANIFEST_PATH) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def sources():
+    # banner name -> source file name, e.g. "welcome_banner" -> "welcome_banner.jpg"
+    found = {}
+    for name in sorted(os.listdir(ASSETS_DIR)):
+        stem, ext = os.path.splitext(name)
+        if ext.lower() in SOURCE_EXTENSIONS:
+            found[stem] = name
+    return found
+
+def asset_urls(base, names):
+    manifest = load_manifest()
+    if not manifest:
+        print("Asset manifest missing, linking unoptimized banners (run build_assets.py)")
+    source_files = sources()
+    urls = {}
+    for name in names:
+        if name in manifest:
+            urls[name] = f"{base}/dist/{manifest[name]}"
+            _files[urls[name]] = os.path.join(DIST_DIR, manifest[name])
+        else:
+            source = source_files.get(name, name + ".png")
+            urls[name] = f"{base}/{source}"
+            _files[urls[name]] = os.path.join(ASSETS_DIR, source)
+    return urls
+
+def local_path(url):
+    return _files.get(url)
+
+class AssetFiles(StaticFiles):
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        fingerprinted = os.path.dirname(os.path.abspath(full_path)) == DIST_DIR and not str(full_path).endswith(".json")
+        response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL if fingerprinted else ASSET_CACHE_CONTROL
+        return response
@@ -0,0 +1,98 @@
+import io
+import time
+import asyncio
+import zlib
+import itertools
+import threading
+import uvicorn
+from fastapi import FastAPI, Request, HTTPException
+from fastapi.responses import Response
+
+# Minimal local stand-in for the WhatsApp Graph API, used by the bench_* scripts.
+# Point the bot at it with WHATSAPP_GRAPH_API_BASE=http://127.0.0.1:<port>
+
+stub_app = FastAPI(title="Graph API stub")
+stub_app.state.latency = 0.05
+stub_app.state.received = 0
+stub_app.state.media_fetches = 0
+stub_app.state.media_expired = False  # True: every media id 404s, like WhatsApp URLs after expiry
+stub_app.state.media_dimensions = (1280, 960)
+stub_app.state.uploads = {}  # media id -> bytes uploaded to /{phone_number_id}/media
+stub_app.state.image_refs = {"id": 0, "link": 0}  # how sent messages referenced their images
+
+_ids = itertools.count(1)
+
+@stub_app.post("/{phone_number_id}/messages")
+async def stub_messages(phone_number_id: str, request: Request):
+    payload = await request.json()
+    await asyncio.sleep(stub_app.state.latency)
+    stub_app.state.received += 1
+    image = payload.get("image") or payload.get("interactive", {}).get("header", {}).get("image")
+    if image:
+        stub_app.state.image_refs["id" if "id" in image else "link"] += 1
+    return {"messaging_product": "whatsapp", "messages": [{"id": f"wamid.stub{next(_ids)}"}]}
+
+@stub_app.post("/{phone_number_id}/media")
+async def stub_media_upload(phone_number_id: str, request: Request):
+    # Multipart upload; only checks the parts WhatsApp requires are present
+    body = await request.body()
+    if b'name="messaging_product"' not in body or b'name="file"' not in body:
+        raise HTTPException(status_code=400, detail="messaging_product and file are required")
+    await asyncio.sleep(stub_app.state.latency)
+    media_id = f"upload{next(_ids)}"
+    stub_app.state.uploads[media_id] = len(body)
+    return {"id": media_id}
+
+@stub_app.get("/{media_id}")
+async def stub_media_info(media_id: str, request: Request):
+    # Media ids starting with "missing" behave like expired media
+    if media_id.startswith("missing") or stub_app.state.media_expired:
+        raise HTTPException(status_code=404, detail="Object not found")
+    await asyncio.sleep(stub_app.state.latency)
+    return {"url": f"{request.base_url}_media/{media_id}", "mime_type": "image/jpeg", "id": media_id}
+
+@stub_app.get("/_media/{media_id}")
+async def stub_media_download(media_id: str):
+    await asyncio.sleep(stub_app.state.latency)
+    stub_app.state.media_fetches += 1
+    return Response(content=_stub_photo(media_id), media_type="image/jpeg")
+
+_photos = {}
+
+def _stub_photo(media_id):
+    # A phone-camera sized JPEG, the same bytes for the same id
+    if media_id not in _photos:
+        from PIL import Image
+        w, h = stub_app.state.media_dimensions
+        base = Image.new("RGB", (w, h), tuple(zlib.crc32(media_id.encode()).to_bytes(4, "big")[:3]))
+        noise = Image.effect_noise((w, h), 48).convert("RGB")
+        out = io.BytesIO()
+        Image.blend(base, noise, 0.5).save(out, "JPEG", quality=90)
+        _photos[media_id] = out.getvalue()
+    return _photos[media_id]
+
+def start_stub(port=8765, latency=0.05):
+    # Runs in its own thread and event loop so a blocked caller loop cannot stall the stub
+    stub_app.state.latency = latency
+    stub_app.state.received = 0
+    server = uvicorn.Server(uvicorn.Config(stub_app, host="127.0.0.1", port=port, log_level="warning", backlog=4096))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        if not thread.is_alive():
+            raise RuntimeError(f"Graph API stub failed to start on port {port}")
+        time.sleep(0.01)
+    return server, thread
+
+def stop_stub(server, thread):
+    server.should_exit = True
+    thread.join()
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Run the local Graph API stub")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds of artificial delay per call")
+    args = parser.parse_args()
+    stub_app.state.latency = args.latency
+    uvicorn.run(stub_app, host="127.0.0.1", port=args.port, log_level="warning")
@@ -1,56 +1,112 @@
 import os
-import requests
+import asyncio
+import httpx
 from dotenv import load_dotenv
 
 load_dotenv()
 
 TOKEN = os.getenv("WHATSAPP_API_TOKEN")
 PHONE_NUMBER_ID = os.getenv("WHATSAPP_PHONE_NUMBER_ID")
-API_URL = f"https://graph.facebook.com/v17.0/{PHONE_NUMBER_ID}/messages"
+GRAPH_API_BASE = os.getenv("WHATSAPP_GRAPH_API_BASE", "https://graph.facebook.com/v17.0")
+API_URL = f"{GRAPH_API_BASE}/{PHONE_NUMBER_ID}/messages"
 
 HEADERS = {
     "Authorization": f"Bearer {TOKEN}",
     "Content-Type": "application/json"
 }
 
-def post_to_whatsapp(payload):
+# Pool / concurrency limits for the shared Graph API client
+MAX_CONNECTIONS = int(os.getenv("WHATSAPP_MAX_CONNECTIONS", "20"))
+MAX_INFLIGHT = int(os.getenv("WHATSAPP_MAX_INFLIGHT", "20"))
+REQUEST_TIMEOUT = float(os.getenv("WHATSAPP_REQUEST_TIMEOUT", "10"))
+CONNECT_TIMEOUT = float(os.getenv("WHATSAPP_CONNECT_TIMEOUT", "5"))
+
+_client = None
+_client_loop = None
+_inflight = None
+
+def get_client():
+    # One keep-alive client per event loop; recreated if the loop changed (e.g. scripts using asyncio.run twice)
+    global _client, _client_loop, _inflight
+    loop = asyncio.get_running_loop()
+    if _client is None or _client.is_closed or _client_loop is not loop:
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(REQUEST_TIMEOUT, connect=CONNECT_TIMEOUT),
+            limits=httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_CONNECTIONS, keepalive_expiry=60)
+        )
+        _client_loop = loop
+        _inflight = asyncio.Semaphore(MAX_INFLIGHT)
+    return _client
+
+async def close_client():
+    global _client, _client_loop
+    if _client is not None and not _client.is_closed and _client_loop is asyncio.get_running_loop():
+        await _client.aclose()
+    _client = None
+    _client_loop = None
+
+async def send_payload(payload):
+    # Raw send: raises on transport errors, returns the response for any HTTP status
+    client = get_client()
+    async with _inflight:
+        return await client.post(API_URL, headers=HEADERS, json=payload)
+
+async def post_to_whatsapp(payload):
     try:
-        res = requests.post(API_URL, headers=HEADERS, json=payload)
+        res = await send_payload(payload)
         if res.status_code not in [200, 201]:
-            error_msg = f"WhatsApp API Error {res.status_code}: {res.text}\n"
-            print(error_msg)
-            with open("whatsapp_error.log", "a") as f:
-                f.write(error_msg)
+            print(f"WhatsApp API Error {res.status_code}: {res.text}")
         return res
-    except Exception as e:
-        error_msg = f"WhatsApp Request Failed: {e}\n"
-        print(error_msg)
-        with open("whatsapp_error.log", "a") as f:
-            f.write(error_msg)
+    except httpx.HTTPError as e:
+        print(f"WhatsApp Request Failed: {e!r}")
         return None
 
-def send_text_message(to, text):
+# Optional hook (set by outbox.start) that takes over delivery of every send_* payload
+_dispatcher = None
+
+def set_dispatcher(fn):
+    global _dispatcher
+    _dispatcher = fn
+
+async def dispatch(payload):
+    if _dispatcher is not None:
+        return await _dispatcher(payload)
+    return await post_to_whatsapp(payload)
+
+# Optional hook (set by media_registry.start) mapping an image URL to a pre-uploaded media id
+_media_resolver = None
+
+def set_media_resolver(fn):
+    global _media_resolver
+    _media_resolver = fn
+
+def image_object(image_url):
+    # Uploaded banners are referenced by id so Meta does not fetch the link for every message
+    media_id = _media_resolver(image_url) if _media_resolver is not None else None
+    return {"id": media_id} if media_id else {"link": image_url}
+
+async def send_text_message(to, text):
     payload = {
         "messaging_product": "whatsapp",
         "to": to,
         "type": "text",
         "text": {"preview_url": False, "body": text}
     }
-    return post_to_whatsapp(payload)
+    return await dispatch(payload)
 
-def send_image_message(to, image_url, caption=None):
+async def send_image_message(to, image_url, caption=None):
     payload = {
         "messaging_product": "whatsapp",
         "to": to,
         "type": "image",
         "image": {
-            "link": image_url,
+            **image_object(image_url),
             "caption": caption if caption else ""
         }
     }
-    return post_to_whatsapp(payload)
+    return await dispatch(payload)
 
-def send_button_message(to, body_text, buttons, image_url=None):
+async def send_button_message(to, body_text, buttons, image_url=None):
     action_buttons = []
     for btn in buttons:
         action_buttons.append({
@@ -60,7 +116,7 @@ def send_button_message(to, body_text, buttons, image_url=None):
                 "title": btn["title"]
             }
         })
-    
+
     interactive = {
         "type": "button",
         "body": {
@@ -70,13 +126,11 @@ def send_button_message(to, body_text, buttons, image_url=None):
             "buttons": action_buttons
         }
     }
-    
+
     if image_url:
         interactive["header"] = {
             "type": "image",
-            "image": {
-                "link": image_url
-            }
+            "image": image_object(image_url)
         }
 
     payload = {
@@ -85,9 +139,9 @@ def send_button_message(to, body_text, buttons, image_url=None):
         "type": "interactive",
         "interactive": interactive
     }
-    return post_to_whatsapp(payload)
+    return await dispatch(payload)
 
-def send_list_message(to, body_text, button_text, sections, header_text=None):
+async def send_list_message(to, body_text, button_text, sections, header_text=None):
     interactive = {
         "type": "list",
         "body": {
@@ -98,7 +152,7 @@ def send_list_message(to, body_text, button_text, sections, header_text=None):
             "sections": sections
         }
     }
-    
+
     if header_text:
         interactive["header"] = {
             "type": "text",
@@ -111,4 +165,4 @@ def send_list_message(to, body_text, button_text, sections, header_text=None):
         "type": "interactive",
         "interactive": interactive
     }
-    return post_to_whatsapp(payload)
+    return await dispatch(payload)
@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import {
     LayoutDashboard,
     Users,
@@ -33,10 +33,82 @@ export default function Dashboard() {
     const [volunteers, setVolunteers] = useState([]);
     const [analytics, setAnalytics] = useState([]);
     const [voters, setVoters] = useState([]);
+    // next_cursor per list endpoint; null when the last page has been loaded
+    const [cursors, setCursors] = useState({});
+    const [grievanceStatus, setGrievanceStatus] = useState('');
 
     const API_BASE = import.meta.env.VITE_API_BASE || "https://tvk-2-0-1.onrender.com";
 
-    useEffect(() => {
+    // Lists are paged on the server: no cursor reloads the first page, a cursor appends the next one
+    const fetchPage = (endpoint, key, setter, cursor, filters = {}) => {
+        const params = { ...filters, ...(cursor ? { cursor } : {}) };
+        return axios.get(`${API_BASE}/api/dashboard/${endpoint}`, { params })
+            .then(res => {
+                setter(prev => cursor ? [...prev, ...res.data[key]] : res.data[key]);
+                setCursors(prev => ({ ...prev, [endpoint]: res.data.next_cursor }));
+            })
+            .catch(e => console.error(e));
+    };
+    const grievanceFilters = grievanceStatus ? { status: grievanceStatus } : {};
+    const loadGrievances = (cursor) => fetchPage('all_grievances', 'grievances', setAllGrievances, cursor, grievanceFilters);
+    const loadSuggestions = (cursor) => fetchPage('suggestions', 'suggestions', setSuggestions, cursor);
+    const loadVolunteers = (cursor) => fetchPage('volunteers', 'volunteers', setVolunteers, cursor);
+    const loadVoters = (cursor) => fetchPage('voters', 'voters', setVoters, cursor);
+
+    // Live change feed (/api/dashboard/events): rows and counters are patched in place,
+    // so lists are only re-fetched when the feed is down or asks for a reset
+    const [live, setLive] = useState(false);
+    const liveRef = useRef(false);
+    const grievanceStatusRef = useRef(grievanceStatus);
+    grievanceStatusRef.current = grievanceStatus;
+    const STAT_NAMES = ['voters', 'open_grievances', 'suggestions', 'volunteers'];
+
+    const applyRow = (list, ev, limit) => {
+        const exists = list.some(item => item.key === ev.key);
+        if (exists) return list.map(item => item.key === ev.key ? ev.row : item);
+        if (ev.op !== 'insert') return list;
+        const next = [ev.row, ...list];
+        return limit ? next.slice(0, limit) : next;
+    };
+
+    const applyRecord = (ev) => {
+        if (ev.op === 'delete') {
+            [setGrievances, setAllGrievances, setSuggestions, setVolunteers]
+                .forEach(set => set(prev => prev.filter(item => item.key !== ev.key)));
+            return;
+        }
+        if (ev.list === 'grievances') {
+            setGrievances(prev => applyRow(prev, ev, 10));
+            const status = grievanceStatusRef.current;
+            setAllGrievances(prev => status && ev.row.status !== status
+                ? prev.filter(item => item.key !== ev.key)
+                : applyRow(prev, ev));
+        } else if (ev.list === 'suggestions') {
+            setSuggestions(prev => applyRow(prev, ev));
+        } else if (ev.list === 'volunteers') {
+            setVolunteers(prev => applyRow(prev, ev));
+        }
+    };
+
+    const applyStats = (values) => {
+        setStats(prev => prev.map((stat, idx) => STAT_NAMES[idx] in values ? { ...stat, value: String(values[STAT_NAMES[idx]]) } : stat));
+    };
+
+    // Complete lists (not just the loaded pages) are streamed by the server as a file download
+    const exportButton = (dataset, filters = {}) => (
+        <a className="status-select" style={{ textDecoration: 'none' }}
+            href={`${API_BASE}/api/dashboard/export/${dataset}?${new URLSearchParams({ format: 'csv', ...filters })}`}>
+            EXPORT CSV
+        </a>
+    );
+
+    const loadMoreButton = (endpoint, load) => cursors[endpoint] && (
+        <div style={{ display: 'flex', justifyContent: 'center', marginTop: '16px' }}>
+            <button className="status-select" onClick={() => load(cursors[endpoint])}>Load More</button>
+        </div>
+    );
+
+    const loadAll = () => {
         // Fetch Live Stats from Backend
         axios.get(`${API_BASE}/api/dashboard/stats`)
             .then(res => {
@@ -52,13 +124,33 @@ export default function Dashboard() {
 
         // Fetch Data for Tables
         axios.get(`${API_BASE}/api/dashboard/grievances`).then(res => setGrievances(res.data.grievances)).catch(e => console.error(e));
-        axios.get(`${API_BASE}/api/dashboard/all_grievances`).then(res => setAllGrievances(res.data.grievances)).catch(e => console.error(e));
-        axios.get(`${API_BASE}/api/dashboard/suggestions`).then(res => setSuggestions(res.data.suggestions)).catch(e => console.error(e));
-        axios.get(`${API_BASE}/api/dashboard/volunteers`).then(res => setVolunteers(res.data.volunteers)).catch(e => console.error(e));
+        loadSuggestions();
+        loadVolunteers();
         axios.get(`${API_BASE}/api/dashboard/booth_analytics`).then(res => setAnalytics(res.data.analytics)).catch(e => console.error(e));
-        axios.get(`${API_BASE}/api/dashboard/voters`).then(res => setVoters(res.data.voters)).catch(e => console.error(e));
+        loadVoters();
+    };
+    // Latest loaders for the feed's reset event, which is registered once
+    const reloadRef = useRef();
+    reloadRef.current = () => { loadAll(); loadGrievances(); };
+
+    useEffect(() => {
+        loadAll();
+
+        if (!window.EventSource) return;
+        const source = new EventSource(`${API_BASE}/api/dashboard/events`);
+        const setFeed = (up) => { liveRef.current = up; setLive(up); };
+        source.onopen = () => setFeed(true);
+        source.onerror = () => setFeed(false);  // the browser reconnects and resumes by itself
+        source.addEventListener('record', e => applyRecord(JSON.parse(e.data)));
+        source.addEventListener('stats', e => applyStats(JSON.parse(e.data)));
+        source.addEventListener('reset', () => reloadRef.current());
+        return () => source.close();
     }, []);
 
+    useEffect(() => {
+        loadGrievances();
+    }, [grievanceStatus]);
+
     const navItems = ['Overview', 'Grievances', 'Suggestions', 'Volunteers', 'Voters', 'Booth Analytics'];
 
     const handleStatusChange = (id, newStatus) => {
@@ -69,10 +161,11 @@ export default function Dashboard() {
 
         axios.post(`${API_BASE}/api/dashboard/update_status`, { id, status: newStatus })
             .then(() => {
-                // Refresh data to be sure
-                axios.get(`${API_BASE}/api/dashboard/all_grievances`).then(res => setAllGrievances(res.data.grievances));
-                axios.get(`${API_BASE}/api/dashboard/suggestions`).then(res => setSuggestions(res.data.suggestions));
-                axios.get(`${API_BASE}/api/dashboard/volunteers`).then(res => setVolunteers(res.data.volunteers));
+                // The change feed delivers the saved row; re-fetch only without it
+                if (liveRef.current) return;
+                loadGrievances();
+                loadSuggestions();
+                loadVolunteers();
             })
             .catch(err => {
                 console.error("Error updating status", err);
@@ -114,16 +207,18 @@ export default function Dashboard() {
                 confirmButtonColor: '#00d26a'
             });
 
-            // Refresh data to be sure
-            if (type === 'grievance') {
+            // Refresh data to be sure (the change feed already removed it when connected)
+            if (liveRef.current) {
+                return;
+            } else if (type === 'grievance') {
                 axios.get(`${API_BASE}/api/dashboard/grievances`).then(res => setGrievances(res.data.grievances));
-                axios.get(`${API_BASE}/api/dashboard/all_grievances`).then(res => setAllGrievances(res.data.grievances));
+                loadGrievances();
             } else if (type === 'suggestion') {
-                axios.get(`${API_BASE}/api/dashboard/suggestions`).then(res => setSuggestions(res.data.suggestions));
+                loadSuggestions();
             } else if (type === 'volunteer') {
-                axios.get(`${API_BASE}/api/dashboard/volunteers`).then(res => setVolunteers(res.data.volunteers));
+                loadVolunteers();
             } else if (type === 'voter') {
-                axios.get(`${API_BASE}/api/dashboard/voters`).then(res => setVoters(res.data.voters));
+                loadVoters();
             }
         } catch (err) {
             console.error("Error deleting record", err);
@@ -167,7 +262,10 @@ export default function Dashboard() {
             <div className="main-content">
                 <div className="header animated">
                     <div>
-                        <div style={{ fontSize: '12px', fontWeight: 800, color: 'var(--brand-surge)', marginBottom: '8px', letterSpacing: '0.2em' }}>ADMIN COMMAND CENTER</div>
+                        <div style={{ fontSize: '12px', fontWeight: 800, color: 'var(--brand-surge)', marginBottom: '8px', letterSpacing: '0.2em' }}>
+                            ADMIN COMMAND CENTER
+                            <span style={{ marginLeft: '12px', color: live ? '#00d26a' : 'var(--text-dim)' }}>{live ? '● LIVE' : '○ OFFLINE'}</span>
+                        </div>
                         <h1>{activeTab}</h1>
                     </div>
                     <div className="user-profile">
@@ -243,7 +341,7 @@ export default function Dashboard() {
                                                 {issue.photo_id && (
                                                     <div style={{ marginTop: '8px' }}>
                                                         <a href={`${API_BASE}/api/dashboard/image/${issue.photo_id}`} target="_blank" rel="noreferrer">
-                                                            <img src={`${API_BASE}/api/dashboard/image/${issue.photo_id}`} alt="Evidence" style={{ height: '60px', width: '80px', borderRadius: '4px', border: '1px solid var(--glass-border)', objectFit: 'cover' }} />
+                                                            <img src={`${API_BASE}/api/dashboard/image/${issue.photo_id}?w=100&fmt=webp`} srcSet={`${API_BASE}/api/dashboard/image/${issue.photo_id}?w=100&fmt=webp 1x, ${API_BASE}/api/dashboard/image/${issue.photo_id}?w=200&fmt=webp 2x`} loading="lazy" alt="Evidence" style={{ height: '60px', width: '80px', borderRadius: '4px', border: '1px solid var(--glass-border)', objectFit: 'cover' }} />
                                                         </a>
                                                     </div>
                                                 )}
@@ -271,7 +369,16 @@ export default function Dashboard() {
                 {activeTab === 'Grievances' && (
                     <div className="animated">
                         <div className="table-container">
-                            <div className="table-header">Master Database: All Grievances</div>
+                            <div className="table-header">
+                                Master Database: All Grievances
+                                <select className="status-select" value={grievanceStatus} onChange={(e) => setGrievanceStatus(e.target.value)}>
+                                    <option value="">ALL STATUSES</option>
+                                    <option value="Open">OPEN</option>
+                                    <option value="In Progress">IN PROGRESS</option>
+                                    <option value="Resolved">RESOLVED</option>
+                                </select>
+                                {exportButton('grievances', grievanceFilters)}
+                            </div>
                             <table>
                                 <thead>
                                     <tr>
@@ -317,7 +424,7 @@ export default function Dashboard() {
                                                 {issue.photo_id && (
                                                     <div style={{ marginTop: '8px' }}>
                                                         <a href={`${API_BASE}/api/dashboard/image/${issue.photo_id}`} target="_blank" rel="noreferrer">
-                                                            <img src={`${API_BASE}/api/dashboard/image/${issue.photo_id}`} alt="Evidence" style={{ height: '80px', width: '100px', borderRadius: '4px', border: '1px solid var(--glass-border)', objectFit: 'cover' }} />
+                                                            <img src={`${API_BASE}/api/dashboard/image/${issue.photo_id}?w=100&fmt=webp`} srcSet={`${API_BASE}/api/dashboard/image/${issue.photo_id}?w=100&fmt=webp 1x, ${API_BASE}/api/dashboard/image/${issue.photo_id}?w=200&fmt=webp 2x`} loading="lazy" alt="Evidence" style={{ height: '80px', width: '100px', borderRadius: '4px', border: '1px solid var(--glass-border)', objectFit: 'cover' }} />
                                                         </a>
                                                     </div>
                                                 )}
@@ -344,6 +451,7 @@ export default function Dashboard() {
                                     ))}
                                 </tbody>
                             </table>
+                            {loadMoreButton('all_grievances', loadGrievances)}
                         </div>
                     </div>
                 )}
@@ -351,7 +459,7 @@ export default function Dashboard() {
                 {activeTab === 'Suggestions' && (
                     <div className="animated">
                         <div className="table-container">
-                            <div className="table-header">Community Intelligence: Suggestions</div>
+                            <div className="table-header">Community Intelligence: Suggestions{exportButton('suggestions')}</div>
                             <table>
                                 <thead>
                                     <tr>
@@ -377,7 +485,7 @@ export default function Dashboard() {
                                                 {s.photo_id && (
                                                     <div style={{ marginTop: '8px' }}>
                                                         <a href={`${API_BASE}/api/dashboard/image/${s.photo_id}`} target="_blank" rel="noreferrer">
-                                                            <img src={`${API_BASE}/api/dashboard/image/${s.photo_id}`} alt="Evidence" style={{ height: '80px', width: '100px', borderRadius: '4px', border: '1px solid var(--glass-border)', objectFit: 'cover' }} />
+                                                            <img src={`${API_BASE}/api/dashboard/image/${s.photo_id}?w=100&fmt=webp`} srcSet={`${API_BASE}/api/dashboard/image/${s.photo_id}?w=100&fmt=webp 1x, ${API_BASE}/api/dashboard/image/${s.photo_id}?w=200&fmt=webp 2x`} loading="lazy" alt="Evidence" style={{ height: '80px', width: '100px', borderRadius: '4px', border: '1px solid var(--glass-border)', objectFit: 'cover' }} />
                                                         </a>
                                                     </div>
                                                 )}
@@ -405,6 +513,7 @@ export default function Dashboard() {
                                     ))}
                                 </tbody>
                             </table>
+                            {loadMoreButton('suggestions', loadSuggestions)}
                         </div>
                     </div>
                 )}
@@ -412,7 +521,7 @@ export default function Dashboard() {
                 {activeTab === 'Volunteers' && (
                     <div className="animated">
                         <div className="table-container">
-                            <div className="table-header">Personnel Roster: Registered Volunteers</div>
+                            <div className="table-header">Personnel Roster: Registered Volunteers{exportButton('volunteers')}</div>
                             <table>
                                 <thead>
                                     <tr>
@@ -436,7 +545,7 @@ export default function Dashboard() {
                                                 {v.photo_id && (
                                                     <div style={{ marginTop: '8px' }}>
                                                         <a href={`${API_BASE}/api/dashboard/image/${v.photo_id}`} target="_blank" rel="noreferrer">
-                                                            <img src={`${API_BASE}/api/dashboard/image/${v.photo_id}`} alt="Attachment" style={{ height: '40px', width: 'auto', borderRadius: '4px', border: '1px solid var(--glass-border)', objectFit: 'cover' }} />
+                                                            <img src={`${API_BASE}/api/dashboard/image/${v.photo_id}?w=100&fmt=webp`} srcSet={`${API_BASE}/api/dashboard/image/${v.photo_id}?w=100&fmt=webp 1x, ${API_BASE}/api/dashboard/image/${v.photo_id}?w=200&fmt=webp 2x`} loading="lazy" alt="Attachment" style={{ height: '40px', width: 'auto', borderRadius: '4px', border: '1px solid var(--glass-border)', objectFit: 'cover' }} />
                                                         </a>
                                                     </div>
                                                 )}
@@ -464,6 +573,7 @@ export default function Dashboard() {
                                     ))}
                                 </tbody>
                             </table>
+                            {loadMoreButton('volunteers', loadVolunteers)}
                         </div>
                     </div>
                 )}
@@ -471,7 +581,7 @@ export default function Dashboard() {
                 {activeTab === 'Voters' && (
                     <div className="animated">
                         <div className="table-container">
-                            <div className="table-header">Verified Electorate List</div>
+                            <div className="table-header">Verified Electorate List{exportButton('voters')}</div>
                             <table>
                                 <thead>
                                     <tr>
@@ -505,6 +615,7 @@ export default function Dashboard() {
                                     ))}
                                 </tbody>
                             </table>
+                            {loadMoreButton('voters', loadVoters)}
                         </div>
                     </div>
                 )}